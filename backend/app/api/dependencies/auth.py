@@ -21,7 +21,7 @@ async def get_user_from_token(
     """Get user token."""
     try:
         username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
-        user = await user_repo.get_user_by_username(username=username)
+        user = await user_repo.get_cached_user_by_username(username=username)
     except Exception as e:
         raise e
     return user
@@ -0,0 +1,38 @@
+"""ETags derived from updated_at, and If-Match preconditions for optimistic concurrency on writes."""
+
+import datetime
+from typing import Optional
+
+from app.db.repositories.base import precondition_failed
+from fastapi import Header
+
+ETAG_HEADER = "ETag"
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def etag_for(updated_at: datetime.datetime) -> str:
+    """Strong ETag of a row: its updated_at in microseconds since the epoch, which maps back to the timestamp."""
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=datetime.timezone.utc)
+    return f'"{(updated_at - EPOCH) // datetime.timedelta(microseconds=1)}"'
+
+
+def updated_at_from_etag(etag: str) -> datetime.datetime:
+    """updated_at an ETag made by etag_for was derived from."""
+    if not (len(etag) > 2 and etag.startswith('"') and etag.endswith('"')):
+        raise ValueError("not a strong etag")
+    return EPOCH + datetime.timedelta(microseconds=int(etag[1:-1]))
+
+
+def get_if_match(
+    if_match: Optional[str] = Header(None, description="ETag of the version being updated. '*' matches any."),
+) -> Optional[datetime.datetime]:
+    """updated_at the client expects the row to still have, None to write unconditionally."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return updated_at_from_etag(if_match.strip())
+    except ValueError:
+        # weak or foreign etags can never match one of ours.
+        raise precondition_failed()
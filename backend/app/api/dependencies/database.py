@@ -1,8 +1,9 @@
 """Dependency for db and redis."""
 
-from typing import Callable, Type
+from typing import Callable, Dict, Type
 
 from app.db.repositories.base import BaseRepository
+from app.db.repositories.loaders import DataLoader, request_loaders
 from databases import Database
 from fastapi import Depends
 from redis.client import Redis
@@ -19,12 +20,21 @@ def get_database_redis(request: Request) -> Redis:
     return request.app.state._redis
 
 
+def get_request_loaders(request: Request) -> Dict[str, DataLoader]:
+    """Get batch loaders of the request, shared by every repository it uses."""
+    if not hasattr(request.state, "loaders"):
+        request.state.loaders = {}
+    return request.state.loaders
+
+
 def get_repository(Repo_type: Type[BaseRepository]) -> Callable:
     """Dependency for redis and db."""
 
-    def get_repo(
-        db: Database = Depends(get_database), redis: Redis = Depends(get_database_redis)
+    async def get_repo(
+        request: Request, db: Database = Depends(get_database), redis: Redis = Depends(get_database_redis)
     ) -> Type[BaseRepository]:
+        # async so the loaders are set in the request's context rather than in a threadpool copy of it.
+        request_loaders.set(get_request_loaders(request))
         return Repo_type(db, redis)
 
     return get_repo
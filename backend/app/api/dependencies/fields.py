@@ -0,0 +1,55 @@
+"""Sparse fieldsets (fields=) and opt-in embedding of related objects (expand=) on read endpoints."""
+
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class SparseFieldset:
+    """Fields a client asked for and the relations it wants embedded."""
+
+    def __init__(self, *, fields: Optional[FrozenSet[str]] = None, expand: FrozenSet[str] = frozenset()) -> None:
+        """Initialize. fields of None means every field."""
+        self.fields = fields
+        self.expand = expand
+
+
+def split_param(value: Optional[str]) -> FrozenSet[str]:
+    """Split a comma separated query parameter."""
+    if not value:
+        return frozenset()
+    return frozenset(item.strip() for item in value.split(",") if item.strip())
+
+
+def sparse_fieldset(model: Type[BaseModel], *, expandable: Tuple[str, ...] = ()) -> Callable:
+    """Dependency parsing `fields` and `expand` for responses of `model`."""
+
+    expand_description = f"Comma separated relations to embed: {', '.join(expandable)}."
+
+    def get_sparse_fieldset(
+        fields: Optional[str] = Query(None, description="Comma separated fields to return, id is always included."),
+        expand: Optional[str] = Query(None, description=expand_description),
+    ) -> SparseFieldset:
+        selected_fields = split_param(fields)
+        selected_expand = split_param(expand)
+        unknown = sorted((selected_fields - set(model.__fields__)) | (selected_expand - set(expandable)))
+        if unknown:
+            detail = f"Unknown fields: {', '.join(unknown)}."
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+        return SparseFieldset(fields=(selected_fields | {"id"}) if selected_fields else None, expand=selected_expand)
+
+    return get_sparse_fieldset
+
+
+def sparse_response(content: Any, *, fieldset: SparseFieldset, headers: Optional[Dict[str, str]] = None) -> Any:
+    """Return content untouched, or trimmed to the selected fields when the client asked for a subset."""
+    if fieldset.fields is None:
+        return content
+    if isinstance(content, Iterable) and not isinstance(content, BaseModel):
+        data = [jsonable_encoder(item, include=set(fieldset.fields)) for item in content]
+    else:
+        data = jsonable_encoder(content, include=set(fieldset.fields))
+    return JSONResponse(content=data, headers=headers)
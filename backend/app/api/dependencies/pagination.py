@@ -0,0 +1,31 @@
+"""Opaque keyset pagination cursors."""
+
+import base64
+import json
+from typing import Any, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError, parse_obj_as
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# cursor of the newest row seen, to ask for what is newer than it.
+NEWEST_CURSOR_HEADER = "X-Newest-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the keyset values of the last row of a page into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(jsonable_encoder(values)).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str], *types: Type) -> Optional[Tuple]:
+    """Decode a cursor made by encode_cursor, parsing each value with the matching type."""
+    if cursor is None:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("cursor has the wrong number of values")
+        return tuple(parse_obj_as(value_type, value) for value_type, value in zip(types, values))
+    except (ValueError, TypeError, ValidationError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
@@ -1,13 +1,11 @@
 """Dependencies for task."""
 
-from typing import List
-
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
 from app.api.dependencies.todos import get_todo_by_id_from_path, user_owns_todo
 from app.api.dependencies.users import get_user_by_username_from_path
 from app.db.repositories.tasks import TasksRepository
-from app.models.task import TaskInDB
+from app.models.task import TaskInDB, TaskOfferStats
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
 from fastapi import Depends, HTTPException, status
@@ -57,12 +55,12 @@ async def get_offer_for_task_from_user_by_path(
     return await get_task_for_todo_from_user(user=user, todo=todo, tasks_repo=tasks_repo)
 
 
-async def list_offers_for_task_by_id_from_path(
+async def get_offer_stats_for_task_by_id_from_path(
     todo: TodoInDB = Depends(get_todo_by_id_from_path),
     tasks_repo: TasksRepository = Depends(get_repository(TasksRepository)),
-) -> List[TaskInDB]:
-    """List all offers for todo."""
-    return await tasks_repo.list_offers_for_task(todo=todo)
+) -> TaskOfferStats:
+    """Count the offers for todo by status."""
+    return await tasks_repo.get_offer_stats_for_task(todo=todo)
 
 
 async def check_offer_list_permissions(
@@ -87,7 +85,7 @@ def check_task_offer_acceptance_permissions(
     current_user: UserInDB = Depends(get_current_active_user),
     todo: TodoInDB = Depends(get_todo_by_id_from_path),
     task: TaskInDB = Depends(get_offer_for_task_from_user_by_path),
-    existing_offer: List[TaskInDB] = Depends(list_offers_for_task_by_id_from_path),
+    offer_stats: TaskOfferStats = Depends(get_offer_stats_for_task_by_id_from_path),
 ) -> None:
     """Check if tasks can be accepted."""
     if not user_owns_todo(user=current_user, todo=todo):
@@ -98,7 +96,7 @@ def check_task_offer_acceptance_permissions(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Can only accept tasks that are currently pending."
         )
-    if "accepted" in [task.status for task in existing_offer]:
+    if offer_stats.accepted:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The todo already has an accepted offer.")
 
 
@@ -2,8 +2,9 @@
 
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
+from app.api.dependencies.fields import SparseFieldset, sparse_fieldset
 from app.db.repositories.todos import TodosRepository
-from app.models.todo import TodoPublic
+from app.models.todo import TodoInDB, TodoPublic
 from app.models.user import UserInDB
 from fastapi import Depends, HTTPException, Path, status
 
@@ -12,9 +13,27 @@ async def get_todo_by_id_from_path(
     todo_id: int = Path(..., ge=1),
     current_user: UserInDB = Depends(get_current_active_user),
     todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+) -> TodoInDB:
+    """Depedency for get todo using id. The owner is left as an id, which is all permission checks need."""
+    todo = await todos_repo.get_todo_by_id(id=todo_id, requesting_user=current_user, populate=False)
+    if not todo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id")
+    return todo
+
+
+todo_fieldset = sparse_fieldset(TodoPublic, expandable=("owner",))
+
+
+async def get_expanded_todo_by_id_from_path(
+    todo_id: int = Path(..., ge=1),
+    fieldset: SparseFieldset = Depends(todo_fieldset),
+    current_user: UserInDB = Depends(get_current_active_user),
+    todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
 ) -> TodoPublic:
-    """Depedency for get todo using id."""
-    todo = await todos_repo.get_todo_by_id(id=todo_id, requesting_user=current_user)
+    """Depedency for reading a todo, with the owner embedded only when asked for with expand=owner."""
+    todo = await todos_repo.get_todo_by_id(
+        id=todo_id, requesting_user=current_user, populate="owner" in fieldset.expand
+    )
     if not todo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id")
     return todo
@@ -22,7 +41,7 @@ async def get_todo_by_id_from_path(
 
 def check_todo_modification_permission(
     current_user: UserInDB = Depends(get_current_active_user),
-    todo: TodoPublic = Depends(get_todo_by_id_from_path),
+    todo: TodoInDB = Depends(get_todo_by_id_from_path),
 ) -> None:
     """Depedency to check modification permission of user."""
     if not user_owns_todo(user=current_user, todo=todo):
@@ -32,7 +51,7 @@ def check_todo_modification_permission(
         )
 
 
-def user_owns_todo(*, user: UserInDB, todo: TodoPublic) -> bool:
+def user_owns_todo(*, user: UserInDB, todo: TodoInDB) -> bool:
     """Check if user owns the todo."""
     if isinstance(todo.owner, int):
         return todo.owner == user.id
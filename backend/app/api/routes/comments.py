@@ -1,5 +1,8 @@
 """Routes for comments."""
 
+import datetime
+from typing import List, Optional
+
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.comments import (
     check_comment_modification_permission,
@@ -7,7 +10,9 @@ from app.api.dependencies.comments import (
     check_comment_todo_permission,
     get_comment_by_id_from_path,
 )
+from app.api.dependencies.conditional import ETAG_HEADER, etag_for, get_if_match
 from app.api.dependencies.database import get_repository
+from app.api.dependencies.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from app.api.dependencies.tasks import get_offer_for_task_from_user_by_path
 from app.api.dependencies.todos import get_todo_by_id_from_path
 from app.db.repositories.comments import CommentsRepository
@@ -15,11 +20,38 @@ from app.models.comment import CommentCreate, CommentInDB, CommentPublic, Commen
 from app.models.task import TaskInDB
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
-from fastapi import APIRouter, Body, Depends, status
+from fastapi import APIRouter, Body, Depends, Path, Query, Response, status
 
 router = APIRouter()
 
 
+@router.get(
+    "/archive/",
+    response_model=List[CommentPublic],
+    name="comments:list-archived-comments",
+)
+async def list_archived_comments(
+    response: Response,
+    created_from: Optional[datetime.datetime] = Query(None, description="Only comments created from then on."),
+    created_to: Optional[datetime.datetime] = Query(None, description="Only comments created before then."),
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
+    page_chunk_size: int = Query(100, ge=1, le=500, description="Comments returned per page."),
+    current_user: UserInDB = Depends(get_current_active_user),
+    comments_repo: CommentsRepository = Depends(get_repository(CommentsRepository)),
+) -> List[CommentPublic]:
+    """Get the user's comments older than the retention window, newest first. Bounding created_at is faster."""
+    comments = await comments_repo.list_archived_user_comments(
+        requesting_user=current_user,
+        created_from=created_from,
+        created_to=created_to,
+        after=decode_cursor(cursor, datetime.datetime, int),
+        page_chunk_size=page_chunk_size,
+    )
+    if len(comments) == page_chunk_size:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(comments[-1].created_at, comments[-1].id)
+    return comments
+
+
 @router.post(
     "/{todo_id}",
     response_model=CommentPublic,
@@ -28,6 +60,7 @@ router = APIRouter()
     dependencies=[Depends(check_comment_todo_permission)],
 )
 async def create_new_comment(
+    response: Response,
     new_comment: CommentCreate = Body(..., embed=True),
     comments_repo: CommentsRepository = Depends(get_repository(CommentsRepository)),
     current_user: UserInDB = Depends(get_current_active_user),
@@ -37,6 +70,7 @@ async def create_new_comment(
     created_comment = await comments_repo.create_comment_todo(
         new_comment=new_comment, todo=todo, requesting_user=current_user
     )
+    response.headers[ETAG_HEADER] = etag_for(created_comment.updated_at)
     return CommentPublic(**created_comment.dict())
 
 
@@ -44,15 +78,24 @@ async def create_new_comment(
     "/{comment_id}/",
     response_model=CommentPublic,
     name="comments:update-comment-by-id",
-    dependencies=[Depends(check_comment_modification_permission)],
 )
 async def update_comment_by_id(
-    comment: CommentInDB = Depends(get_comment_by_id_from_path),
+    response: Response,
+    comment_id: int = Path(..., ge=1),
     comment_update: CommentUpdate = Body(..., embed=True),
+    expected_updated_at: Optional[datetime.datetime] = Depends(get_if_match),
+    current_user: UserInDB = Depends(get_current_active_user),
     comments_repo: CommentsRepository = Depends(get_repository(CommentsRepository)),
 ) -> CommentPublic:
-    """Update comment."""
-    return await comments_repo.update_comments(comment=comment, comment_update=comment_update)
+    """Update comment. Send the ETag of the comment in If-Match to get a 412 if it changed since."""
+    comment = await comments_repo.update_comments(
+        comment_id=comment_id,
+        comment_update=comment_update,
+        requesting_user=current_user,
+        expected_updated_at=expected_updated_at,
+    )
+    response.headers[ETAG_HEADER] = etag_for(comment.updated_at)
+    return comment
 
 
 @router.delete(
@@ -1,17 +1,27 @@
 """Routes for todo feeds."""
 
 import datetime
-from typing import List
+from typing import AsyncIterator, List, Optional
 
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
+from app.api.dependencies.pagination import NEWEST_CURSOR_HEADER, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core.config import FEED_CHANGES_MAX_COUNT, SECRET_KEY
 from app.db.repositories.feed import FeedRepository
-from app.models.feed import TodoFeedItem
+from app.db.repositories.users import UsersRepository
+from app.models.feed import FeedChanges, FeedOrderBy, TodoFeedItem
+from app.models.todo import PriorityType
 from app.models.user import UserInDB
-from fastapi import APIRouter, Depends, Query
+from app.services import auth_service
+from app.services.feed_stream import feed_stream
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, status
+from starlette.responses import StreamingResponse
 
 router = APIRouter()
 
+# count of the feed items newer than the since cursor of a changes probe.
+FEED_CHANGES_HEADER = "X-Feed-Changes"
+
 
 @router.get(
     "/tasks/",
@@ -20,19 +30,139 @@ router = APIRouter()
     dependencies=[Depends(get_current_active_user)],
 )
 async def get_todo_feed_for_user(
+    response: Response,
     current_user: UserInDB = Depends(get_current_active_user),
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
     page_chunk_size: int = Query(
         20, ge=1, le=50, description="Used to determine how many todo feed item objects to return in the response"
     ),
-    starting_date: datetime.datetime = Query(
-        datetime.datetime.now() + datetime.timedelta(minutes=10),
-        description="Used to determine the timestamp at which to begin querying for todo feed items.",
+    starting_date: Optional[datetime.datetime] = Query(
+        None,
+        description="Timestamp to begin querying for todo feed items at when there is no cursor. Defaults to now.",
     ),
+    order_by: FeedOrderBy = Query(FeedOrderBy.recent, description="Newest events first, or most urgent tasks first."),
+    priority: Optional[PriorityType] = Query(None, description="Only tasks of this priority."),
+    duedate_from: Optional[datetime.date] = Query(None, description="Only tasks due on or after this date."),
+    duedate_to: Optional[datetime.date] = Query(None, description="Only tasks due on or before this date."),
     feeds_repo: FeedRepository = Depends(get_repository(FeedRepository)),
 ) -> List[TodoFeedItem]:
-    """Get todo feed for user."""
-    return await feeds_repo.fetch_todo_jobs_feed(
+    """Get todo feed for user, newest first or most urgent first. The next page's cursor is in X-Next-Cursor.
+
+    Without a cursor, X-Newest-Cursor of the newest first feed is the cursor to probe for changes since the page with.
+    """
+    filters = {"priority": priority, "duedate_from": duedate_from, "duedate_to": duedate_to}
+    if order_by == FeedOrderBy.urgency:
+        todo_feed = await feeds_repo.fetch_ranked_todo_jobs_feed(
+            requesting_user=current_user,
+            page_chunk_size=page_chunk_size,
+            after=decode_cursor(cursor, int, int),
+            **filters,
+        )
+        if len(todo_feed) == page_chunk_size:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(todo_feed[-1].urgency_score, todo_feed[-1].id)
+        return todo_feed
+    todo_feed = await feeds_repo.fetch_todo_jobs_feed(
         requesting_user=current_user,
         page_chunk_size=page_chunk_size,
         starting_date=starting_date,
+        after=decode_cursor(cursor, datetime.datetime, int, str),
+        **filters,
+    )
+    if len(todo_feed) == page_chunk_size:
+        last = todo_feed[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.event_timestamp, last.event_id, last.event_type)
+    if cursor is None and todo_feed:
+        first = todo_feed[0]
+        response.headers[NEWEST_CURSOR_HEADER] = encode_cursor(first.event_timestamp, first.event_id, first.event_type)
+    return todo_feed
+
+
+@router.api_route(
+    "/tasks/changes/",
+    methods=["GET", "HEAD"],
+    response_model=FeedChanges,
+    name="feed:get-todo-feed-changes-for-user",
+    dependencies=[Depends(get_current_active_user)],
+)
+async def get_todo_feed_changes_for_user(
+    response: Response,
+    current_user: UserInDB = Depends(get_current_active_user),
+    since: Optional[str] = Query(None, description=f"{NEWEST_CURSOR_HEADER} of the feed or of the previous probe."),
+    feeds_repo: FeedRepository = Depends(get_repository(FeedRepository)),
+) -> FeedChanges:
+    """Count the feed items newer than since, up to FEED_CHANGES_MAX_COUNT, without loading them.
+
+    The count and the cursor to probe with next are also in X-Feed-Changes and X-Newest-Cursor, for HEAD requests.
+    Refetch the feed when the count isn't 0.
+    """
+    count, newest = await feeds_repo.fetch_todo_jobs_feed_changes(
+        requesting_user=current_user,
+        since=decode_cursor(since, datetime.datetime, int, str),
+        limit=FEED_CHANGES_MAX_COUNT,
     )
+    newest_cursor = None if newest is None else encode_cursor(*newest)
+    response.headers[FEED_CHANGES_HEADER] = str(count)
+    if newest_cursor is not None:
+        response.headers[NEWEST_CURSOR_HEADER] = newest_cursor
+    return FeedChanges(count=count, newest_cursor=newest_cursor)
+
+
+@router.get("/tasks/stream/", name="feed:stream-todo-feed-for-user")
+async def stream_todo_feed_for_user(
+    request: Request, current_user: UserInDB = Depends(get_current_active_user)
+) -> StreamingResponse:
+    """Stream new and updated tasks of other users as server-sent events.
+
+    A `lagged` event means the connection fell behind and was closed, reload the feed before reconnecting.
+    """
+    subscriber = feed_stream.subscribe(user_id=current_user.id) if feed_stream.running else None
+    if subscriber is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The task feed stream is unavailable."
+        )
+
+    async def server_sent_events() -> AsyncIterator[str]:
+        async for payload in feed_stream.listen(subscriber, is_disconnected=request.is_disconnected):
+            yield ": heartbeat\n\n" if payload is None else f"event: task\ndata: {payload}\n\n"
+        if subscriber.lagged:
+            yield "event: lagged\ndata: {}\n\n"
+
+    return StreamingResponse(
+        server_sent_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/tasks/stream/ws/", name="feed:stream-todo-feed-for-user-ws")
+async def stream_todo_feed_for_user_ws(websocket: WebSocket, token: str = Query(...)) -> None:
+    """Stream new and updated tasks of other users over a websocket, authenticated by an access token."""
+    users_repo = UsersRepository(websocket.app.state._db, websocket.app.state._redis)
+    try:
+        username = auth_service.get_username_from_token(token=token, secret_key=str(SECRET_KEY))
+        user = await users_repo.get_cached_user_by_username(username=username)
+    except HTTPException:
+        user = None
+    if user is None or not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    subscriber = feed_stream.subscribe(user_id=user.id) if feed_stream.running else None
+    if subscriber is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+
+    async def is_disconnected() -> bool:
+        return False
+
+    try:
+        # a send to a closed websocket raises, which ends the stream at the next heartbeat.
+        async for payload in feed_stream.listen(subscriber, is_disconnected=is_disconnected):
+            await websocket.send_text(
+                '{"type": "heartbeat"}' if payload is None else f'{{"type": "task", "item": {payload}}}'
+            )
+        if subscriber.lagged:
+            await websocket.send_text('{"type": "lagged"}')
+        await websocket.close()
+    except Exception:
+        feed_stream.unsubscribe(subscriber)
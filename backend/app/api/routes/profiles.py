@@ -1,7 +1,11 @@
 """Routes for profile."""
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, status
+import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Response, status
 
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.conditional import ETAG_HEADER, etag_for, get_if_match
 from app.api.dependencies.database import get_repository
 from app.db.repositories.profiles import ProfilesRepository
 from app.models.profile import ProfilePublic, ProfileUpdate
@@ -11,7 +15,7 @@ router = APIRouter()
 
 
 @router.get("/{username}/", response_model=ProfilePublic, name="profiles:get-profile-by-username")
-async def get_profile_by_username(*, username: str = Path(...,
+async def get_profile_by_username(*, response: Response, username: str = Path(...,
                                   min_length=3, regex="^[a-zA-Z0-9_-]+$"),
                                   current_user: UserInDB = Depends(get_current_active_user),
                                   profile_repo: ProfilesRepository = Depends(get_repository(ProfilesRepository))
@@ -20,14 +24,20 @@ async def get_profile_by_username(*, username: str = Path(...,
     profile = await profile_repo.get_profile_by_username(username=username)
     if not profile:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile found with that username.")
+    response.headers[ETAG_HEADER] = etag_for(profile.updated_at)
     return ProfilePublic(**profile.dict())
 
 
 @router.put("/me/", response_model=ProfilePublic, name="profiles:update-own-profile")
-async def update_own_profile(profile_update: ProfileUpdate = Body(..., embed=True),
+async def update_own_profile(response: Response,
+                             profile_update: ProfileUpdate = Body(..., embed=True),
+                             expected_updated_at: Optional[datetime.datetime] = Depends(get_if_match),
                              current_user: UserInDB = Depends(get_current_active_user),
                              profile_repo: ProfilesRepository = Depends(get_repository(ProfilesRepository)),
                              ) -> ProfilePublic:
-    """Upate pofile route."""
-    updated_profile = await profile_repo.update_profile(profile_update=profile_update, requesting_user=current_user)
+    """Upate pofile route. Send the ETag of the profile in If-Match to get a 412 if it changed since."""
+    updated_profile = await profile_repo.update_profile(
+        profile_update=profile_update, requesting_user=current_user, expected_updated_at=expected_updated_at
+    )
+    response.headers[ETAG_HEADER] = etag_for(updated_profile.updated_at)
     return ProfilePublic(**updated_profile.dict())
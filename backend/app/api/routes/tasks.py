@@ -1,9 +1,11 @@
 """Routes for todo assignments."""
 
-from typing import List
+import datetime
+from typing import List, Optional, Union
 
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
+from app.api.dependencies.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from app.api.dependencies.tasks import (
     check_offer_list_permissions,
     check_task_create_permissions,
@@ -13,17 +15,16 @@ from app.api.dependencies.tasks import (
     check_task_offer_rescind_permissions,
     get_offer_for_task_from_user_by_path,
     get_task_offers_for_todo_from_current_user,
-    list_offers_for_task_by_id_from_path,
 )
 from app.api.dependencies.todos import get_todo_by_id_from_path
 from app.api.dependencies.users import get_user_by_username_from_path
 from app.db.repositories.comments import CommentsRepository
 from app.db.repositories.tasks import TasksRepository
 from app.models.comment import CommentInDB
-from app.models.task import TaskCreate, TaskInDB, TaskPublic
+from app.models.task import TaskCreate, TaskInDB, TaskOfferStats, TaskPublic, TaskStatus
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, Response, status
 
 router = APIRouter()
 
@@ -63,14 +64,30 @@ async def create_task(
 
 @router.get(
     "/",
-    response_model=List[TaskPublic],
+    response_model=Union[List[TaskPublic], TaskOfferStats],
     name="assigns:list-offers-for-task",
     dependencies=[Depends(check_offer_list_permissions)],
 )
 async def list_tasks_for_todo(
-    tasks: List[TaskInDB] = Depends(list_offers_for_task_by_id_from_path),
-) -> List[TaskPublic]:
-    """List offers for task."""
+    response: Response,
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
+    page_chunk_size: int = Query(100, ge=1, le=500, description="Offers returned per page."),
+    offer_status: Optional[TaskStatus] = Query(None, alias="status", description="Only offers with this status."),
+    counts_only: bool = Query(False, description="Only count the offers by status, in place of listing them."),
+    todo: TodoInDB = Depends(get_todo_by_id_from_path),
+    tasks_repo: TasksRepository = Depends(get_repository(TasksRepository)),
+) -> Union[List[TaskPublic], TaskOfferStats]:
+    """List offers for task with their users oldest first, or count them. The next page's cursor is in X-Next-Cursor."""
+    if counts_only:
+        return await tasks_repo.get_offer_stats_for_task(todo=todo)
+    tasks = await tasks_repo.list_offers_for_task(
+        todo=todo,
+        status=offer_status,
+        after=decode_cursor(cursor, datetime.datetime, int),
+        page_chunk_size=page_chunk_size,
+    )
+    if len(tasks) == page_chunk_size:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(tasks[-1].created_at, tasks[-1].user_id)
     return tasks
 
 
@@ -1,21 +1,39 @@
 """API router to get all todos are offered as task. Anyone can view them."""
 
-from typing import List
+import datetime
+from typing import List, Optional
 
 from app.api.dependencies.auth import get_current_active_user
 from app.api.dependencies.database import get_repository
+from app.api.dependencies.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from app.db.repositories.todos import TodosRepository
-from app.models.todo import TodoPublic
+from app.models.todo import PriorityType, TodoPublic
 from app.models.user import UserInDB
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[TodoPublic], name="todo_task:list-all-tasks")
 async def get_all_todo_tasks(
+    response: Response,
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
+    page_chunk_size: int = Query(100, ge=1, le=500, description="Tasks returned per page."),
+    priority: Optional[PriorityType] = Query(None),
+    duedate_from: Optional[datetime.date] = Query(None),
+    duedate_to: Optional[datetime.date] = Query(None),
     current_user: UserInDB = Depends(get_current_active_user),
     todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
 ) -> List[TodoPublic]:
-    """Get all todos offered as tasks."""
-    return await todos_repo.list_all_todo_for_task(requesting_user=current_user)
+    """Get open todos other users offer as tasks, soonest due first. The next page's cursor is in X-Next-Cursor."""
+    todos = await todos_repo.list_all_todo_for_task(
+        requesting_user=current_user,
+        after=decode_cursor(cursor, datetime.date, int),
+        page_chunk_size=page_chunk_size,
+        priority=priority,
+        duedate_from=duedate_from,
+        duedate_to=duedate_to,
+    )
+    if len(todos) == page_chunk_size:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(todos[-1].duedate, todos[-1].id)
+    return await todos_repo.populate_todos(todos=todos, requesting_user=current_user)
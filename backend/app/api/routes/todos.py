@@ -1,21 +1,37 @@
 """Routes for todo."""
 
-from typing import List
+import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Body, Depends, status
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Path, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.conditional import ETAG_HEADER, etag_for, get_if_match
 from app.api.dependencies.database import get_repository
-from app.api.dependencies.todos import (check_todo_modification_permission,
-                                        get_todo_by_id_from_path)
+from app.api.dependencies.fields import SparseFieldset, sparse_response
+from app.api.dependencies.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.api.dependencies.todos import (check_todo_modification_permission, get_expanded_todo_by_id_from_path,
+                                        get_todo_by_id_from_path, todo_fieldset, user_owns_todo)
 from app.db.repositories.comments import CommentsRepository
+from app.db.repositories.todo_events import TodoEventsRepository
 from app.db.repositories.todos import TodosRepository
 from app.models.comment import CommentInDB
-from app.models.todo import TodoCreate, TodoInDB, TodoPublic, TodoUpdate
+from app.models.todo import (PriorityType, TodoBulkCreateList, TodoBulkDeleteList, TodoBulkResult, TodoBulkUpdateList,
+                             TodoCreate, TodoEvent, TodoFileFormat, TodoImportResult, TodoInDB, TodoOrderBy,
+                             TodoPublic, TodoSearchResult, TodoSearchScope, TodoStats, TodoUpdate)
 from app.models.user import UserInDB
+from app.services.todo_import import TodoImportReader, open_upload
 
 router = APIRouter()
 
+# (field, type) of the keyset values of each ordering, in the order they are held by cursors.
+TODO_CURSOR_FIELDS = {
+    TodoOrderBy.duedate: (("duedate", datetime.date),),
+    TodoOrderBy.updated_at: (("updated_at", datetime.datetime),),
+    TodoOrderBy.priority: (("priority", PriorityType), ("duedate", datetime.date)),
+}
+
 
 @router.post("/", response_model=TodoPublic, name="todos:create-todo", status_code=status.HTTP_201_CREATED)
 async def create_new_todo(new_todo: TodoCreate = Body(..., embed=True),
@@ -27,25 +43,156 @@ async def create_new_todo(new_todo: TodoCreate = Body(..., embed=True),
 
 
 @router.get("/", response_model=List[TodoPublic], name="todos:list-all-user-todos")
-async def get_all_todos(current_user: UserInDB = Depends(get_current_active_user),
+async def get_all_todos(response: Response,
+                        order_by: TodoOrderBy = Query(TodoOrderBy.duedate, description="Ordering of the pages."),
+                        cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
+                        page_chunk_size: int = Query(100, ge=1, le=500, description="Todos returned per page."),
+                        priority: Optional[PriorityType] = Query(None),
+                        as_task: Optional[bool] = Query(None),
+                        duedate_from: Optional[datetime.date] = Query(None),
+                        duedate_to: Optional[datetime.date] = Query(None),
+                        fieldset: SparseFieldset = Depends(todo_fieldset),
+                        current_user: UserInDB = Depends(get_current_active_user),
                         todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),) -> List[TodoPublic]:
-    """Get Method to get all users TODOs."""
-    return await todos_repo.list_all_user_todos(requesting_user=current_user)
+    """Get Method to get users TODOs a page at a time. The next page's cursor is sent in the X-Next-Cursor header."""
+    cursor_fields = TODO_CURSOR_FIELDS[order_by]
+    after = decode_cursor(cursor, TodoOrderBy, *[field_type for _, field_type in cursor_fields], int)
+    if after is not None:
+        cursor_order_by, after = after[0], after[1:]
+        if cursor_order_by != order_by:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor is for another ordering.")
+    todos = await todos_repo.list_all_user_todos(
+        requesting_user=current_user, order_by=order_by, after=after, page_chunk_size=page_chunk_size,
+        priority=priority, as_task=as_task, duedate_from=duedate_from, duedate_to=duedate_to,
+    )
+    headers = {}
+    if len(todos) == page_chunk_size:
+        last_todo = todos[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            order_by, *[getattr(last_todo, field) for field, _ in cursor_fields], last_todo.id
+        )
+    response.headers.update(headers)
+    if "owner" in fieldset.expand:
+        todos = await todos_repo.populate_todos(todos=todos, requesting_user=current_user)
+    return sparse_response(todos, fieldset=fieldset, headers=headers)
+
+
+@router.get("/search/", response_model=List[TodoSearchResult], name="todos:search-todos")
+async def search_todos(response: Response,
+                       q: str = Query(..., min_length=1, max_length=256, description="Web search style query."),
+                       scope: TodoSearchScope = Query(TodoSearchScope.own, description="Own todos or the marketplace."),
+                       cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
+                       page_chunk_size: int = Query(20, ge=1, le=100, description="Results returned per page."),
+                       current_user: UserInDB = Depends(get_current_active_user),
+                       todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+                       ) -> List[TodoSearchResult]:
+    """Get Method to search TODOs by name and notes, best match first with highlighted snippets."""
+    after = decode_cursor(cursor, float, int)
+    results = await todos_repo.search_todos(
+        q=q, requesting_user=current_user, scope=scope, after=after, page_chunk_size=page_chunk_size,
+    )
+    if len(results) == page_chunk_size:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(results[-1].rank, results[-1].id)
+    return results
+
+
+@router.get("/stats/", response_model=TodoStats, name="todos:get-todo-stats")
+async def get_todo_stats(current_user: UserInDB = Depends(get_current_active_user),
+                         todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),) -> TodoStats:
+    """Get Method to count the user's TODOs by priority, offered as task and overdue, without listing them."""
+    return await todos_repo.get_todo_stats(requesting_user=current_user, today=datetime.date.today())
+
+
+@router.get("/export/", response_class=StreamingResponse, name="todos:export-user-todos")
+async def export_todos(export_format: TodoFileFormat = Query(TodoFileFormat.ndjson, alias="format"),
+                       comments: bool = Query(False, description="Interleave each todo's comments (ndjson only)."),
+                       offers: bool = Query(False, description="Interleave each todo's task offers (ndjson only)."),
+                       current_user: UserInDB = Depends(get_current_active_user),
+                       todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+                       ) -> StreamingResponse:
+    """Get Method to download every TODO of the user, streamed so memory stays flat however many there are."""
+    if export_format == TodoFileFormat.csv:
+        content = todos_repo.export_user_todos_csv(requesting_user=current_user)
+        media_type = "text/csv"
+    else:
+        content = todos_repo.export_user_todos_ndjson(
+            requesting_user=current_user, include_comments=comments, include_offers=offers,
+        )
+        media_type = "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="todos.{export_format.value}"'}
+    return StreamingResponse(content, media_type=media_type, headers=headers)
+
+
+@router.post("/import/", response_model=TodoImportResult, name="todos:import-todos",
+             status_code=status.HTTP_201_CREATED)
+async def import_todos(file: UploadFile = File(...),
+                       import_format: Optional[TodoFileFormat] = Query(None, alias="format",
+                                                                       description="Defaults to the file extension."),
+                       current_user: UserInDB = Depends(get_current_active_user),
+                       todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+                       ) -> TodoImportResult:
+    """Post Method to create TODOs from a csv or ndjson file, all valid rows at once. Invalid rows are reported."""
+    if import_format is None:
+        suffix = (file.filename or "").rsplit(".", 1)[-1].lower()
+        if suffix not in TodoFileFormat.__members__:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Unknown file format, pass format=csv or format=ndjson.")
+        import_format = TodoFileFormat(suffix)
+    reader = TodoImportReader(open_upload(file.file), file_format=import_format)
+    try:
+        return await todos_repo.import_todos(reader=reader, requesting_user=current_user)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The file isn't utf-8 encoded text.")
+
+
+@router.post("/bulk/", response_model=List[TodoBulkResult], name="todos:bulk-create-todos",
+             status_code=status.HTTP_201_CREATED)
+async def bulk_create_todos(new_todos: TodoBulkCreateList = Body(..., embed=True),
+                            todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+                            current_user: UserInDB = Depends(get_current_active_user),) -> List[TodoBulkResult]:
+    """Post Method to create many TODOs in one request."""
+    return await todos_repo.bulk_create_todos(new_todos=new_todos, requesting_user=current_user)
+
+
+@router.patch("/bulk/", response_model=List[TodoBulkResult], name="todos:bulk-update-todos")
+async def bulk_update_todos(todo_updates: TodoBulkUpdateList = Body(..., embed=True),
+                            todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+                            current_user: UserInDB = Depends(get_current_active_user),) -> List[TodoBulkResult]:
+    """Patch Method to update many TODOs in one request. Each item gets its own status code."""
+    return await todos_repo.bulk_update_todos(todo_updates=todo_updates, requesting_user=current_user)
+
+
+@router.delete("/bulk/", response_model=List[TodoBulkResult], name="todos:bulk-delete-todos")
+async def bulk_delete_todos(todo_ids: TodoBulkDeleteList = Body(..., embed=True),
+                            todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),
+                            current_user: UserInDB = Depends(get_current_active_user),) -> List[TodoBulkResult]:
+    """Delete Method to delete many TODOs in one request. Each item gets its own status code."""
+    return await todos_repo.bulk_delete_todos(todo_ids=todo_ids, requesting_user=current_user)
 
 
 @router.get("/{todo_id}/", response_model=TodoPublic, name="todos:get-todo-by-id")
-async def get_todo_by_id(todo: TodoInDB = Depends(get_todo_by_id_from_path)) -> TodoPublic:
-    """Get Method to get TODOs by id."""
-    return todo
-
-
-@router.put("/{todo_id}/", response_model=TodoPublic, name="todos:update-todo-by-id",
-            dependencies=[Depends(check_todo_modification_permission)],)
-async def update_todos_by_id(todo: TodoInDB = Depends(get_todo_by_id_from_path),
+async def get_todo_by_id(response: Response,
+                         todo: TodoPublic = Depends(get_expanded_todo_by_id_from_path),
+                         fieldset: SparseFieldset = Depends(todo_fieldset),) -> TodoPublic:
+    """Get Method to get TODOs by id. Use expand=owner to embed the owner and fields= to pick fields."""
+    headers = {ETAG_HEADER: etag_for(todo.updated_at)}
+    response.headers.update(headers)
+    return sparse_response(todo, fieldset=fieldset, headers=headers)
+
+
+@router.put("/{todo_id}/", response_model=TodoPublic, name="todos:update-todo-by-id")
+async def update_todos_by_id(response: Response,
+                             todo_id: int = Path(..., ge=1),
                              todo_update: TodoUpdate = Body(..., embed=True),
+                             expected_updated_at: Optional[datetime.datetime] = Depends(get_if_match),
+                             current_user: UserInDB = Depends(get_current_active_user),
                              todos_repo: TodosRepository = Depends(get_repository(TodosRepository)),) -> TodoPublic:
-    """Update Method to update TODOs by id."""
-    return await todos_repo.update_todos_by_id(todo=todo, todo_update=todo_update)
+    """Update Method to update TODOs by id. Send the ETag of the todo in If-Match to get a 412 if it changed since."""
+    todo = await todos_repo.update_todos_by_id(
+        todo_id=todo_id, todo_update=todo_update, requesting_user=current_user, expected_updated_at=expected_updated_at
+    )
+    response.headers[ETAG_HEADER] = etag_for(todo.updated_at)
+    return todo
 
 
 @router.delete("/{todo_id}/", response_model=int, name="todos:delete-todo-by-id",
@@ -62,3 +209,24 @@ async def get_all_comments(todo: TodoInDB = Depends(get_todo_by_id_from_path),
                            ) -> List[CommentInDB]:
     """List all comment in todos."""
     return await comments_repo.get_todo_comments(todo=todo)
+
+
+@router.get("/{todo_id}/events/", response_model=List[TodoEvent], name="todos:list-todo-events")
+async def get_all_events(response: Response,
+                         cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page."),
+                         page_chunk_size: int = Query(50, ge=1, le=200, description="Events returned per page."),
+                         todo: TodoInDB = Depends(get_todo_by_id_from_path),
+                         current_user: UserInDB = Depends(get_current_active_user),
+                         events_repo: TodoEventsRepository = Depends(get_repository(TodoEventsRepository)),
+                         ) -> List[TodoEvent]:
+    """Activity history of a todo, newest first. Only its owner can read it."""
+    if not user_owns_todo(user=current_user, todo=todo):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Users are only able to view the history of todos they own.")
+    after = decode_cursor(cursor, int)
+    events = await events_repo.list_todo_events(
+        todo=todo, after=after[0] if after else None, page_chunk_size=page_chunk_size
+    )
+    if len(events) == page_chunk_size:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(events[-1].id)
+    return events
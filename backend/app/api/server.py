@@ -3,7 +3,10 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.dependencies.conditional import ETAG_HEADER
+from app.api.dependencies.pagination import NEWEST_CURSOR_HEADER, NEXT_CURSOR_HEADER
 from app.api.routes import router as api_router
+from app.api.routes.feed import FEED_CHANGES_HEADER
 from app.core import config, tasks
 
 
@@ -11,7 +14,8 @@ def get_application():
     """Server configs."""
     app = FastAPI(title=config.PROJECT_NAME, version=config.VERSION)
     app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
-                       allow_methods=["*"], allow_headers=["*"],)
+                       allow_methods=["*"], allow_headers=["*"],
+                       expose_headers=[NEXT_CURSOR_HEADER, NEWEST_CURSOR_HEADER, FEED_CHANGES_HEADER, ETAG_HEADER],)
 
     app.add_event_handler("startup", tasks.create_start_app_handler(app))
     app.add_event_handler("shutdown", tasks.create_stop_app_handler(app))
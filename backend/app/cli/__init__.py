@@ -0,0 +1 @@
+"""Entry points run as separate worker processes, e.g. `python -m app.cli.reminders`."""
@@ -0,0 +1,38 @@
+"""Delete superseded todo updates older than the retention window from the todo_events log.
+
+    python -m app.cli.compact_todo_events --retention-days 90
+
+Safe to run while the api is serving writes: events are deleted in short batches of ids.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.db.tasks import create_database, create_redis
+from app.services.todo_events import TodoEventsCompactor, todo_events_compactor
+
+
+async def main(batch_size: int, retention_days: int) -> None:
+    """Connect and run one compaction pass."""
+    db = await create_database(min_size=1, max_size=1)
+    r_db = await create_redis()
+    try:
+        print(await TodoEventsCompactor(batch_size=batch_size, retention_days=retention_days).compact(db, r_db))
+    finally:
+        await db.disconnect()
+        r_db.close()
+        await r_db.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--batch-size", type=int, default=todo_events_compactor.batch_size, help="event ids walked per statement"
+    )
+    parser.add_argument(
+        "--retention-days", type=int, default=todo_events_compactor.retention_days, help="days of full history kept"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.batch_size, args.retention_days))
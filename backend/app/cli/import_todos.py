@@ -0,0 +1,63 @@
+"""Import todos for a user from a csv or ndjson file, without going through the API.
+
+    python -m app.cli.import_todos --username alice todos.csv
+    python -m app.cli.import_todos --username alice --format ndjson todos.jsonl
+
+The file is streamed in batches, so it may be far larger than memory. Nothing is imported if the load fails.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from app.core.config import TODO_IMPORT_BATCH_SIZE
+from app.db.repositories.todos import TodosRepository
+from app.db.repositories.users import UsersRepository
+from app.db.tasks import create_database, create_redis
+from app.models.todo import TodoFileFormat
+from app.services.todo_import import TodoImportReader
+
+logger = logging.getLogger(__name__)
+
+
+def log_progress(validated: int, rejected: int) -> None:
+    """Log how far through the file the import is."""
+    logger.info(f"--- {validated} rows validated, {rejected} rejected ---")
+
+
+async def main(username: str, path: str, file_format: TodoFileFormat, batch_size: int) -> int:
+    """Connect, import the file and print the result. Returns the exit status."""
+    db = await create_database(min_size=1, max_size=1)
+    r_db = await create_redis()
+    try:
+        user = await UsersRepository(db, r_db).get_user_by_username(username=username, populate=False)
+        if not user:
+            logger.error(f"--- No user named {username} ---")
+            return 1
+        with open(path, encoding="utf-8", newline="") as file:
+            reader = TodoImportReader(file, file_format=file_format)
+            result = await TodosRepository(db, r_db).import_todos(
+                reader=reader, requesting_user=user, batch_size=batch_size, progress=log_progress
+            )
+        print(json.dumps(result.dict(), indent=2))
+        return 0
+    finally:
+        await db.disconnect()
+        r_db.close()
+        await r_db.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="csv (with a header) or ndjson file to import")
+    parser.add_argument("--username", required=True, help="user the todos are created for")
+    parser.add_argument("--format", choices=[f.value for f in TodoFileFormat], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=TODO_IMPORT_BATCH_SIZE, help="rows copied per batch")
+    args = parser.parse_args()
+    file_format = args.format or args.path.rsplit(".", 1)[-1].lower()
+    if file_format not in TodoFileFormat.__members__:
+        parser.error("unknown file format, pass --format csv or --format ndjson")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(args.username, args.path, TodoFileFormat(file_format), args.batch_size)))
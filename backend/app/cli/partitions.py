@@ -0,0 +1,39 @@
+"""Maintain the monthly partitions of comments. Meant to be run daily, from cron or a scheduled job.
+
+    python -m app.cli.partitions                    # create upcoming partitions and archive old ones
+    python -m app.cli.partitions --retention 24     # keep two years of comments live
+
+Archived partitions are attached to archive.comments, where GET /comments/archive/ reads them.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.db.tasks import create_database
+from app.services.partitions import CommentPartitionManager, comment_partitions
+
+
+async def main(retention_months: int) -> None:
+    """Connect and run the partition maintenance once."""
+    db = await create_database(min_size=1, max_size=1)
+    try:
+        manager = CommentPartitionManager(
+            months_ahead=comment_partitions.months_ahead, retention_months=retention_months
+        )
+        print(await manager.run(db))
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--retention",
+        type=int,
+        default=comment_partitions.retention_months,
+        help="months of comments kept in the live table",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.retention))
@@ -0,0 +1,36 @@
+"""Reload the redis task feed from the todos table.
+
+    python -m app.cli.rebuild_feed
+
+Run after switching FEED_BACKEND to redis, or after redis lost the feed. Feed pages are served from postgres until
+the rebuild is done. Safe to run while the api is serving writes.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.db.repositories.feed import FeedRepository
+from app.db.tasks import create_database, create_redis
+
+
+async def main(clear: bool) -> None:
+    """Connect and rebuild the feed."""
+    db = await create_database(min_size=1, max_size=1)
+    r_db = await create_redis()
+    try:
+        print(await FeedRepository(db, r_db).rebuild_task_feed(clear=clear))
+    finally:
+        await db.disconnect()
+        r_db.close()
+        await r_db.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--clear", action="store_true", help="drop the feed first, when its members are in an outdated format"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.clear))
@@ -0,0 +1,35 @@
+"""Check the todo_stats counters against the todos table and repair any drift.
+
+    python -m app.cli.reconcile_todo_stats
+
+Safe to run while the api is serving writes: each batch of owners is locked while it is recounted.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from app.db.tasks import create_database, create_redis
+from app.services.todo_stats import TodoStatsReconciler, todo_stats_reconciler
+
+
+async def main(batch_size: int) -> None:
+    """Connect and run one reconciliation pass."""
+    db = await create_database(min_size=1, max_size=1)
+    r_db = await create_redis()
+    try:
+        print(await TodoStatsReconciler(batch_size=batch_size).reconcile(db, r_db))
+    finally:
+        await db.disconnect()
+        r_db.close()
+        await r_db.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--batch-size", type=int, default=todo_stats_reconciler.batch_size, help="owners recounted per transaction"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.batch_size))
@@ -0,0 +1,44 @@
+"""Run the due date reminder scheduler as its own worker process.
+
+    python -m app.cli.reminders          # scan every REMINDER_SCAN_INTERVAL_SECONDS
+    python -m app.cli.reminders --once   # run a single scan and print its metrics
+
+Any number of workers can run, the scan lock makes sure only one of them scans at a time.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.db.tasks import create_database, create_redis
+from app.services.reminders import reminder_scheduler
+
+
+async def main(once: bool) -> None:
+    """Connect, then scan once or until interrupted."""
+    db = await create_database(min_size=1, max_size=2)
+    r_db = await create_redis()
+    try:
+        if once:
+            print(await reminder_scheduler.scan(db, r_db))
+            return
+        loop = asyncio.get_event_loop()
+        reminder_scheduler.start(db, r_db)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        await reminder_scheduler.stop()
+    finally:
+        await db.disconnect()
+        r_db.close()
+        await r_db.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="run a single scan and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.once))
@@ -39,3 +39,66 @@ DATABASE_URL = config(
 )
 
 REDIS_URL = config("REDIS_URL", cast=str, default=f"redis://{REDIS_HOST}")
+
+USER_CACHE_TTL_SECONDS = config("USER_CACHE_TTL_SECONDS", cast=int, default=60)
+USER_CACHE_LOCAL_TTL_SECONDS = config("USER_CACHE_LOCAL_TTL_SECONDS", cast=int, default=5)
+USER_CACHE_LOCAL_MAX_SIZE = config("USER_CACHE_LOCAL_MAX_SIZE", cast=int, default=1024)
+TODO_CACHE_TTL_SECONDS = config("TODO_CACHE_TTL_SECONDS", cast=int, default=300)
+# must stay well above TODO_CACHE_TTL_SECONDS so a version stamp always outlives the entries stamped with it.
+TODO_CACHE_VERSION_TTL_SECONDS = config("TODO_CACHE_VERSION_TTL_SECONDS", cast=int, default=86400)
+
+# "process" runs bcrypt in a process pool, "thread" in a thread pool and "inline" on the event loop.
+PASSWORD_HASHER_EXECUTOR = config("PASSWORD_HASHER_EXECUTOR", cast=str, default="process")
+PASSWORD_HASHER_MAX_WORKERS = config("PASSWORD_HASHER_MAX_WORKERS", cast=int, default=2)
+PASSWORD_HASHER_MAX_CONCURRENCY = config("PASSWORD_HASHER_MAX_CONCURRENCY", cast=int, default=2)
+PASSWORD_HASHER_MAX_QUEUE = config("PASSWORD_HASHER_MAX_QUEUE", cast=int, default=64)
+
+TODO_BULK_MAX_ITEMS = config("TODO_BULK_MAX_ITEMS", cast=int, default=5000)
+
+TODO_SEARCH_HEADLINE_OPTIONS = config(
+    "TODO_SEARCH_HEADLINE_OPTIONS", cast=str, default="StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20"
+)
+
+REMINDER_SCHEDULER_ENABLED = config("REMINDER_SCHEDULER_ENABLED", cast=bool, default=False)
+REMINDER_SCAN_INTERVAL_SECONDS = config("REMINDER_SCAN_INTERVAL_SECONDS", cast=int, default=300)
+REMINDER_SCAN_BATCH_SIZE = config("REMINDER_SCAN_BATCH_SIZE", cast=int, default=1000)
+REMINDER_UPCOMING_DAYS = config("REMINDER_UPCOMING_DAYS", cast=int, default=1)
+REMINDER_OVERDUE_DAYS = config("REMINDER_OVERDUE_DAYS", cast=int, default=7)
+REMINDER_LOCK_TTL_SECONDS = config("REMINDER_LOCK_TTL_SECONDS", cast=int, default=120)
+
+TODO_IMPORT_BATCH_SIZE = config("TODO_IMPORT_BATCH_SIZE", cast=int, default=10000)
+TODO_IMPORT_MAX_REPORTED_REJECTS = config("TODO_IMPORT_MAX_REPORTED_REJECTS", cast=int, default=1000)
+
+# comments are partitioned by month. partitions older than the retention window are moved to the archive schema.
+COMMENTS_PARTITION_MONTHS_AHEAD = config("COMMENTS_PARTITION_MONTHS_AHEAD", cast=int, default=3)
+COMMENTS_RETENTION_MONTHS = config("COMMENTS_RETENTION_MONTHS", cast=int, default=12)
+
+# todo_stats counters are kept by triggers. the reconciler recounts them in batches of owners and repairs any drift.
+TODO_STATS_RECONCILE_ENABLED = config("TODO_STATS_RECONCILE_ENABLED", cast=bool, default=False)
+TODO_STATS_RECONCILE_INTERVAL_SECONDS = config("TODO_STATS_RECONCILE_INTERVAL_SECONDS", cast=int, default=3600)
+TODO_STATS_RECONCILE_BATCH_SIZE = config("TODO_STATS_RECONCILE_BATCH_SIZE", cast=int, default=1000)
+
+# the task feed is read from postgres, or from a redis sorted set written on every task write and rebuilt from postgres.
+FEED_BACKEND = config("FEED_BACKEND", cast=str, default="postgres")
+FEED_REDIS_MAX_ITEMS = config("FEED_REDIS_MAX_ITEMS", cast=int, default=10000)
+# the newest feed items of every user are cached for a few seconds and each user's first page is cut from them.
+# a ttl of 0 turns the cache off. FEED_PAGE_CACHE_MAX_ITEMS should stay well above the largest page size.
+FEED_PAGE_CACHE_TTL_SECONDS = config("FEED_PAGE_CACHE_TTL_SECONDS", cast=float, default=5)
+FEED_PAGE_CACHE_STALE_SECONDS = config("FEED_PAGE_CACHE_STALE_SECONDS", cast=int, default=60)
+FEED_PAGE_CACHE_MAX_ITEMS = config("FEED_PAGE_CACHE_MAX_ITEMS", cast=int, default=100)
+# probing the feed for changes counts new items up to this many, a client refetches the feed on any.
+FEED_CHANGES_MAX_COUNT = config("FEED_CHANGES_MAX_COUNT", cast=int, default=100)
+
+# task events are pushed to streaming clients. one worker relays postgres notifications to redis, every worker
+# fans them out to its own connections, dropping those whose send buffer fills up.
+FEED_STREAM_ENABLED = config("FEED_STREAM_ENABLED", cast=bool, default=False)
+FEED_STREAM_BUFFER_SIZE = config("FEED_STREAM_BUFFER_SIZE", cast=int, default=100)
+FEED_STREAM_MAX_SUBSCRIBERS = config("FEED_STREAM_MAX_SUBSCRIBERS", cast=int, default=10000)
+FEED_STREAM_HEARTBEAT_SECONDS = config("FEED_STREAM_HEARTBEAT_SECONDS", cast=float, default=15)
+FEED_STREAM_RELAY_LOCK_TTL_SECONDS = config("FEED_STREAM_RELAY_LOCK_TTL_SECONDS", cast=int, default=30)
+
+# todo_events is append-only. updates older than the retention window are compacted to the last one of each todo.
+TODO_EVENTS_COMPACT_ENABLED = config("TODO_EVENTS_COMPACT_ENABLED", cast=bool, default=False)
+TODO_EVENTS_COMPACT_INTERVAL_SECONDS = config("TODO_EVENTS_COMPACT_INTERVAL_SECONDS", cast=int, default=86400)
+TODO_EVENTS_COMPACT_BATCH_SIZE = config("TODO_EVENTS_COMPACT_BATCH_SIZE", cast=int, default=10000)
+TODO_EVENTS_RETENTION_DAYS = config("TODO_EVENTS_RETENTION_DAYS", cast=int, default=90)
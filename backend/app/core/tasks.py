@@ -1,9 +1,27 @@
 """Core task: Connect and Disconnect to db and redis when application starts and stops."""
+import datetime
+import logging
 from typing import Callable
 
+from app.core.config import (
+    FEED_STREAM_ENABLED,
+    REMINDER_SCHEDULER_ENABLED,
+    TODO_EVENTS_COMPACT_ENABLED,
+    TODO_STATS_RECONCILE_ENABLED,
+)
+from app.db.repositories.feed import FeedRepository
 from app.db.tasks import close_db_connection, connect_to_db, connect_to_redis  # ,close_redis_connection
+from app.services import task_feed
+from app.services.feed_stream import feed_stream
+from app.services.hashing import password_hasher
+from app.services.partitions import comment_partitions
+from app.services.reminders import reminder_scheduler
+from app.services.todo_events import todo_events_compactor
+from app.services.todo_stats import todo_stats_reconciler
 from fastapi import FastAPI
 
+logger = logging.getLogger(__name__)
+
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     """Connect to redis and db."""
@@ -11,6 +29,24 @@ def create_start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
         await connect_to_db(app)
         await connect_to_redis(app)
+        # without the partition of the current month every comment insert fails, so startup does too.
+        await comment_partitions.ensure_partitions(app.state._db, today=datetime.date.today())
+        if task_feed.enabled:
+            try:
+                if not await task_feed.is_built(app.state._redis):
+                    await FeedRepository(app.state._db, app.state._redis).rebuild_task_feed()
+            except Exception as e:
+                logger.warning("--- TASK FEED REBUILD ERROR ---")
+                logger.warning(e)
+                logger.warning("--- TASK FEED REBUILD ERROR ---")
+        if REMINDER_SCHEDULER_ENABLED:
+            reminder_scheduler.start(app.state._db, app.state._redis)
+        if TODO_STATS_RECONCILE_ENABLED:
+            todo_stats_reconciler.start(app.state._db, app.state._redis)
+        if TODO_EVENTS_COMPACT_ENABLED:
+            todo_events_compactor.start(app.state._db, app.state._redis)
+        if FEED_STREAM_ENABLED:
+            feed_stream.start(app.state._db, app.state._redis)
 
     return start_app
 
@@ -19,7 +55,12 @@ def create_stop_app_handler(app: FastAPI) -> Callable:
     """Disconnect to redis and db."""
 
     async def stop_app() -> None:
+        await reminder_scheduler.stop()
+        await todo_stats_reconciler.stop()
+        await todo_events_compactor.stop()
+        await feed_stream.stop()
         await close_db_connection(app)
+        password_hasher.shutdown()
         # await close_redis_connection(app) # connection auto closes after query.
 
     return stop_app
@@ -0,0 +1,41 @@
+"""cover_todo_events_feed_index
+Revision ID: 0a7d3e5b9c21
+Revises: f2c6a9d03e58
+Create Date: 2026-10-17 22:48:19.560137
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "0a7d3e5b9c21"
+
+down_revision = "f2c6a9d03e58"
+branch_labels = None
+depends_on = None
+
+
+def cover_todo_events_feed_index() -> None:
+    """Carry owner and event_type in the feed index, so probing the feed for changes is an index only scan."""
+    op.drop_index("ix_todo_events_as_task_event_timestamp_id", table_name="todo_events")
+    op.execute(
+        """
+        CREATE INDEX ix_todo_events_as_task_event_timestamp_id
+        ON todo_events (event_timestamp, id)
+        INCLUDE (owner, event_type)
+        WHERE as_task;
+        """
+    )
+
+
+def upgrade() -> None:
+    cover_todo_events_feed_index()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todo_events_as_task_event_timestamp_id", table_name="todo_events")
+    op.execute(
+        """
+        CREATE INDEX ix_todo_events_as_task_event_timestamp_id
+        ON todo_events (event_timestamp, id)
+        WHERE as_task;
+        """
+    )
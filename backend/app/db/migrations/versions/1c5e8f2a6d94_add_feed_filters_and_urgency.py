@@ -0,0 +1,184 @@
+"""add_feed_filters_and_urgency
+Revision ID: 1c5e8f2a6d94
+Revises: 0a7d3e5b9c21
+Create Date: 2026-10-17 23:21:44.117093
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "1c5e8f2a6d94"
+
+down_revision = "0a7d3e5b9c21"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# days of lead time each priority gets on its duedate when ranking by urgency. mirrored by the feed repository.
+PRIORITY_URGENCY_LEAD_DAYS = {"critical": 14, "high": 7, "standard": 3, "normal": 0}
+
+# columns of a todo an event records the values of.
+TODO_EVENT_COLUMNS = ("name", "notes", "priority", "duedate", "as_task")
+
+# partial indexes of the filtered and ranked feed, built concurrently.
+FEED_FILTER_INDEXES = {
+    "ix_todos_as_task_urgency_score_id": "todos (urgency_score, id) WHERE as_task",
+    "ix_todos_as_task_priority_urgency_score_id": "todos (priority, urgency_score, id) WHERE as_task",
+    "ix_todo_events_as_task_priority_event_timestamp_id": """
+        todo_events (priority, event_timestamp, id) INCLUDE (owner, duedate) WHERE as_task
+    """,
+}
+
+
+def todo_event_values(row: str) -> str:
+    """jsonb object of the recorded columns of a row."""
+    return "jsonb_build_object({})".format(", ".join(f"'{column}', {row}.{column}" for column in TODO_EVENT_COLUMNS))
+
+
+def create_urgency_score_column() -> None:
+    """Urgency of a todo: its duedate in days since the epoch, less the lead time of its priority. Lowest first.
+
+    A trigger recomputes it when a todo's priority or duedate is written.
+    """
+    leads = " ".join(f"WHEN '{priority}' THEN {days}" for priority, days in PRIORITY_URGENCY_LEAD_DAYS.items())
+    op.execute(
+        f"""
+        CREATE FUNCTION todo_urgency_score(priority todo_priority, duedate date)
+            RETURNS integer AS
+        $$
+            SELECT (duedate - DATE '1970-01-01') - CASE priority {leads} END;
+        $$ language 'sql' IMMUTABLE;
+        """
+    )
+    op.execute("ALTER TABLE todos ADD COLUMN urgency_score integer;")
+    op.execute(
+        """
+        CREATE FUNCTION set_todos_urgency_score()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            NEW.urgency_score = todo_urgency_score(NEW.priority, NEW.duedate);
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER set_todos_urgency_score
+            BEFORE INSERT OR UPDATE OF priority, duedate
+            ON todos
+            FOR EACH ROW
+        EXECUTE PROCEDURE set_todos_urgency_score();
+        """
+    )
+    # checked later without blocking writes, then lets SET NOT NULL skip its table scan.
+    op.execute(
+        """
+        ALTER TABLE todos
+        ADD CONSTRAINT todos_urgency_score_not_null CHECK (urgency_score IS NOT NULL) NOT VALID;
+        """
+    )
+
+
+def set_todo_events_functions(with_filter_columns: bool) -> None:
+    """Event triggers, recording the priority and duedate of the todo on each event so the feed can filter them."""
+    columns = ", priority, duedate" if with_filter_columns else ""
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION todo_events_after_insert()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            INSERT INTO todo_events (todo_id, owner, event_type, as_task, event_timestamp, changes{columns})
+            SELECT id, owner, 'is_create', as_task, created_at, {todo_event_values("new_rows")}{columns}
+            FROM new_rows
+            ORDER BY id;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    new_columns = ", new_rows.priority, new_rows.duedate" if with_filter_columns else ""
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION todo_events_after_update()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            IF current_setting('app.preserve_updated_at', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            INSERT INTO todo_events (todo_id, owner, event_type, as_task, event_timestamp, changes{columns})
+            SELECT new_rows.id, new_rows.owner, 'is_update', new_rows.as_task, new_rows.updated_at,
+                   diff.changes{new_columns}
+            FROM new_rows
+            JOIN old_rows ON old_rows.id = new_rows.id
+            CROSS JOIN LATERAL (
+                SELECT jsonb_object_agg(new_values.key, new_values.value) AS changes
+                FROM jsonb_each({todo_event_values("new_rows")}) AS new_values
+                WHERE new_values.value IS DISTINCT FROM {todo_event_values("old_rows")} -> new_values.key
+            ) AS diff
+            WHERE diff.changes IS NOT NULL
+            ORDER BY new_rows.id;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+
+
+def backfill_in_batches(table: str, update: str) -> None:
+    """Run an update over ranges of ids, one short transaction per range. Must run in an autocommit block."""
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text(f"SELECT coalesce(max(id), 0) FROM {table};")).scalar()
+    for id_from in range(1, max_id + 1, BACKFILL_BATCH_SIZE):
+        bind.execute(sa.text(update), {"id_from": id_from, "id_to": id_from + BACKFILL_BATCH_SIZE - 1})
+
+
+def upgrade() -> None:
+    create_urgency_score_column()
+    op.execute("ALTER TABLE todo_events ADD COLUMN priority todo_priority, ADD COLUMN duedate date;")
+    set_todo_events_functions(with_filter_columns=True)
+    # batches, validation and index builds each commit on their own, so writes are never blocked for long.
+    with op.get_context().autocommit_block():
+        op.execute("SET app.preserve_updated_at = 'on';")
+        backfill_in_batches(
+            "todos",
+            """
+            UPDATE todos
+            SET urgency_score = todo_urgency_score(priority, duedate)
+            WHERE id BETWEEN :id_from AND :id_to
+            AND urgency_score IS NULL;
+            """,
+        )
+        op.execute("RESET app.preserve_updated_at;")
+        # events of a todo get its current values, which are those of its newest event.
+        backfill_in_batches(
+            "todo_events",
+            """
+            UPDATE todo_events AS e
+            SET priority = t.priority, duedate = t.duedate
+            FROM todos AS t
+            WHERE t.id = e.todo_id
+            AND e.id BETWEEN :id_from AND :id_to
+            AND e.priority IS NULL;
+            """,
+        )
+        op.execute("ALTER TABLE todos VALIDATE CONSTRAINT todos_urgency_score_not_null;")
+        for name, definition in FEED_FILTER_INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY {name} ON {definition};")
+    op.execute("ALTER TABLE todos ALTER COLUMN urgency_score SET NOT NULL;")
+    op.execute("ALTER TABLE todos DROP CONSTRAINT todos_urgency_score_not_null;")
+
+
+def downgrade() -> None:
+    for name in FEED_FILTER_INDEXES:
+        op.execute(f"DROP INDEX {name};")
+    set_todo_events_functions(with_filter_columns=False)
+    op.execute("ALTER TABLE todo_events DROP COLUMN priority, DROP COLUMN duedate;")
+    op.execute("DROP TRIGGER set_todos_urgency_score ON todos;")
+    op.execute("DROP FUNCTION set_todos_urgency_score;")
+    op.execute("ALTER TABLE todos DROP COLUMN urgency_score;")
+    op.execute("DROP FUNCTION todo_urgency_score;")
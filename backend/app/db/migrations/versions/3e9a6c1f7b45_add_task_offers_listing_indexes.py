@@ -0,0 +1,31 @@
+"""add_task_offers_listing_indexes
+Revision ID: 3e9a6c1f7b45
+Revises: 1c5e8f2a6d94
+Create Date: 2026-10-18 00:12:08.463519
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "3e9a6c1f7b45"
+
+down_revision = "1c5e8f2a6d94"
+branch_labels = None
+depends_on = None
+
+# the offers of a task oldest first, of all statuses or of one. the status one also counts them by status.
+TASK_OFFERS_INDEXES = {
+    "ix_user_task_for_todos_todo_id_created_at_user_id": ["todo_id", "created_at", "user_id"],
+    "ix_user_task_for_todos_todo_id_status_created_at_user_id": ["todo_id", "status", "created_at", "user_id"],
+}
+
+
+def upgrade() -> None:
+    # built concurrently, so offers can still be made while they build.
+    with op.get_context().autocommit_block():
+        for name, columns in TASK_OFFERS_INDEXES.items():
+            op.create_index(name, "user_task_for_todos", columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    for name in TASK_OFFERS_INDEXES:
+        op.drop_index(name, table_name="user_task_for_todos")
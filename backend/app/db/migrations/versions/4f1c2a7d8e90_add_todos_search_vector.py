@@ -0,0 +1,53 @@
+"""add_todos_search_vector
+Revision ID: 4f1c2a7d8e90
+Revises: 9499071db71a
+Create Date: 2026-10-17 11:02:47.530118
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "4f1c2a7d8e90"
+
+down_revision = "9499071db71a"
+branch_labels = None
+depends_on = None
+
+
+def create_todos_search_vector() -> None:
+    """Generated tsvector over name (weight A) and notes (weight B), kept in sync by postgres on every write."""
+    op.execute(
+        """
+        ALTER TABLE todos
+        ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(notes, '')), 'B')
+        ) STORED;
+        """
+    )
+
+
+def create_todos_search_indexes() -> None:
+    """GIN indexes for the owner scoped search and the as_task marketplace search."""
+    # btree_gin lets the owner equality and the text match be answered by the same GIN index.
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin;")
+    op.create_index("ix_todos_owner_search_vector", "todos", ["owner", "search_vector"], postgresql_using="gin")
+    op.create_index(
+        "ix_todos_as_task_search_vector",
+        "todos",
+        ["search_vector"],
+        postgresql_using="gin",
+        postgresql_where=sa.text("as_task"),
+    )
+
+
+def upgrade() -> None:
+    create_todos_search_vector()
+    create_todos_search_indexes()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_as_task_search_vector", table_name="todos")
+    op.drop_index("ix_todos_owner_search_vector", table_name="todos")
+    op.execute("ALTER TABLE todos DROP COLUMN search_vector;")
@@ -0,0 +1,41 @@
+"""add_todo_tasks_partial_indexes
+Revision ID: 7d2e9b14c6a3
+Revises: c3a8e41f5b27
+Create Date: 2026-10-17 15:02:47.106583
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "7d2e9b14c6a3"
+
+down_revision = "c3a8e41f5b27"
+branch_labels = None
+depends_on = None
+
+
+def create_todo_tasks_partial_indexes() -> None:
+    """Partial indexes for the task marketplace. They only hold todos offered as tasks and taken offers."""
+    op.create_index("ix_todos_as_task_duedate_id", "todos", ["duedate", "id"], postgresql_where=sa.text("as_task"))
+    op.create_index(
+        "ix_todos_as_task_priority_duedate_id",
+        "todos",
+        ["priority", "duedate", "id"],
+        postgresql_where=sa.text("as_task"),
+    )
+    op.create_index(
+        "ix_user_task_for_todos_taken_todo_id",
+        "user_task_for_todos",
+        ["todo_id"],
+        postgresql_where=sa.text("status IN ('accepted', 'completed')"),
+    )
+
+
+def upgrade() -> None:
+    create_todo_tasks_partial_indexes()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_task_for_todos_taken_todo_id", table_name="user_task_for_todos")
+    op.drop_index("ix_todos_as_task_priority_duedate_id", table_name="todos")
+    op.drop_index("ix_todos_as_task_duedate_id", table_name="todos")
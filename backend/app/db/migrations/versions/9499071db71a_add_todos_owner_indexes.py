@@ -0,0 +1,30 @@
+"""add_todos_owner_indexes
+Revision ID: 9499071db71a
+Revises: 9bf7d5cb7916
+Create Date: 2026-10-17 09:12:31.418204
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "9499071db71a"
+
+down_revision = "9bf7d5cb7916"
+branch_labels = None
+depends_on = None
+
+
+def create_todos_owner_indexes() -> None:
+    """Composite indexes so every page of a user's todo listing is an index range scan."""
+    op.create_index("ix_todos_owner_duedate_id", "todos", ["owner", "duedate", "id"])
+    op.create_index("ix_todos_owner_updated_at_id", "todos", ["owner", "updated_at", "id"])
+    op.create_index("ix_todos_owner_priority_duedate_id", "todos", ["owner", "priority", "duedate", "id"])
+
+
+def upgrade() -> None:
+    create_todos_owner_indexes()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_owner_priority_duedate_id", table_name="todos")
+    op.drop_index("ix_todos_owner_updated_at_id", table_name="todos")
+    op.drop_index("ix_todos_owner_duedate_id", table_name="todos")
@@ -0,0 +1,152 @@
+"""partition_comments_by_month
+Revision ID: a5f3c7e19d62
+Revises: e81b5c0d92f4
+Create Date: 2026-10-17 18:05:33.914270
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "a5f3c7e19d62"
+
+down_revision = "e81b5c0d92f4"
+branch_labels = None
+depends_on = None
+
+PARTITION_MONTHS_AHEAD = 3
+
+
+def create_comments_partition_function() -> None:
+    """Create the month partition of comments a date falls in, with its updated_at trigger.
+
+    Partitions are named comments_pYYYY_MM and bounded at midnight UTC. Months that were archived are left alone.
+    postgres 12 can't put row triggers on a partitioned table, so each partition gets its own.
+    """
+    op.execute(
+        """
+        CREATE FUNCTION create_comments_partition(month date)
+            RETURNS text AS
+        $$
+        DECLARE
+            partition_start date := date_trunc('month', month);
+            partition_name text := 'comments_p' || to_char(partition_start, 'YYYY_MM');
+        BEGIN
+            IF to_regclass('public.' || partition_name) IS NULL
+            AND to_regclass('archive.' || partition_name) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE public.%I PARTITION OF public.comments FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    partition_start::timestamp AT TIME ZONE 'UTC',
+                    (partition_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+                EXECUTE format(
+                    'CREATE TRIGGER update_comments_modtime BEFORE UPDATE ON public.%I '
+                    'FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column()',
+                    partition_name
+                );
+            END IF;
+            RETURN partition_name;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+
+
+def create_partitioned_comments_table() -> None:
+    """Range partitioned comments. The partition key has to be part of the primary key."""
+    op.execute("ALTER TABLE comments RENAME TO comments_unpartitioned;")
+    op.execute(
+        """
+        CREATE TABLE comments (
+            id              integer NOT NULL DEFAULT nextval('comments_id_seq'),
+            body            text DEFAULT '',
+            todo_id         integer REFERENCES todos (id) ON DELETE CASCADE,
+            comment_owner   integer REFERENCES users (id) ON DELETE CASCADE,
+            task            boolean DEFAULT false,
+            created_at      timestamptz NOT NULL DEFAULT now(),
+            updated_at      timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        """
+    )
+    op.create_index("ix_comments_todo_id", "comments", ["todo_id"])
+    op.create_index("ix_comments_comment_owner_created_at", "comments", ["comment_owner", "created_at"])
+
+
+def create_archive_comments_table() -> None:
+    """Parent the archive job attaches detached partitions to, so archived comments stay queryable."""
+    op.execute("CREATE SCHEMA IF NOT EXISTS archive;")
+    op.execute("CREATE TABLE archive.comments (LIKE public.comments) PARTITION BY RANGE (created_at);")
+    op.create_index(
+        "ix_archive_comments_comment_owner_created_at", "comments", ["comment_owner", "created_at"], schema="archive"
+    )
+
+
+def move_comments_into_partitions() -> None:
+    """Copy comments into their partitions. The rename holds comments locked until the migration commits."""
+    op.execute(
+        f"""
+        SELECT create_comments_partition(CAST(month AS date))
+        FROM generate_series(
+            (SELECT date_trunc('month', coalesce(min(created_at), now())) FROM comments_unpartitioned),
+            date_trunc('month', now()) + interval '{PARTITION_MONTHS_AHEAD} months',
+            interval '1 month'
+        ) AS month;
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO comments (id, body, todo_id, comment_owner, task, created_at, updated_at)
+        SELECT id, body, todo_id, comment_owner, task, created_at, updated_at
+        FROM comments_unpartitioned;
+        """
+    )
+    # the sequence belongs to the old table's id column and would be dropped with it.
+    op.execute("ALTER SEQUENCE comments_id_seq OWNED BY NONE;")
+    op.execute("DROP TABLE comments_unpartitioned;")
+    op.execute("ALTER SEQUENCE comments_id_seq OWNED BY comments.id;")
+
+
+def upgrade() -> None:
+    create_partitioned_comments_table()
+    create_comments_partition_function()
+    create_archive_comments_table()
+    move_comments_into_partitions()
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE comments RENAME TO comments_partitioned;")
+    op.execute(
+        """
+        CREATE TABLE comments (
+            id              integer PRIMARY KEY DEFAULT nextval('comments_id_seq'),
+            body            text DEFAULT '',
+            todo_id         integer REFERENCES todos (id) ON DELETE CASCADE,
+            comment_owner   integer REFERENCES users (id) ON DELETE CASCADE,
+            task            boolean DEFAULT false,
+            created_at      timestamptz NOT NULL DEFAULT now(),
+            updated_at      timestamptz NOT NULL DEFAULT now()
+        );
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO comments (id, body, todo_id, comment_owner, task, created_at, updated_at)
+        SELECT id, body, todo_id, comment_owner, task, created_at, updated_at FROM comments_partitioned
+        UNION ALL
+        SELECT id, body, todo_id, comment_owner, task, created_at, updated_at FROM archive.comments;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_comments_modtime
+            BEFORE UPDATE
+            ON comments
+            FOR EACH ROW
+        EXECUTE PROCEDURE update_updated_at_column()
+        """
+    )
+    op.execute("ALTER SEQUENCE comments_id_seq OWNED BY NONE;")
+    op.execute("DROP TABLE comments_partitioned;")
+    op.execute("ALTER SEQUENCE comments_id_seq OWNED BY comments.id;")
+    op.execute("DROP SCHEMA archive CASCADE;")
+    op.execute("DROP FUNCTION create_comments_partition;")
@@ -0,0 +1,128 @@
+"""add_todo_stats_counters
+Revision ID: b92d4e6f0a18
+Revises: a5f3c7e19d62
+Create Date: 2026-10-17 19:31:06.227845
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "b92d4e6f0a18"
+
+down_revision = "a5f3c7e19d62"
+branch_labels = None
+depends_on = None
+
+# counts of a set of todo rows with owner, priority and as_task columns, and a sign column to add or subtract them.
+# owners whose counts cancel out, like an update that only renames a todo, are left out.
+TODO_STATS_DELTA = """
+    SELECT * FROM (
+        SELECT owner,
+               sum(sign) AS total,
+               coalesce(sum(sign) FILTER (WHERE priority = 'critical'), 0) AS critical,
+               coalesce(sum(sign) FILTER (WHERE priority = 'high'), 0) AS high,
+               coalesce(sum(sign) FILTER (WHERE priority = 'standard'), 0) AS standard,
+               coalesce(sum(sign) FILTER (WHERE priority = 'normal'), 0) AS normal,
+               coalesce(sum(sign) FILTER (WHERE as_task), 0) AS as_task
+        FROM ({rows}) AS delta
+        GROUP BY owner
+    ) AS counts
+    WHERE (total, critical, high, standard, normal, as_task) <> (0, 0, 0, 0, 0, 0)
+    ORDER BY owner
+"""
+
+# rows each statement trigger counts, from its transition tables.
+TODO_STATS_TRIGGER_ROWS = {
+    "INSERT": "SELECT owner, priority, as_task, 1 AS sign FROM new_rows",
+    "DELETE": "SELECT owner, priority, as_task, -1 AS sign FROM old_rows",
+    "UPDATE": """
+        SELECT owner, priority, as_task, -1 AS sign FROM old_rows
+        UNION ALL
+        SELECT owner, priority, as_task, 1 AS sign FROM new_rows
+    """,
+}
+
+TODO_STATS_TRIGGER_TRANSITIONS = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+}
+
+
+def create_todo_stats_table() -> None:
+    """Per user todo counters. No foreign key: deleting a user cascades to todos, whose trigger still upserts here."""
+    op.execute(
+        """
+        CREATE TABLE todo_stats (
+            owner       integer PRIMARY KEY,
+            total       bigint NOT NULL DEFAULT 0,
+            critical    bigint NOT NULL DEFAULT 0,
+            high        bigint NOT NULL DEFAULT 0,
+            standard    bigint NOT NULL DEFAULT 0,
+            normal      bigint NOT NULL DEFAULT 0,
+            as_task     bigint NOT NULL DEFAULT 0
+        );
+        """
+    )
+
+
+def create_todo_stats_triggers() -> None:
+    """Statement triggers, so a bulk write updates each owner's counters once rather than once per row.
+
+    Owners are upserted in order so concurrent multi owner statements can't deadlock on the counter rows.
+    """
+    for operation, rows in TODO_STATS_TRIGGER_ROWS.items():
+        name = f"todo_stats_after_{operation.lower()}"
+        op.execute(
+            f"""
+            CREATE FUNCTION {name}()
+                RETURNS TRIGGER AS
+            $$
+            BEGIN
+                INSERT INTO todo_stats AS s (owner, total, critical, high, standard, normal, as_task)
+                {TODO_STATS_DELTA.format(rows=rows)}
+                ON CONFLICT (owner) DO UPDATE
+                SET total = s.total + EXCLUDED.total,
+                    critical = s.critical + EXCLUDED.critical,
+                    high = s.high + EXCLUDED.high,
+                    standard = s.standard + EXCLUDED.standard,
+                    normal = s.normal + EXCLUDED.normal,
+                    as_task = s.as_task + EXCLUDED.as_task;
+                RETURN NULL;
+            END;
+            $$ language 'plpgsql';
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER {name}
+                AFTER {operation}
+                ON todos
+                REFERENCING {TODO_STATS_TRIGGER_TRANSITIONS[operation]}
+                FOR EACH STATEMENT
+            EXECUTE PROCEDURE {name}()
+            """
+        )
+
+
+def backfill_todo_stats() -> None:
+    """Count existing todos. Creating the triggers blocks writes to todos until this commits, so none are missed."""
+    op.execute(
+        f"""
+        INSERT INTO todo_stats (owner, total, critical, high, standard, normal, as_task)
+        {TODO_STATS_DELTA.format(rows="SELECT owner, priority, as_task, 1 AS sign FROM todos")};
+        """
+    )
+
+
+def upgrade() -> None:
+    create_todo_stats_table()
+    create_todo_stats_triggers()
+    backfill_todo_stats()
+
+
+def downgrade() -> None:
+    for operation in TODO_STATS_TRIGGER_ROWS:
+        name = f"todo_stats_after_{operation.lower()}"
+        op.execute(f"DROP TRIGGER {name} ON todos;")
+        op.execute(f"DROP FUNCTION {name};")
+    op.drop_table("todo_stats")
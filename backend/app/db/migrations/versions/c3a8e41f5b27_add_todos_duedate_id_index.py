@@ -0,0 +1,28 @@
+"""add_todos_duedate_id_index
+Revision ID: c3a8e41f5b27
+Revises: 4f1c2a7d8e90
+Create Date: 2026-10-17 13:26:09.771342
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "c3a8e41f5b27"
+
+down_revision = "4f1c2a7d8e90"
+branch_labels = None
+depends_on = None
+
+
+def replace_todos_duedate_index() -> None:
+    """(duedate, id) keyset index for the reminder scans. It answers every lookup the duedate index did."""
+    op.create_index("ix_todos_duedate_id", "todos", ["duedate", "id"])
+    op.drop_index("ix_todos_duedate", table_name="todos")
+
+
+def upgrade() -> None:
+    replace_todos_duedate_index()
+
+
+def downgrade() -> None:
+    op.create_index("ix_todos_duedate", "todos", ["duedate"])
+    op.drop_index("ix_todos_duedate_id", table_name="todos")
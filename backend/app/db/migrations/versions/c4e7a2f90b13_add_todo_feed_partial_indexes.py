@@ -0,0 +1,36 @@
+"""add_todo_feed_partial_indexes
+Revision ID: c4e7a2f90b13
+Revises: b92d4e6f0a18
+Create Date: 2026-10-17 20:12:41.503318
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "c4e7a2f90b13"
+
+down_revision = "b92d4e6f0a18"
+branch_labels = None
+depends_on = None
+
+
+def create_todo_feed_partial_indexes() -> None:
+    """Partial indexes for the two branches of the task feed, scanned backwards from the page cursor."""
+    op.create_index(
+        "ix_todos_as_task_created_at_id", "todos", ["created_at", "id"], postgresql_where=sa.text("as_task")
+    )
+    op.create_index(
+        "ix_todos_as_task_updated_at_id",
+        "todos",
+        ["updated_at", "id"],
+        postgresql_where=sa.text("as_task AND updated_at <> created_at"),
+    )
+
+
+def upgrade() -> None:
+    create_todo_feed_partial_indexes()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_as_task_updated_at_id", table_name="todos")
+    op.drop_index("ix_todos_as_task_created_at_id", table_name="todos")
@@ -0,0 +1,162 @@
+"""add_todo_events
+Revision ID: d5b1f8e3a407
+Revises: c4e7a2f90b13
+Create Date: 2026-10-17 21:04:52.318660
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "d5b1f8e3a407"
+
+down_revision = "c4e7a2f90b13"
+branch_labels = None
+depends_on = None
+
+TODO_EVENT_TYPE_VALUES = ("is_create", "is_update")
+
+# columns of a todo an event records the values of.
+TODO_EVENT_COLUMNS = ("name", "notes", "priority", "duedate", "as_task")
+
+
+def todo_event_values(row: str) -> str:
+    """jsonb object of the recorded columns of a row."""
+    return "jsonb_build_object({})".format(", ".join(f"'{column}', {row}.{column}" for column in TODO_EVENT_COLUMNS))
+
+
+def create_todo_events_table() -> None:
+    """Append-only log of todo writes. An event is deleted with its todo, or by compaction once old enough."""
+    op.execute(f"CREATE TYPE todo_event_type AS ENUM {TODO_EVENT_TYPE_VALUES};")
+    op.execute(
+        """
+        CREATE TABLE todo_events (
+            id                  bigserial PRIMARY KEY,
+            todo_id             integer NOT NULL REFERENCES todos (id) ON DELETE CASCADE,
+            owner               integer NOT NULL,
+            event_type          todo_event_type NOT NULL,
+            as_task             boolean NOT NULL,
+            event_timestamp     timestamptz NOT NULL,
+            changes             jsonb NOT NULL DEFAULT '{}'
+        );
+        """
+    )
+    # the feed reads events of tasks newest first, activity history and compaction read the events of a todo.
+    op.create_index(
+        "ix_todo_events_as_task_event_timestamp_id",
+        "todo_events",
+        ["event_timestamp", "id"],
+        postgresql_where=sa.text("as_task"),
+    )
+    op.create_index("ix_todo_events_todo_id_id", "todo_events", ["todo_id", "id"])
+
+
+def create_todo_events_triggers() -> None:
+    """Statement triggers writing an event per inserted todo, and per updated todo whose recorded columns changed.
+
+    Updates made by migrations with app.preserve_updated_at on aren't edits, and aren't recorded.
+    """
+    op.execute(
+        f"""
+        CREATE FUNCTION todo_events_after_insert()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            INSERT INTO todo_events (todo_id, owner, event_type, as_task, event_timestamp, changes)
+            SELECT id, owner, 'is_create', as_task, created_at, {todo_event_values("new_rows")}
+            FROM new_rows
+            ORDER BY id;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        f"""
+        CREATE FUNCTION todo_events_after_update()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            IF current_setting('app.preserve_updated_at', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            INSERT INTO todo_events (todo_id, owner, event_type, as_task, event_timestamp, changes)
+            SELECT new_rows.id, new_rows.owner, 'is_update', new_rows.as_task, new_rows.updated_at, diff.changes
+            FROM new_rows
+            JOIN old_rows ON old_rows.id = new_rows.id
+            CROSS JOIN LATERAL (
+                SELECT jsonb_object_agg(new_values.key, new_values.value) AS changes
+                FROM jsonb_each({todo_event_values("new_rows")}) AS new_values
+                WHERE new_values.value IS DISTINCT FROM {todo_event_values("old_rows")} -> new_values.key
+            ) AS diff
+            WHERE diff.changes IS NOT NULL
+            ORDER BY new_rows.id;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    transitions = {"insert": "NEW TABLE AS new_rows", "update": "OLD TABLE AS old_rows NEW TABLE AS new_rows"}
+    for operation in ("insert", "update"):
+        op.execute(
+            f"""
+            CREATE TRIGGER todo_events_after_{operation}
+                AFTER {operation.upper()}
+                ON todos
+                REFERENCING {transitions[operation]}
+                FOR EACH STATEMENT
+            EXECUTE PROCEDURE todo_events_after_{operation}()
+            """
+        )
+
+
+def backfill_todo_events() -> None:
+    """Events of existing todos: their creation, and their last update. What changed before now wasn't kept.
+
+    Creating the triggers blocks writes to todos until this commits, so none are missed or recorded twice.
+    """
+    op.execute(
+        """
+        INSERT INTO todo_events (todo_id, owner, event_type, as_task, event_timestamp)
+        SELECT todo_id, owner, event_type, as_task, event_timestamp
+        FROM (
+            SELECT id AS todo_id, owner, CAST('is_create' AS todo_event_type) AS event_type, as_task,
+                   created_at AS event_timestamp
+            FROM todos
+            UNION ALL
+            SELECT id, owner, 'is_update', as_task, updated_at
+            FROM todos
+            WHERE updated_at <> created_at
+        ) AS events
+        ORDER BY event_timestamp, todo_id;
+        """
+    )
+
+
+def drop_todo_feed_partial_indexes() -> None:
+    """The feed no longer scans todos."""
+    op.drop_index("ix_todos_as_task_updated_at_id", table_name="todos")
+    op.drop_index("ix_todos_as_task_created_at_id", table_name="todos")
+
+
+def upgrade() -> None:
+    create_todo_events_table()
+    create_todo_events_triggers()
+    backfill_todo_events()
+    drop_todo_feed_partial_indexes()
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_todos_as_task_created_at_id", "todos", ["created_at", "id"], postgresql_where=sa.text("as_task")
+    )
+    op.create_index(
+        "ix_todos_as_task_updated_at_id",
+        "todos",
+        ["updated_at", "id"],
+        postgresql_where=sa.text("as_task AND updated_at <> created_at"),
+    )
+    for operation in ("insert", "update"):
+        op.execute(f"DROP TRIGGER todo_events_after_{operation} ON todos;")
+        op.execute(f"DROP FUNCTION todo_events_after_{operation};")
+    op.drop_table("todo_events")
+    op.execute("DROP TYPE todo_event_type;")
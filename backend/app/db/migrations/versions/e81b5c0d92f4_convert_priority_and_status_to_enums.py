@@ -0,0 +1,191 @@
+"""convert_priority_and_status_to_enums
+Revision ID: e81b5c0d92f4
+Revises: 7d2e9b14c6a3
+Create Date: 2026-10-17 16:40:12.582917
+"""
+from typing import Dict, Optional, Tuple
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "e81b5c0d92f4"
+
+down_revision = "7d2e9b14c6a3"
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+# enums sort in declaration order, so priorities are declared from most to least severe.
+TODO_PRIORITY_VALUES = ("critical", "high", "standard", "normal")
+TASK_STATUS_VALUES = ("pending", "accepted", "rejected", "cancelled", "completed")
+
+# table, key columns the backfill walks, column, enum type, column default.
+CONVERSIONS = (
+    ("todos", ("id",), "priority", "todo_priority", "high"),
+    ("user_task_for_todos", ("user_id", "todo_id"), "status", "task_status", "pending"),
+)
+
+# indexes over a converted column, rebuilt on the new column under their old names.
+CONVERTED_INDEXES = {
+    "ix_todos_owner_priority_duedate_id": ("todos", ["owner", "priority_code", "duedate", "id"], None),
+    "ix_todos_as_task_priority_duedate_id": ("todos", ["priority_code", "duedate", "id"], "as_task"),
+    "ix_user_task_for_todos_status": ("user_task_for_todos", ["status_code"], None),
+    "ix_user_task_for_todos_taken_todo_id": (
+        "user_task_for_todos",
+        ["todo_id"],
+        "status_code IN ('accepted', 'completed')",
+    ),
+}
+
+
+def set_updated_at_trigger(preserve_on_backfill: bool) -> None:
+    """Let a session backfilling a column leave updated_at alone, so rows don't look edited to clients."""
+    skip = "IF current_setting('app.preserve_updated_at', true) = 'on' THEN RETURN NEW; END IF;"
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            {skip if preserve_on_backfill else ""}
+            NEW.updated_at = now();
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+
+
+def create_enum_types() -> None:
+    op.execute(f"CREATE TYPE todo_priority AS ENUM {TODO_PRIORITY_VALUES};")
+    op.execute(f"CREATE TYPE task_status AS ENUM {TASK_STATUS_VALUES};")
+
+
+def add_shadow_column(table: str, column: str, enum_type: str) -> None:
+    """Nullable enum copy of a column, so adding it doesn't rewrite the table. A trigger keeps new writes in sync."""
+    op.execute(f"ALTER TABLE {table} ADD COLUMN {column}_code {enum_type};")
+    op.execute(
+        f"""
+        CREATE FUNCTION sync_{table}_{column}_code()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            NEW.{column}_code = CAST(NEW.{column} AS {enum_type});
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER sync_{table}_{column}_code
+            BEFORE INSERT OR UPDATE OF {column}
+            ON {table}
+            FOR EACH ROW
+        EXECUTE PROCEDURE sync_{table}_{column}_code();
+        """
+    )
+    # checked later without blocking writes, then lets SET NOT NULL skip its table scan.
+    op.execute(
+        f"""
+        ALTER TABLE {table}
+        ADD CONSTRAINT {table}_{column}_code_not_null CHECK ({column}_code IS NOT NULL) NOT VALID;
+        """
+    )
+
+
+def backfill_shadow_column(table: str, keys: Tuple[str, ...], column: str, enum_type: str) -> None:
+    """Fill the enum copy in key order, one short transaction per batch. Must run in an autocommit block."""
+    bind = op.get_bind()
+    key_list = ", ".join(keys)
+    after: Optional[Dict] = None
+    while True:
+        after_batch = f"({key_list}) > ({', '.join(f':after_{key}' for key in keys)})" if after else "TRUE"
+        last = bind.execute(
+            sa.text(
+                f"""
+                SELECT {key_list} FROM (
+                    SELECT {key_list} FROM {table}
+                    WHERE {after_batch}
+                    ORDER BY {key_list}
+                    LIMIT {BACKFILL_BATCH_SIZE}
+                ) AS batch
+                ORDER BY {key_list} DESC
+                LIMIT 1;
+                """
+            ),
+            after or {},
+        ).first()
+        if last is None:
+            break
+        last_values = {f"last_{key}": value for key, value in zip(keys, last)}
+        bind.execute(
+            sa.text(
+                f"""
+                UPDATE {table}
+                SET {column}_code = CAST({column} AS {enum_type})
+                WHERE {after_batch}
+                AND ({key_list}) <= ({', '.join(f':last_{key}' for key in keys)})
+                AND {column}_code IS NULL;
+                """
+            ),
+            {**(after or {}), **last_values},
+        )
+        after = {f"after_{key}": value for key, value in zip(keys, last)}
+
+
+def swap_shadow_column(table: str, column: str, default: str) -> None:
+    """Replace the text column by its enum copy. Only catalog changes, so the lock is held briefly."""
+    op.execute(f"DROP TRIGGER sync_{table}_{column}_code ON {table};")
+    op.execute(f"DROP FUNCTION sync_{table}_{column}_code;")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN {column}_code SET NOT NULL;")
+    op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {table}_{column}_code_not_null;")
+    op.execute(f"ALTER TABLE {table} DROP COLUMN {column};")
+    op.execute(f"ALTER TABLE {table} RENAME COLUMN {column}_code TO {column};")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT '{default}';")
+
+
+def upgrade() -> None:
+    create_enum_types()
+    set_updated_at_trigger(preserve_on_backfill=True)
+    for table, _, column, enum_type, _ in CONVERSIONS:
+        add_shadow_column(table, column, enum_type)
+    # batches, validation and index builds each commit on their own, so writes are never blocked for long.
+    with op.get_context().autocommit_block():
+        op.execute("SET app.preserve_updated_at = 'on';")
+        for table, keys, column, enum_type, _ in CONVERSIONS:
+            backfill_shadow_column(table, keys, column, enum_type)
+        op.execute("RESET app.preserve_updated_at;")
+        for table, _, column, _, _ in CONVERSIONS:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_code_not_null;")
+        for name, (table, columns, where) in CONVERTED_INDEXES.items():
+            op.create_index(
+                f"{name}_new",
+                table,
+                columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+            )
+    for table, _, column, _, default in CONVERSIONS:
+        swap_shadow_column(table, column, default)
+    for name in CONVERTED_INDEXES:
+        op.execute(f"ALTER INDEX {name}_new RENAME TO {name};")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_task_for_todos_taken_todo_id", table_name="user_task_for_todos")
+    for table, _, column, _, default in CONVERSIONS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT;")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE text USING CAST({column} AS text);")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT '{default}';")
+    op.create_index(
+        "ix_user_task_for_todos_taken_todo_id",
+        "user_task_for_todos",
+        ["todo_id"],
+        postgresql_where=sa.text("status IN ('accepted', 'completed')"),
+    )
+    op.execute("DROP TYPE task_status;")
+    op.execute("DROP TYPE todo_priority;")
+    set_updated_at_trigger(preserve_on_backfill=False)
@@ -0,0 +1,57 @@
+"""notify_todo_events
+Revision ID: f2c6a9d03e58
+Revises: d5b1f8e3a407
+Create Date: 2026-10-17 22:12:37.904215
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = "f2c6a9d03e58"
+
+down_revision = "d5b1f8e3a407"
+branch_labels = None
+depends_on = None
+
+# ids of a notification are comma separated. chunks stay well under the 8000 byte limit of a notify payload.
+NOTIFY_CHUNK_SIZE = 300
+
+
+def create_todo_events_notify_trigger() -> None:
+    """Statement trigger notifying the ids of new task events on the todo_events channel, delivered on commit."""
+    op.execute(
+        f"""
+        CREATE FUNCTION todo_events_notify()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            PERFORM pg_notify('todo_events', string_agg(id::text, ',' ORDER BY id))
+            FROM (
+                SELECT id, (row_number() OVER (ORDER BY id) - 1) / {NOTIFY_CHUNK_SIZE} AS chunk
+                FROM new_rows
+                WHERE as_task
+            ) AS task_events
+            GROUP BY chunk;
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER todo_events_notify
+            AFTER INSERT
+            ON todo_events
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+        EXECUTE PROCEDURE todo_events_notify()
+        """
+    )
+
+
+def upgrade() -> None:
+    create_todo_events_notify_trigger()
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER todo_events_notify ON todo_events;")
+    op.execute("DROP FUNCTION todo_events_notify;")
@@ -1,9 +1,26 @@
 """Base Repository."""
 
+from typing import Iterable
+
 from databases import Database
+from fastapi import HTTPException, status
 from redis.client import Redis
 
 
+def set_clause(columns: Iterable[str]) -> str:
+    """SET assignments of an UPDATE, each column bound to the parameter of the same name."""
+    # an empty update still touches the row so it gets a new updated_at, as writing every column back did.
+    return ",\n        ".join(f"{column} = :{column}" for column in columns) or "updated_at = now()"
+
+
+def precondition_failed() -> HTTPException:
+    """Error for a write whose If-Match does not match the current version of the row."""
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Resource was modified since it was read. Fetch it again and retry.",
+    )
+
+
 class BaseRepository:
     """Base class."""
 
@@ -1,9 +1,10 @@
 """DB repo for comment."""
 
 import logging
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from app.db.repositories.base import BaseRepository
+from app.db.repositories.base import BaseRepository, precondition_failed, set_clause
 from app.db.repositories.tasks import TasksRepository
 from app.db.repositories.todos import TodosRepository
 from app.models.comment import CommentCreate, CommentInDB, CommentUpdate
@@ -11,6 +12,7 @@ from app.models.task import TaskInDB
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
 from databases import Database
+from fastapi import HTTPException, status
 from redis.client import Redis
 
 logger = logging.getLogger(__name__)
@@ -50,17 +52,31 @@ GET_ALL_USER_COMMENTS_QUERY = """
 
 UPDATE_COMMENT_BY_ID_QUERY = """
     UPDATE comments
-    SET body = :body
+    SET {assignments}
     WHERE id = :id
+    AND comment_owner = :comment_owner
+    {if_match}
     RETURNING id, body, todo_id, comment_owner, created_at, updated_at;
 """
 
+# comments are partitioned by created_at month, the created_at bound prunes every other partition.
 DELETE_COMMENT_BY_ID_QUERY = """
     DELETE FROM comments
     WHERE id =:id
+    AND created_at = :created_at
     RETURNING id;
 """
 
+# partitions past the retention window, see app.services.partitions. created_at bounds prune whole months.
+LIST_ARCHIVED_USER_COMMENTS_QUERY = """
+    SELECT id, body, todo_id, comment_owner, created_at, updated_at
+    FROM archive.comments
+    WHERE comment_owner = :comment_owner
+    {filters}
+    ORDER BY created_at DESC, id DESC
+    LIMIT :page_chunk_size;
+"""
+
 
 class CommentsRepository(BaseRepository):
     """All db actions associated with the Comments resources."""
@@ -109,18 +125,45 @@ class CommentsRepository(BaseRepository):
         comments = await self.db.fetch_all(query=GET_ALL_TASKS_COMMENTS_QUERY, values={"todo_id": task.todo_id})
         return [CommentInDB(**comment) for comment in comments]
 
-    async def update_comments(self, *, comment: CommentInDB, comment_update: CommentUpdate) -> CommentInDB:
-        """Update User comments."""
-        comment_updated_params = comment.copy(update=comment_update.dict(exclude_unset=True))
+    async def update_comments(
+        self,
+        *,
+        comment_id: int,
+        comment_update: CommentUpdate,
+        requesting_user: UserInDB,
+        expected_updated_at: Optional[datetime] = None,
+    ) -> CommentInDB:
+        """Update User comments with a single statement, only if still at expected_updated_at when given."""
+        changes = comment_update.dict(exclude_unset=True)
+        values = {**changes, "id": comment_id, "comment_owner": requesting_user.id}
+        if_match = ""
+        if expected_updated_at is not None:
+            if_match = "AND updated_at = :expected_updated_at"
+            values["expected_updated_at"] = expected_updated_at
         comment_updated = await self.db.fetch_one(
-            query=UPDATE_COMMENT_BY_ID_QUERY,
-            values=comment_updated_params.dict(exclude={"comment_owner", "created_at", "updated_at", "todo_id"}),
+            query=UPDATE_COMMENT_BY_ID_QUERY.format(assignments=set_clause(changes), if_match=if_match), values=values
         )
+        if not comment_updated:
+            await self.raise_update_error(comment_id=comment_id, requesting_user=requesting_user)
         return CommentInDB(**comment_updated)
 
+    async def raise_update_error(self, *, comment_id: int, requesting_user: UserInDB) -> None:
+        """Find out why a conditional update matched no row. Only runs when an update failed."""
+        comment = await self.get_comments_by_id(id=comment_id, requesting_user=requesting_user)
+        if not comment:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No comments found with that id")
+        if comment.comment_owner != requesting_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Action forbidden. Users are unable to modify comments they did not create.",
+            )
+        raise precondition_failed()
+
     async def delete_comment(self, *, comment: CommentInDB) -> int:
         """Delete a comment."""
-        delete_comment_id = await self.db.execute(query=DELETE_COMMENT_BY_ID_QUERY, values={"id": comment.id})
+        delete_comment_id = await self.db.execute(
+            query=DELETE_COMMENT_BY_ID_QUERY, values={"id": comment.id, "created_at": comment.created_at}
+        )
         return delete_comment_id
 
     async def get_users_comments(self, *, requesting_user: UserInDB) -> List[CommentInDB]:
@@ -130,3 +173,29 @@ class CommentsRepository(BaseRepository):
         )
         print(comments)
         return [CommentInDB(**comment) for comment in comments]
+
+    async def list_archived_user_comments(
+        self,
+        *,
+        requesting_user: UserInDB,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        page_chunk_size: int = 100,
+    ) -> List[CommentInDB]:
+        """List archived comments of user, newest first, one keyset page at a time. after is (created_at, id)."""
+        filters = []
+        values = {"comment_owner": requesting_user.id, "page_chunk_size": page_chunk_size}
+        if created_from is not None:
+            filters.append("AND created_at >= :created_from")
+            values["created_from"] = created_from
+        if created_to is not None:
+            filters.append("AND created_at < :created_to")
+            values["created_to"] = created_to
+        if after is not None:
+            filters.append("AND (created_at, id) < (:after_created_at, :after_id)")
+            values["after_created_at"], values["after_id"] = after
+        comments = await self.db.fetch_all(
+            query=LIST_ARCHIVED_USER_COMMENTS_QUERY.format(filters="\n    ".join(filters)), values=values
+        )
+        return [CommentInDB(**comment) for comment in comments]
@@ -1,13 +1,19 @@
 """DB repo for feeds."""
 
+import asyncio
 import datetime
 import logging
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.db.repositories.base import BaseRepository
+from app.db.repositories.todo_events import TodoEventsRepository
+from app.db.repositories.todos import TodosRepository
 from app.db.repositories.users import UsersRepository
 from app.models.feed import TodoFeedItem
+from app.models.todo import PriorityType
 from app.models.user import UserInDB
+from app.services import feed_page_cache, task_feed
+from app.services.feed import TaskFeedEvent
 from asyncpg import Record
 from databases import Database
 from redis.client import Redis
@@ -37,64 +43,135 @@ ORDER BY GREATEST(created_at, updated_at) DESC
 LIMIT :page_chunk_size;
 """
 
-
+# one backward scan of the todo_events index from the cursor, each event joined to its todo. events of todos no
+# longer offered as tasks are skipped.
 FETCH_TODO_JOBS_FOR_FEED_QUERY = """
-SELECT id,
-       name,
-       notes,
-       priority,
-       duedate,
-       owner,
-       as_task,
-       created_at,
-       updated_at,
-       event_type,
-       event_timestamp,
-       ROW_NUMBER() OVER ( ORDER BY event_timestamp DESC ) AS row_number
-       FROM (
-           (
-               SELECT  id,
-                       name,
-                       notes,
-                       priority,
-                       duedate,
-                       owner,
-                       as_task,
-                       created_at,
-                       updated_at,
-                       updated_at AS event_timestamp,
-                       'is_update' AS event_type
-                FROM todos
-                WHERE as_task = TRUE
-                AND owner != :owner
-                AND updated_at < :starting_date
-                AND updated_at != created_at
-                ORDER BY updated_at DESC
-                LIMIT :page_chunk_size
-           ) UNION(
-               SELECT id,
-                      name,
-                      notes,
-                      priority,
-                      duedate,
-                      owner,
-                      as_task,
-                      created_at,
-                      updated_at,
-                      created_at AS event_timestamp,
-                      'is_create' AS event_type
-                FROM todos
-                WHERE as_task = TRUE
-                AND owner != :owner
-                AND created_at < :starting_date
-                ORDER BY created_at DESC
-                LIMIT :page_chunk_size
-           )
-       ) AS todo_feed
-       ORDER BY event_timestamp DESC
-       LIMIT :page_chunk_size;
+    SELECT t.id,
+           t.name,
+           t.notes,
+           t.priority,
+           t.duedate,
+           t.owner,
+           t.as_task,
+           t.created_at,
+           t.updated_at,
+           e.id AS event_id,
+           e.event_type,
+           e.event_timestamp,
+           ROW_NUMBER() OVER ( ORDER BY e.event_timestamp DESC, e.id DESC ) AS row_number
+    FROM todo_events AS e
+    JOIN todos AS t ON t.id = e.todo_id
+    WHERE e.as_task
+    AND t.as_task
+    AND {after}
+    {owner}
+    {filters}
+    ORDER BY e.event_timestamp DESC, e.id DESC
+    LIMIT :page_chunk_size;
+"""
+
+# tasks, most urgent first. one scan of the urgency_score partial index, prefixed by priority when filtered by it.
+FETCH_RANKED_TODO_JOBS_FOR_FEED_QUERY = """
+    SELECT id,
+           name,
+           notes,
+           priority,
+           duedate,
+           owner,
+           as_task,
+           created_at,
+           updated_at,
+           urgency_score,
+           CASE
+                WHEN created_at = updated_at THEN 'is_create'
+                ELSE 'is_update'
+           END AS event_type,
+           updated_at AS event_timestamp,
+           ROW_NUMBER() OVER ( ORDER BY urgency_score, id ) AS row_number
+    FROM todos
+    WHERE as_task
+    AND owner != :owner
+    {after}
+    {filters}
+    ORDER BY urgency_score, id
+    LIMIT :page_chunk_size;
 """
 
+# task events pushed to streaming clients, each joined to its todo. events of todos no longer offered as tasks are
+# skipped.
+FETCH_TODO_FEED_ITEMS_BY_EVENT_IDS_QUERY = """
+    SELECT t.id,
+           t.name,
+           t.notes,
+           t.priority,
+           t.duedate,
+           t.owner,
+           t.as_task,
+           t.created_at,
+           t.updated_at,
+           e.id AS event_id,
+           e.event_type,
+           e.event_timestamp
+    FROM todo_events AS e
+    JOIN todos AS t ON t.id = e.todo_id
+    WHERE e.id = ANY(:event_ids)
+    AND e.as_task
+    AND t.as_task
+    ORDER BY e.event_timestamp, e.id;
+"""
+
+# newest task events, down to a cursor. an index only scan, owner and event_type are included in the index.
+FETCH_TODO_FEED_CHANGES_QUERY = """
+    SELECT event_timestamp, id, event_type
+    FROM todo_events
+    WHERE as_task
+    AND owner != :owner
+    {since}
+    ORDER BY event_timestamp DESC, id DESC
+    LIMIT :limit;
+"""
+
+FEED_SINCE_CURSOR = "AND (event_timestamp, id) > (:since_timestamp, :since_id)"
+
+# where a page starts: after the event of a cursor, or before a timestamp.
+FEED_AFTER_CURSOR = "(e.event_timestamp, e.id) < (:starting_date, :id)"
+FEED_BEFORE_DATE = "e.event_timestamp < :starting_date"
+FEED_EXCLUDE_OWNER = "AND e.owner != :owner"
+RANKED_FEED_AFTER_CURSOR = "AND (urgency_score, id) > (:urgency_score, :id)"
+
+# filters of the feed, on the values recorded with each event and on its todo as it is now.
+FEED_FILTERS = {
+    "priority": "AND e.priority = :priority AND t.priority = :priority",
+    "duedate_from": "AND e.duedate >= :duedate_from AND t.duedate >= :duedate_from",
+    "duedate_to": "AND e.duedate <= :duedate_to AND t.duedate <= :duedate_to",
+}
+
+# filters of the ranked feed. a duedate window is also a range of urgency scores, which bounds the index scan.
+RANKED_FEED_FILTERS = {
+    "priority": "AND priority = :priority",
+    "duedate_from": "AND urgency_score >= :urgency_from AND duedate >= :duedate_from",
+    "duedate_to": "AND urgency_score <= :urgency_to AND duedate <= :duedate_to",
+}
+
+# days of lead time each priority gets on its duedate when ranking by urgency. mirrors todo_urgency_score in the db.
+PRIORITY_URGENCY_LEAD_DAYS = {
+    PriorityType.critical: 14,
+    PriorityType.high: 7,
+    PriorityType.standard: 3,
+    PriorityType.normal: 0,
+}
+
+
+def urgency_score(duedate: datetime.date, lead_days: int) -> int:
+    """Urgency score of a duedate with a lead time, as todo_urgency_score computes it."""
+    return (duedate - datetime.date(1970, 1, 1)).days - lead_days
+
+
+def feed_filters(clauses: Dict[str, str], **filters: Any) -> Tuple[str, Dict[str, Any]]:
+    """Clauses and values of the filters that are set."""
+    values = {name: value for name, value in filters.items() if value is not None}
+    return "\n    ".join(clauses[name] for name in values), values
+
 
 class FeedRepository(BaseRepository):
     """All db actions associated with the Feed resources."""
@@ -103,23 +180,243 @@ class FeedRepository(BaseRepository):
         """Initialize db and r_db and usersrepository."""
         super().__init__(db, r_db)
         self.users_repo = UsersRepository(db, r_db)
+        self.todos_repo = TodosRepository(db, r_db)
+        self.todo_events_repo = TodoEventsRepository(db, r_db)
+        self.task_feed = task_feed
+        self.feed_page_cache = feed_page_cache
 
     async def fetch_todo_jobs_feed(
-        self, *, requesting_user: UserInDB, page_chunk_size: int = 20, starting_date: datetime.datetime
+        self,
+        *,
+        requesting_user: UserInDB,
+        page_chunk_size: int = 20,
+        starting_date: Optional[datetime.datetime] = None,
+        after: Optional[Tuple[datetime.datetime, int, str]] = None,
+        priority: Optional[PriorityType] = None,
+        duedate_from: Optional[datetime.date] = None,
+        duedate_to: Optional[datetime.date] = None,
+    ) -> List[TodoFeedItem]:
+        """Get the task feed after the (event_timestamp, event_id, event_type) of a cursor, or before starting_date.
+
+        The first page is cut from the newest items of every user's feed, cached for a few seconds. Other pages, and
+        first pages the cache can't fill, are read from the redis feed when it can serve them, else from postgres.
+        Filtered pages are always read from postgres.
+        """
+        filters = {"priority": priority, "duedate_from": duedate_from, "duedate_to": duedate_to}
+        filtered = any(value is not None for value in filters.values())
+        if after is None and starting_date is None and not filtered:
+            todo_feed = await self.fetch_cached_todo_jobs_feed(
+                requesting_user=requesting_user, page_chunk_size=page_chunk_size
+            )
+            if todo_feed is not None:
+                return todo_feed
+        after_id = None
+        if after is not None:
+            starting_date, after_id, _ = after
+        elif starting_date is None:
+            starting_date = datetime.datetime.now(datetime.timezone.utc)
+        return await self.fetch_todo_jobs_page(
+            exclude_owner=requesting_user.id,
+            starting_date=starting_date,
+            after_id=after_id,
+            page_chunk_size=page_chunk_size,
+            **filters,
+        )
+
+    async def fetch_ranked_todo_jobs_feed(
+        self,
+        *,
+        requesting_user: UserInDB,
+        page_chunk_size: int = 20,
+        after: Optional[Tuple[int, int]] = None,
+        priority: Optional[PriorityType] = None,
+        duedate_from: Optional[datetime.date] = None,
+        duedate_to: Optional[datetime.date] = None,
     ) -> List[TodoFeedItem]:
-        """Get all todo jobs."""
+        """Get tasks most urgent first, after the (urgency_score, id) of a cursor.
+
+        Urgency is the duedate less a lead time that grows with priority, see PRIORITY_URGENCY_LEAD_DAYS.
+        """
+        lead_days = [PRIORITY_URGENCY_LEAD_DAYS[priority]] if priority else PRIORITY_URGENCY_LEAD_DAYS.values()
+        filter_clauses, values = feed_filters(
+            RANKED_FEED_FILTERS, priority=priority, duedate_from=duedate_from, duedate_to=duedate_to
+        )
+        if duedate_from is not None:
+            values["urgency_from"] = urgency_score(duedate_from, max(lead_days))
+        if duedate_to is not None:
+            values["urgency_to"] = urgency_score(duedate_to, min(lead_days))
+        values.update({"owner": requesting_user.id, "page_chunk_size": page_chunk_size})
+        after_clause = ""
+        if after is not None:
+            values["urgency_score"], values["id"] = after
+            after_clause = RANKED_FEED_AFTER_CURSOR
         todo_feed_item_records = await self.db.fetch_all(
-            query=FETCH_TODO_JOBS_FOR_FEED_QUERY,
-            values={"page_chunk_size": page_chunk_size, "starting_date": starting_date, "owner": requesting_user.id},
+            query=FETCH_RANKED_TODO_JOBS_FOR_FEED_QUERY.format(after=after_clause, filters=filter_clauses),
+            values=values,
         )
-        return [
-            await self.populate_todo_feed_item(todo_feed_item=todo_feed_item)
-            for todo_feed_item in todo_feed_item_records
-        ]
+        return await asyncio.gather(
+            *[self.populate_todo_feed_item(todo_feed_item=todo_feed_item) for todo_feed_item in todo_feed_item_records]
+        )
+
+    async def fetch_cached_todo_jobs_feed(
+        self, *, requesting_user: UserInDB, page_chunk_size: int
+    ) -> Optional[List[TodoFeedItem]]:
+        """First page of the feed from the cached items, without the requesting user's todos.
+
+        None when the cache is off, or the user owns so many of the newest tasks that the cached items can't fill the
+        page.
+        """
+        cached = await self.feed_page_cache.get(self.r_db, build=self.fetch_latest_todo_jobs)
+        if cached is None:
+            return None
+        todo_feed = [
+            item
+            for item in cached
+            if (item.owner if isinstance(item.owner, int) else item.owner.id) != requesting_user.id
+        ][:page_chunk_size]
+        if len(todo_feed) < page_chunk_size and len(cached) >= self.feed_page_cache.max_items:
+            return None
+        return [item.copy(update={"row_number": row_number}) for row_number, item in enumerate(todo_feed, start=1)]
+
+    async def fetch_latest_todo_jobs(self, page_chunk_size: int) -> List[TodoFeedItem]:
+        """Newest items of the feed of every user, which the feed page cache is built from."""
+        return await self.fetch_todo_jobs_page(
+            exclude_owner=None,
+            starting_date=datetime.datetime.now(datetime.timezone.utc),
+            after_id=None,
+            page_chunk_size=page_chunk_size,
+        )
+
+    async def fetch_todo_jobs_page(
+        self,
+        *,
+        exclude_owner: Optional[int],
+        starting_date: datetime.datetime,
+        after_id: Optional[int],
+        page_chunk_size: int,
+        priority: Optional[PriorityType] = None,
+        duedate_from: Optional[datetime.date] = None,
+        duedate_to: Optional[datetime.date] = None,
+    ) -> List[TodoFeedItem]:
+        """Get a page of the feed, skipping exclude_owner's todos unless it is None.
+
+        From the redis feed when it is enabled and can serve the page, else from postgres. The redis feed can't filter.
+        """
+        filter_clauses, values = feed_filters(
+            FEED_FILTERS, priority=priority, duedate_from=duedate_from, duedate_to=duedate_to
+        )
+        while not filter_clauses:
+            events = await self.task_feed.page(
+                self.r_db,
+                exclude_owner=exclude_owner,
+                before=starting_date,
+                after_id=after_id,
+                page_chunk_size=page_chunk_size,
+            )
+            if events is None:
+                break
+            todo_feed = await self.hydrate_todo_feed(events=events)
+            # stale events were dropped from the set, read the page again so it is full.
+            if todo_feed is not None:
+                return todo_feed
+        values.update({"page_chunk_size": page_chunk_size, "starting_date": starting_date})
+        after_clause, owner_clause = FEED_BEFORE_DATE, ""
+        if after_id is not None:
+            values["id"] = after_id
+            after_clause = FEED_AFTER_CURSOR
+        if exclude_owner is not None:
+            values["owner"] = exclude_owner
+            owner_clause = FEED_EXCLUDE_OWNER
+        todo_feed_item_records = await self.db.fetch_all(
+            query=FETCH_TODO_JOBS_FOR_FEED_QUERY.format(after=after_clause, owner=owner_clause, filters=filter_clauses),
+            values=values,
+        )
+        return await asyncio.gather(
+            *[self.populate_todo_feed_item(todo_feed_item=todo_feed_item) for todo_feed_item in todo_feed_item_records]
+        )
+
+    async def get_todo_feed_items_by_event_ids(self, *, event_ids: List[int]) -> List[TodoFeedItem]:
+        """Feed items of a batch of task events, oldest first."""
+        todo_feed_item_records = await self.db.fetch_all(
+            query=FETCH_TODO_FEED_ITEMS_BY_EVENT_IDS_QUERY, values={"event_ids": event_ids}
+        )
+        return await asyncio.gather(
+            *[self.populate_todo_feed_item(todo_feed_item=todo_feed_item) for todo_feed_item in todo_feed_item_records]
+        )
+
+    async def fetch_todo_jobs_feed_changes(
+        self,
+        *,
+        requesting_user: UserInDB,
+        since: Optional[Tuple[datetime.datetime, int, str]],
+        limit: int,
+    ) -> Tuple[int, Optional[Tuple[datetime.datetime, int, str]]]:
+        """Count the feed events after the (event_timestamp, event_id, event_type) of since, up to limit.
+
+        Returns the count and the newest event, or since when there is none. Only events are read, from the redis feed
+        or an index only scan, never their todos or owners. Events of todos no longer offered as tasks may be counted.
+        """
+        events = await self.task_feed.newer(
+            self.r_db, exclude_owner=requesting_user.id, since=since and since[:2], limit=limit
+        )
+        if events is not None:
+            newer = [(event.event_timestamp, event.id, event.event_type) for event in events]
+        else:
+            values = {"owner": requesting_user.id, "limit": limit}
+            since_clause = ""
+            if since is not None:
+                values["since_timestamp"], values["since_id"] = since[:2]
+                since_clause = FEED_SINCE_CURSOR
+            event_records = await self.db.fetch_all(
+                query=FETCH_TODO_FEED_CHANGES_QUERY.format(since=since_clause), values=values
+            )
+            newer = [(event["event_timestamp"], event["id"], event["event_type"]) for event in event_records]
+        return len(newer), newer[0] if newer else since
 
     async def populate_todo_feed_item(self, *, todo_feed_item: Record) -> TodoFeedItem:
         """Get username to populate a todo feed."""
         return TodoFeedItem(
             **{k: v for k, v in todo_feed_item.items() if k != "owner"},
-            owner=await self.users_repo.get_user_by_id(user_id=todo_feed_item["owner"])
+            owner=await self.users_repo.user_loader.load(todo_feed_item["owner"])
         )
+
+    async def hydrate_todo_feed(self, *, events: List[TaskFeedEvent]) -> Optional[List[TodoFeedItem]]:
+        """Build feed items from redis events, loading their todos and owners in batches.
+
+        Events of todos deleted or no longer offered as tasks since they were written are dropped from the set, and
+        None is returned as the page came out short.
+        """
+        todos = await self.todos_repo.get_todos_by_ids(ids=[event.todo_id for event in events])
+        stale = [event.member for event in events if event.todo_id not in todos or not todos[event.todo_id].as_task]
+        if stale:
+            await self.task_feed.remove(self.r_db, *stale)
+            return None
+        owners = await self.users_repo.user_loader.load_many([event.owner for event in events])
+        return [
+            TodoFeedItem(
+                **todos[event.todo_id].dict(exclude={"owner"}),
+                owner=owner,
+                event_id=event.id,
+                event_type=event.event_type,
+                event_timestamp=event.event_timestamp,
+                row_number=row_number,
+            )
+            for row_number, (event, owner) in enumerate(zip(events, owners), start=1)
+        ]
+
+    async def rebuild_task_feed(self, *, clear: bool = False) -> int:
+        """Reload the redis feed from the todo_events log. Pages are served from postgres until it is done.
+
+        Events are written over the existing set rather than into a new key, so writes made meanwhile aren't lost.
+        clear drops the set first, for when its members are in an outdated format. Returns the number of events loaded.
+        """
+        if clear:
+            await self.task_feed.clear(self.r_db)
+        await self.task_feed.mark_built(self.r_db, built=False)
+        events = await self.todo_events_repo.list_latest_task_events(limit=self.task_feed.max_items)
+        for start in range(0, len(events), 1000):
+            if not await self.task_feed.write(self.r_db, *events[start : start + 1000]):
+                raise RuntimeError("Task feed rebuild failed writing to redis")
+        await self.task_feed.mark_built(self.r_db)
+        logger.info(f"--- Rebuilt task feed from {len(events)} events ---")
+        return len(events)
@@ -0,0 +1,87 @@
+"""Batch loaders that collect keys across concurrent awaits and resolve them with one query."""
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+BatchLoadFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+# loaders of the request being handled. set by the get_repository dependency, None outside of requests.
+request_loaders: ContextVar[Optional[Dict[str, "DataLoader"]]] = ContextVar("request_loaders", default=None)
+
+
+class DataLoader:
+    """Coalesce `load` calls made in the same loop iteration into one call of `batch_load_fn`.
+
+    batch_load_fn receives the list of unique keys and returns a dict of key to value, missing keys load as None.
+    With cache=True a key is fetched at most once for the lifetime of the loader, which is what makes a request
+    scoped loader dedupe users across every populate call of the request.
+    """
+
+    def __init__(self, batch_load_fn: BatchLoadFn, *, cache: bool = True) -> None:
+        """Initialize the loader."""
+        self.batch_load_fn = batch_load_fn
+        self.cache = cache
+        self.batches = 0
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+
+    async def load(self, key: Hashable) -> Any:
+        """Load a single key."""
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_event_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                # dispatch once every coroutine scheduled in this iteration had a chance to queue its key.
+                loop.call_soon(lambda: asyncio.ensure_future(self.dispatch()))
+        return await future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        """Load several keys in one batch."""
+        return await asyncio.gather(*[self.load(key) for key in keys])
+
+    async def dispatch(self) -> None:
+        """Resolve every queued key with one call of batch_load_fn."""
+        keys, self._queue = self._queue, []
+        if not keys:
+            return
+        futures = {key: self._futures[key] for key in keys}
+        if not self.cache:
+            for key in keys:
+                self._futures.pop(key, None)
+        self.batches += 1
+        try:
+            results = await self.batch_load_fn(keys)
+        except Exception as e:
+            for key, future in futures.items():
+                self._futures.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in futures.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+    def clear(self, key: Hashable) -> None:
+        """Forget a key so the next load fetches it again."""
+        self._futures.pop(key, None)
+
+
+def get_request_loader(name: str, batch_load_fn: BatchLoadFn) -> Optional[DataLoader]:
+    """Get (or create) the named loader of the current request. None outside of requests."""
+    loaders = request_loaders.get()
+    if loaders is None:
+        return None
+    if name not in loaders:
+        loaders[name] = DataLoader(batch_load_fn)
+    return loaders[name]
+
+
+def clear_request_loader_key(name: str, key: Hashable) -> None:
+    """Forget a key in the named loader of the current request, if there is one."""
+    loaders = request_loaders.get()
+    if loaders is not None and name in loaders:
+        loaders[name].clear(key)
@@ -1,7 +1,13 @@
 """DB repo for profile."""
-from app.db.repositories.base import BaseRepository
+from datetime import datetime
+from typing import Optional
+
+from app.db.repositories.base import BaseRepository, precondition_failed, set_clause
+from app.db.repositories.loaders import clear_request_loader_key
 from app.models.profile import ProfileCreate, ProfileInDB, ProfileUpdate
 from app.models.user import UserInDB
+from app.services import identity_cache, todo_cache
+from fastapi import HTTPException, status
 
 CREATE_PROFILE_FOR_USER_QUERY = """
     INSERT INTO profiles (firstname, lastname, middlename, phone_number, bio, image, user_id)
@@ -26,13 +32,9 @@ GET_PROFILE_BY_USERNAME_QUERY = """
 
 UPDATE_PROFILE_QUERY = """
     UPDATE profiles
-    SET firstname       = :firstname,
-        lastname        = :lastname,
-        middlename      = :middlename,
-        phone_number    = :phone_number,
-        bio             = :bio,
-        image           = :image
+    SET {assignments}
     WHERE user_id = :user_id
+    {if_match}
     RETURNING id, firstname, lastname, middlename, phone_number, bio, image, user_id, created_at, updated_at;
 """
 
@@ -58,12 +60,28 @@ class ProfilesRepository(BaseRepository):
         if profile:
             return ProfileInDB(**profile)
 
-    async def update_profile(self, *, profile_update: ProfileUpdate, requesting_user: UserInDB) -> ProfileInDB:
-        """Update user proile."""
-        profile = await self.get_profile_by_user_id(user_id=requesting_user.id)
-        update_params = profile.copy(update=profile_update.dict(exclude_unset=True))
+    async def update_profile(
+        self,
+        *,
+        profile_update: ProfileUpdate,
+        requesting_user: UserInDB,
+        expected_updated_at: Optional[datetime] = None,
+    ) -> ProfileInDB:
+        """Update user proile with a single statement, only if still at expected_updated_at when given."""
+        changes = profile_update.dict(exclude_unset=True)
+        values = {**changes, "user_id": requesting_user.id}
+        if_match = ""
+        if expected_updated_at is not None:
+            if_match = "AND updated_at = :expected_updated_at"
+            values["expected_updated_at"] = expected_updated_at
         updated_profile = await self.db.fetch_one(
-            query=UPDATE_PROFILE_QUERY,
-            values=update_params.dict(exclude={"id", "created_at", "updated_at", "username", "email"}),
+            query=UPDATE_PROFILE_QUERY.format(assignments=set_clause(changes), if_match=if_match), values=values
         )
+        if not updated_profile:
+            if not await self.get_profile_by_user_id(user_id=requesting_user.id):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile found for user.")
+            raise precondition_failed()
+        await identity_cache.invalidate(self.r_db, requesting_user.username)
+        await todo_cache.invalidate_owner(self.r_db, requesting_user.id)
+        clear_request_loader_key("users", requesting_user.id)
         return ProfileInDB(**updated_profile)
@@ -1,10 +1,11 @@
 """DB repo for tasks."""
 
-from typing import List, Union
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
 
 from app.db.repositories.base import BaseRepository
-from app.db.repositories.users import UsersRepository
-from app.models.task import TaskCreate, TaskInDB, TaskPublic
+from app.db.repositories.users import POPULATED_USER_COLUMNS, UsersRepository
+from app.models.task import TaskCreate, TaskInDB, TaskOfferStats, TaskPublic, TaskStatus
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
 from databases import Database
@@ -17,8 +18,29 @@ CREATE_TASK_FOR_TODO_QUERY = """
     RETURNING todo_id, user_id, status, created_at, updated_at;
 """
 
-LIST_OFFERS_FOR_TASK_QUERY = """
-    SELECT todo_id, user_id, status, created_at, updated_at
+# offers with their users and profiles, offer columns are prefixed with `offer_`.
+LIST_OFFERS_FOR_TASK_QUERY = f"""
+    SELECT  o.todo_id AS offer_todo_id, o.user_id AS offer_user_id, o.status AS offer_status,
+            o.created_at AS offer_created_at, o.updated_at AS offer_updated_at,
+            {POPULATED_USER_COLUMNS}
+    FROM    user_task_for_todos AS o
+            JOIN users AS u
+            ON u.id = o.user_id
+            LEFT JOIN profiles AS p
+            ON p.user_id = u.id
+    WHERE   o.todo_id = :todo_id
+    {{filters}}
+    ORDER BY o.created_at, o.user_id
+    LIMIT :page_chunk_size;
+"""
+
+GET_OFFER_STATS_FOR_TASK_QUERY = """
+    SELECT count(*) AS total,
+           count(*) FILTER (WHERE status = 'pending') AS pending,
+           count(*) FILTER (WHERE status = 'accepted') AS accepted,
+           count(*) FILTER (WHERE status = 'rejected') AS rejected,
+           count(*) FILTER (WHERE status = 'cancelled') AS cancelled,
+           count(*) FILTER (WHERE status = 'completed') AS completed
     FROM user_task_for_todos
     WHERE todo_id = :todo_id;
 """
@@ -102,14 +124,44 @@ class TasksRepository(BaseRepository):
         )
         return TaskInDB(**created_task)
 
-    async def list_offers_for_task(self, *, todo: TodoInDB, populate: bool = True) -> List[Union[TaskInDB, TaskPublic]]:
-        """Get all offers of a task from the db."""
-        tasks = await self.db.fetch_all(query=LIST_OFFERS_FOR_TASK_QUERY, values={"todo_id": todo.id})
-        tasks = [TaskInDB(**task) for task in tasks]
-        if populate:
-            return [await self.populate_task(task=task) for task in tasks]
+    async def list_offers_for_task(
+        self,
+        *,
+        todo: TodoInDB,
+        status: Optional[TaskStatus] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        page_chunk_size: int = 100,
+        populate: bool = True,
+    ) -> List[Union[TaskInDB, TaskPublic]]:
+        """List offers of a task with their users and profiles, oldest first. after is (created_at, user_id)."""
+        filters = []
+        values = {"todo_id": todo.id, "page_chunk_size": page_chunk_size}
+        if status is not None:
+            filters.append("AND o.status = :status")
+            values["status"] = status
+        if after is not None:
+            filters.append("AND (o.created_at, o.user_id) > (:after_created_at, :after_user_id)")
+            values["after_created_at"], values["after_user_id"] = after
+        records = await self.db.fetch_all(
+            query=LIST_OFFERS_FOR_TASK_QUERY.format(filters="\n    ".join(filters)), values=values
+        )
+        offer_prefix = "offer_"
+        tasks = []
+        for record in records:
+            task = TaskInDB(**{k[len(offer_prefix):]: v for k, v in record.items() if k.startswith(offer_prefix)})
+            if populate:
+                user = self.users_repo.populated_user_from_record(
+                    {k: v for k, v in record.items() if not k.startswith(offer_prefix)}
+                )
+                task = TaskPublic(**task.dict(), user=user)
+            tasks.append(task)
         return tasks
 
+    async def get_offer_stats_for_task(self, *, todo: TodoInDB) -> TaskOfferStats:
+        """Count the offers of a task by status."""
+        stats = await self.db.fetch_one(query=GET_OFFER_STATS_FOR_TASK_QUERY, values={"todo_id": todo.id})
+        return TaskOfferStats(**stats)
+
     async def get_offer_for_task_from_user(self, *, todo: TodoInDB, user: UserInDB) -> TaskInDB:
         """Get an offer for a task from db."""
         task_record = await self.db.fetch_one(
@@ -156,10 +208,3 @@ class TasksRepository(BaseRepository):
         return await self.db.fetch_one(
             query=MARK_TASK_COMPLETE_QUERY, values={"todo_id": todo.id, "user_id": tasktaker.id}
         )
-
-    async def populate_task(self, *, task: TaskInDB) -> TaskPublic:
-        """Add user details to task."""
-        return TaskPublic(
-            **task.dict(),
-            user=await self.users_repo.get_user_by_id(user_id=task.user_id),
-        )
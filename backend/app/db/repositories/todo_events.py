@@ -0,0 +1,92 @@
+"""DB repo for todo events."""
+
+import datetime
+from typing import List, Optional
+
+from app.db.repositories.base import BaseRepository
+from app.models.todo import TodoEvent, TodoInDB
+
+LIST_TODO_EVENTS_QUERY = """
+    SELECT id, todo_id, owner, event_type, as_task, event_timestamp, changes
+    FROM todo_events
+    WHERE todo_id = :todo_id
+    {after}
+    ORDER BY id DESC
+    LIMIT :page_chunk_size;
+"""
+
+# newest event of each todo, the one a write just appended.
+GET_LATEST_TODO_EVENTS_QUERY = """
+    SELECT DISTINCT ON (todo_id) id, todo_id, owner, event_type, as_task, event_timestamp, changes
+    FROM todo_events
+    WHERE todo_id = ANY(:todo_ids)
+    ORDER BY todo_id, id DESC;
+"""
+
+# events of tasks, newest first, which the redis feed is rebuilt from.
+LIST_LATEST_TASK_EVENTS_QUERY = """
+    SELECT e.id, e.todo_id, e.owner, e.event_type, e.as_task, e.event_timestamp
+    FROM todo_events AS e
+    JOIN todos AS t ON t.id = e.todo_id
+    WHERE e.as_task AND t.as_task
+    ORDER BY e.event_timestamp DESC, e.id DESC
+    LIMIT :limit;
+"""
+
+GET_MAX_TODO_EVENT_ID_QUERY = """
+    SELECT coalesce(max(id), 0) AS max_id FROM todo_events;
+"""
+
+# updates older than the cutoff that a later update of the same todo supersedes. creations and the last update of
+# each todo are kept, which is what the feed showed before every update was logged.
+COMPACT_TODO_EVENTS_QUERY = """
+    DELETE FROM todo_events AS e
+    WHERE e.id BETWEEN :id_from AND :id_to
+    AND e.event_type = 'is_update'
+    AND e.event_timestamp < :before
+    AND EXISTS (
+        SELECT 1
+        FROM todo_events AS newer
+        WHERE newer.todo_id = e.todo_id
+        AND newer.event_type = 'is_update'
+        AND newer.id > e.id
+    )
+    RETURNING e.id;
+"""
+
+
+class TodoEventsRepository(BaseRepository):
+    """All db actions associated with the todo events log. Events are written by triggers on todos."""
+
+    async def list_todo_events(
+        self, *, todo: TodoInDB, after: Optional[int] = None, page_chunk_size: int = 50
+    ) -> List[TodoEvent]:
+        """Activity history of a todo, newest first, after the event id of a cursor."""
+        values = {"todo_id": todo.id, "page_chunk_size": page_chunk_size}
+        if after is not None:
+            values["after"] = after
+        event_records = await self.db.fetch_all(
+            query=LIST_TODO_EVENTS_QUERY.format(after="" if after is None else "AND id < :after"), values=values
+        )
+        return [TodoEvent(**event) for event in event_records]
+
+    async def get_latest_todo_events(self, *, todo_ids: List[int]) -> List[TodoEvent]:
+        """Newest event of each of a set of todos."""
+        event_records = await self.db.fetch_all(query=GET_LATEST_TODO_EVENTS_QUERY, values={"todo_ids": todo_ids})
+        return [TodoEvent(**event) for event in event_records]
+
+    async def list_latest_task_events(self, *, limit: int) -> List[TodoEvent]:
+        """Newest events of todos offered as tasks, without their changes."""
+        event_records = await self.db.fetch_all(query=LIST_LATEST_TASK_EVENTS_QUERY, values={"limit": limit})
+        return [TodoEvent(**event) for event in event_records]
+
+    async def get_max_todo_event_id(self) -> int:
+        """Highest event id, compaction walks ids up to it."""
+        return (await self.db.fetch_one(query=GET_MAX_TODO_EVENT_ID_QUERY))["max_id"]
+
+    async def compact_todo_events(self, *, id_from: int, id_to: int, before: datetime.datetime) -> int:
+        """Delete superseded updates older than before in a range of event ids. Returns how many were deleted."""
+        deleted = await self.db.fetch_all(
+            query=COMPACT_TODO_EVENTS_QUERY, values={"id_from": id_from, "id_to": id_to, "before": before}
+        )
+        return len(deleted)
@@ -1,14 +1,39 @@
 """All functions to handle crud todos."""
 
-from typing import List, Union
+import csv
+import io
+import logging
+import time
+from datetime import date, datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
-from app.db.repositories.base import BaseRepository
+from app.core.config import TODO_IMPORT_BATCH_SIZE, TODO_IMPORT_MAX_REPORTED_REJECTS, TODO_SEARCH_HEADLINE_OPTIONS
+from app.db.repositories.base import BaseRepository, precondition_failed, set_clause
+from app.db.repositories.todo_events import TodoEventsRepository
 from app.db.repositories.users import UsersRepository
-from app.models.todo import TodoCreate, TodoInDB, TodoPublic, TodoUpdate
+from app.models.todo import (
+    PriorityType,
+    TodoBulkResult,
+    TodoBulkUpdate,
+    TodoCreate,
+    TodoImportResult,
+    TodoInDB,
+    TodoOrderBy,
+    TodoPublic,
+    TodoSearchResult,
+    TodoSearchScope,
+    TodoStats,
+    TodoUpdate,
+)
 from app.models.user import UserInDB
+from app.services import task_feed, todo_cache
+from app.services.todo_import import TODO_IMPORT_COLUMNS, TodoImportReader
 from databases import Database
 from fastapi import HTTPException, status
 from redis.client import Redis
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
 
 CREATE_TODO_QUERY = """
     INSERT INTO todos (name, notes, priority, duedate, owner, as_task)
@@ -27,14 +52,13 @@ GET_ALL_TODOS_QUERY = """
     FROM todos
 """
 
+# only the columns sent by the client are set. if_match adds the updated_at precondition of If-Match.
 UPDATE_TODO_BY_ID_QUERY = """
     UPDATE todos
-    SET name        = :name,
-        notes       = :notes,
-        priority    = :priority,
-        duedate     = :duedate,
-        as_task     = :as_task
+    SET {assignments}
     WHERE id = :id
+    AND owner = :owner
+    {if_match}
     RETURNING id, name, notes, priority, duedate, owner, created_at, updated_at, as_task;
 """
 
@@ -44,10 +68,265 @@ DELETE_TODO_BY_ID_QUERY = """
     RETURNING id;
 """
 
+# filters and the keyset predicate are appended to the WHERE clause, see list_all_user_todos.
 LIST_ALL_USER_TODOS_QUERY = """
     SELECT id, name, notes, priority, duedate, owner, created_at, updated_at, as_task
     FROM todos
-    WHERE owner = :owner;
+    WHERE owner = :owner
+    {filters}
+    ORDER BY {order_columns}, id {direction}
+    {limit};
+"""
+
+# columns, direction and keyset comparison of each ordering. matches the ix_todos_owner_* indexes.
+# priorities are a postgres enum, which sorts them from most to least severe.
+LIST_ALL_USER_TODOS_ORDERINGS = {
+    TodoOrderBy.duedate: (("duedate",), "ASC", ">"),
+    TodoOrderBy.updated_at: (("updated_at",), "DESC", "<"),
+    TodoOrderBy.priority: (("priority", "duedate"), "ASC", ">"),
+}
+# the match is answered by the GIN index of the scope, headlines are only built for the rows of the page.
+SEARCH_TODOS_QUERY = """
+    WITH page AS (
+        SELECT id, name, notes, priority, duedate, owner, created_at, updated_at, as_task,
+               CAST(ts_rank_cd(search_vector, query) AS double precision) AS rank
+        FROM todos, websearch_to_tsquery('english', :q) AS query
+        WHERE search_vector @@ query
+        AND {scope}
+        {after}
+        ORDER BY rank DESC, id DESC
+        LIMIT :page_chunk_size
+    )
+    SELECT page.*,
+           ts_headline('english', page.name, query, :headline_options) AS name_highlight,
+           ts_headline('english', page.notes, query, :headline_options) AS notes_highlight
+    FROM page, websearch_to_tsquery('english', :q) AS query
+    ORDER BY rank DESC, id DESC;
+"""
+
+SEARCH_TODOS_SCOPES = {
+    TodoSearchScope.own: "owner = :owner",
+    TodoSearchScope.marketplace: "as_task = TRUE",
+}
+# open tasks of other users, answered by the partial ix_todos_as_task_* indexes. a task is taken once an offer for
+# it is accepted, which ix_user_task_for_todos_taken_todo_id answers.
+LIST_TODO_TASKS_QUERY = """
+    SELECT t.id, t.name, t.notes, t.priority, t.duedate, t.owner, t.created_at, t.updated_at, t.as_task
+    FROM todos AS t
+    WHERE t.as_task = TRUE
+    AND t.owner != :owner
+    AND NOT EXISTS (
+        SELECT 1
+        FROM user_task_for_todos AS o
+        WHERE o.todo_id = t.id
+        AND o.status IN ('accepted', 'completed')
+    )
+    {filters}
+    ORDER BY t.duedate ASC, t.id ASC
+    LIMIT :page_chunk_size;
+"""
+
+LIST_TODOS_DUE_BETWEEN_QUERY = """
+    SELECT id, name, notes, priority, duedate, owner, created_at, updated_at, as_task
+    FROM todos
+    WHERE duedate BETWEEN :duedate_from AND :duedate_to
+    AND (duedate, id) > (:after_duedate, :after_id)
+    ORDER BY duedate ASC, id ASC
+    LIMIT :batch_size;
+"""
+# counters are kept by triggers on todos. overdue depends on the day, it is counted from ix_todos_owner_duedate_id.
+GET_TODO_STATS_QUERY = """
+    SELECT coalesce(s.total, 0) AS total,
+           coalesce(s.critical, 0) AS critical,
+           coalesce(s.high, 0) AS high,
+           coalesce(s.standard, 0) AS standard,
+           coalesce(s.normal, 0) AS normal,
+           coalesce(s.as_task, 0) AS as_task,
+           o.overdue
+    FROM (
+        SELECT count(*) AS overdue
+        FROM todos
+        WHERE owner = :owner
+        AND duedate < :today
+    ) AS o
+    LEFT JOIN todo_stats AS s ON s.owner = :owner;
+"""
+
+LOCK_TODO_STATS_QUERY = """
+    SELECT owner
+    FROM todo_stats
+    WHERE owner BETWEEN :owner_from AND :owner_to
+    ORDER BY owner
+    FOR UPDATE;
+"""
+
+# recount the owners of a range and overwrite the counters that drifted. returns the owners that were repaired.
+RECONCILE_TODO_STATS_QUERY = """
+    WITH actual AS (
+        SELECT owner,
+               count(*) AS total,
+               count(*) FILTER (WHERE priority = 'critical') AS critical,
+               count(*) FILTER (WHERE priority = 'high') AS high,
+               count(*) FILTER (WHERE priority = 'standard') AS standard,
+               count(*) FILTER (WHERE priority = 'normal') AS normal,
+               count(*) FILTER (WHERE as_task) AS as_task
+        FROM todos
+        WHERE owner BETWEEN :owner_from AND :owner_to
+        GROUP BY owner
+    ), drift AS (
+        SELECT coalesce(a.owner, s.owner) AS owner,
+               coalesce(a.total, 0) AS total,
+               coalesce(a.critical, 0) AS critical,
+               coalesce(a.high, 0) AS high,
+               coalesce(a.standard, 0) AS standard,
+               coalesce(a.normal, 0) AS normal,
+               coalesce(a.as_task, 0) AS as_task
+        FROM actual AS a
+        FULL JOIN (SELECT * FROM todo_stats WHERE owner BETWEEN :owner_from AND :owner_to) AS s
+        ON s.owner = a.owner
+        WHERE (coalesce(a.total, 0), coalesce(a.critical, 0), coalesce(a.high, 0), coalesce(a.standard, 0),
+               coalesce(a.normal, 0), coalesce(a.as_task, 0))
+        IS DISTINCT FROM (s.total, s.critical, s.high, s.standard, s.normal, s.as_task)
+    )
+    INSERT INTO todo_stats AS s (owner, total, critical, high, standard, normal, as_task)
+    SELECT * FROM drift
+    ON CONFLICT (owner) DO UPDATE
+    SET total = EXCLUDED.total,
+        critical = EXCLUDED.critical,
+        high = EXCLUDED.high,
+        standard = EXCLUDED.standard,
+        normal = EXCLUDED.normal,
+        as_task = EXCLUDED.as_task
+    RETURNING owner;
+"""
+
+GET_MAX_TODO_STATS_OWNER_QUERY = """
+    SELECT coalesce(greatest((SELECT max(owner) FROM todos), (SELECT max(owner) FROM todo_stats)), 0) AS max_owner;
+"""
+
+# one json document per line: each todo followed by its comments and its task offers. the rows are built as text
+# by postgres so they are streamed out without being parsed or validated.
+EXPORT_USER_TODOS_NDJSON_QUERY = """
+    SELECT line FROM (
+        SELECT t.id AS todo_id, 0 AS kind_order, t.id AS row_id,
+               CAST(json_build_object(
+                   'type', 'todo',
+                   'data', json_build_object(
+                       'id', t.id, 'name', t.name, 'notes', t.notes, 'priority', t.priority, 'duedate', t.duedate,
+                       'as_task', t.as_task, 'owner', t.owner, 'created_at', t.created_at, 'updated_at', t.updated_at
+                   )
+               ) AS text) AS line
+        FROM todos AS t
+        WHERE t.owner = :owner
+        UNION ALL
+        SELECT c.todo_id, 1, c.id,
+               CAST(json_build_object(
+                   'type', 'comment',
+                   'data', json_build_object(
+                       'id', c.id, 'todo_id', c.todo_id, 'body', c.body, 'comment_owner', c.comment_owner,
+                       'task', c.task, 'created_at', c.created_at, 'updated_at', c.updated_at
+                   )
+               ) AS text)
+        FROM comments AS c
+        INNER JOIN todos AS t ON t.id = c.todo_id
+        WHERE t.owner = :owner
+        AND :include_comments
+        UNION ALL
+        SELECT o.todo_id, 2, o.user_id,
+               CAST(json_build_object(
+                   'type', 'offer',
+                   'data', json_build_object(
+                       'todo_id', o.todo_id, 'user_id', o.user_id, 'status', o.status,
+                       'created_at', o.created_at, 'updated_at', o.updated_at
+                   )
+               ) AS text)
+        FROM user_task_for_todos AS o
+        INNER JOIN todos AS t ON t.id = o.todo_id
+        WHERE t.owner = :owner
+        AND :include_offers
+    ) AS export
+    ORDER BY todo_id, kind_order, row_id;
+"""
+
+EXPORT_USER_TODOS_CSV_QUERY = """
+    SELECT id, name, notes, priority, duedate, as_task, created_at, updated_at
+    FROM todos
+    WHERE owner = :owner
+    ORDER BY id;
+"""
+
+EXPORT_USER_TODOS_CSV_COLUMNS = ("id", "name", "notes", "priority", "duedate", "as_task", "created_at", "updated_at")
+# imports are copied into a session local staging table, then moved into todos with one set-based insert.
+CREATE_TODO_IMPORT_STAGING_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE todos_import (
+        position    bigint,
+        name        text,
+        notes       text,
+        priority    text,
+        duedate     date,
+        as_task     boolean
+    ) ON COMMIT DROP;
+"""
+
+# also returns the newest imported tasks, up to $2, for the task feed.
+INSERT_TODOS_FROM_IMPORT_STAGING_QUERY = """
+    WITH imported AS (
+        INSERT INTO todos (name, notes, priority, duedate, owner, as_task)
+        SELECT name, notes, CAST(priority AS todo_priority), duedate, $1, as_task
+        FROM todos_import
+        ORDER BY position
+        RETURNING id, as_task
+    )
+    SELECT count(*) AS imported,
+           (array_agg(id ORDER BY id DESC) FILTER (WHERE as_task))[1:$2] AS task_ids
+    FROM imported;
+"""
+
+BULK_CREATE_TODOS_QUERY = """
+    INSERT INTO todos (name, notes, priority, duedate, owner, as_task)
+    SELECT name, notes, priority, duedate, :owner, as_task
+    FROM unnest(
+        CAST(:names AS text[]),
+        CAST(:notes AS text[]),
+        CAST(:priorities AS todo_priority[]),
+        CAST(:duedates AS date[]),
+        CAST(:as_tasks AS boolean[])
+    ) WITH ORDINALITY AS new_todos (name, notes, priority, duedate, as_task, position)
+    ORDER BY position
+    RETURNING id, name, notes, priority, duedate, owner, created_at, updated_at, as_task;
+"""
+
+GET_TODOS_BY_IDS_QUERY = """
+    SELECT id, name, notes, priority, duedate, owner, created_at, updated_at, as_task
+    FROM todos
+    WHERE id = ANY(:ids);
+"""
+
+BULK_UPDATE_TODOS_QUERY = """
+    UPDATE todos AS t
+    SET name        = u.name,
+        notes       = u.notes,
+        priority    = u.priority,
+        duedate     = u.duedate,
+        as_task     = u.as_task
+    FROM unnest(
+        CAST(:ids AS integer[]),
+        CAST(:names AS text[]),
+        CAST(:notes AS text[]),
+        CAST(:priorities AS todo_priority[]),
+        CAST(:duedates AS date[]),
+        CAST(:as_tasks AS boolean[])
+    ) AS u (id, name, notes, priority, duedate, as_task)
+    WHERE t.id = u.id
+    AND t.owner = :owner
+    RETURNING t.id, t.name, t.notes, t.priority, t.duedate, t.owner, t.created_at, t.updated_at, t.as_task;
+"""
+
+BULK_DELETE_TODOS_QUERY = """
+    DELETE FROM todos
+    WHERE id = ANY(:ids)
+    AND owner = :owner
+    RETURNING id;
 """
 
 
@@ -58,52 +337,463 @@ class TodosRepository(BaseRepository):
         """Initilizing database, redis and users_repository."""
         super().__init__(db, r_db)
         self.users_repo = UsersRepository(db, r_db)
+        self.todo_cache = todo_cache
+        self.todo_events_repo = TodoEventsRepository(db, r_db)
+        self.task_feed = task_feed
 
     async def create_todo(self, *, new_todo: TodoCreate, requesting_user: UserInDB) -> TodoInDB:
         """Create todo."""
         todo = await self.db.fetch_one(query=CREATE_TODO_QUERY, values={**new_todo.dict(), "owner": requesting_user.id})
-        return TodoInDB(**todo)
+        todo = TodoInDB(**todo)
+        await self.record_task_events(todo_ids=[todo.id] if todo.as_task else [])
+        return todo
 
     async def get_todo_by_id(
         self, *, id: int, requesting_user: UserInDB, populate: bool = True
     ) -> Union[TodoInDB, TodoPublic]:
-        """Get todo."""
+        """Get todo. Populated todos go through the todo cache."""
+        if populate:
+            return await self.get_cached_todo_by_id(id=id, requesting_user=requesting_user)
         todo_record = await self.db.fetch_one(query=GET_TODO_BY_ID_QUERY, values={"id": id})
         if todo_record:
-            todo = TodoInDB(**todo_record)
-            if populate:
-                return await self.populate_todo(todo=todo, requesting_user=requesting_user)
+            return TodoInDB(**todo_record)
+
+    async def get_cached_todo_by_id(self, *, id: int, requesting_user: UserInDB) -> Optional[TodoPublic]:
+        """Get populated todo from the todo cache, loading and caching it on a miss."""
+        todo, todo_version = await self.todo_cache.get(self.r_db, todo_id=id)
+        if todo is not None:
             return todo
+        # versions are read before the rows so a write racing with this load leaves the entry stale.
+        todo_record = await self.db.fetch_one(query=GET_TODO_BY_ID_QUERY, values={"id": id})
+        if not todo_record:
+            return None
+        todo = TodoInDB(**todo_record)
+        owner_version = await self.todo_cache.get_owner_version(self.r_db, user_id=todo.owner)
+        populated_todo = await self.populate_todo(todo=todo, requesting_user=requesting_user)
+        if todo_version is not None and owner_version is not None:
+            await self.todo_cache.set(
+                self.r_db, todo=populated_todo, todo_version=todo_version, owner_version=owner_version
+            )
+        return populated_todo
 
     async def get_all_todos(self) -> List[TodoInDB]:
         """Get all todo."""
         todos = await self.db.fetch_all(query=GET_ALL_TODOS_QUERY)
         return [TodoInDB(**todo) for todo in todos]
 
-    async def list_all_user_todos(self, *, requesting_user: UserInDB) -> List[TodoInDB]:
-        """List all todo by user."""
-        todo_records = await self.db.fetch_all(query=LIST_ALL_USER_TODOS_QUERY, values={"owner": requesting_user.id})
+    async def list_all_user_todos(
+        self,
+        *,
+        requesting_user: UserInDB,
+        order_by: TodoOrderBy = TodoOrderBy.duedate,
+        after: Optional[Tuple] = None,
+        page_chunk_size: Optional[int] = None,
+        priority: Optional[PriorityType] = None,
+        as_task: Optional[bool] = None,
+        duedate_from: Optional[date] = None,
+        duedate_to: Optional[date] = None,
+    ) -> List[TodoInDB]:
+        """List todos of user, one keyset page at a time. after is the (ordering values..., id) of the last page."""
+        order_columns, direction, comparison = LIST_ALL_USER_TODOS_ORDERINGS[order_by]
+        filters = []
+        values = {"owner": requesting_user.id}
+        if priority is not None:
+            filters.append("AND priority = :priority")
+            values["priority"] = priority
+        if as_task is not None:
+            filters.append("AND as_task = :as_task")
+            values["as_task"] = as_task
+        if duedate_from is not None:
+            filters.append("AND duedate >= :duedate_from")
+            values["duedate_from"] = duedate_from
+        if duedate_to is not None:
+            filters.append("AND duedate <= :duedate_to")
+            values["duedate_to"] = duedate_to
+        if after is not None:
+            after_keys = [f"after_{column}" for column in order_columns] + ["after_id"]
+            filters.append(
+                f"AND ({', '.join(order_columns)}, id) {comparison} ({', '.join(f':{key}' for key in after_keys)})"
+            )
+            values.update(zip(after_keys, after))
+        limit = ""
+        if page_chunk_size is not None:
+            limit = "LIMIT :page_chunk_size"
+            values["page_chunk_size"] = page_chunk_size
+        query = LIST_ALL_USER_TODOS_QUERY.format(
+            filters="\n    ".join(filters),
+            order_columns=", ".join(f"{column} {direction}" for column in order_columns),
+            direction=direction,
+            limit=limit,
+        )
+        todo_records = await self.db.fetch_all(query=query, values=values)
         return [TodoInDB(**todo) for todo in todo_records]
 
-    async def update_todos_by_id(self, *, todo: TodoInDB, todo_update: TodoUpdate) -> TodoInDB:
-        """Update todo with todo id."""
-        todo_updated_params = todo.copy(update=todo_update.dict(exclude_unset=True))
-        if todo_updated_params.priority is None:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid priority type, Cannot be None")
+    async def list_all_todo_for_task(
+        self,
+        *,
+        requesting_user: UserInDB,
+        after: Optional[Tuple[date, int]] = None,
+        page_chunk_size: int = 100,
+        priority: Optional[PriorityType] = None,
+        duedate_from: Optional[date] = None,
+        duedate_to: Optional[date] = None,
+    ) -> List[TodoInDB]:
+        """List open tasks other users offer, by duedate, one keyset page at a time. after is (duedate, id)."""
+        filters = []
+        values = {"owner": requesting_user.id, "page_chunk_size": page_chunk_size}
+        if priority is not None:
+            filters.append("AND t.priority = :priority")
+            values["priority"] = priority
+        if duedate_from is not None:
+            filters.append("AND t.duedate >= :duedate_from")
+            values["duedate_from"] = duedate_from
+        if duedate_to is not None:
+            filters.append("AND t.duedate <= :duedate_to")
+            values["duedate_to"] = duedate_to
+        if after is not None:
+            filters.append("AND (t.duedate, t.id) > (:after_duedate, :after_id)")
+            values["after_duedate"], values["after_id"] = after
+        query = LIST_TODO_TASKS_QUERY.format(filters="\n    ".join(filters))
+        todo_records = await self.db.fetch_all(query=query, values=values)
+        return [TodoInDB(**todo) for todo in todo_records]
+
+    async def get_todo_stats(self, *, requesting_user: UserInDB, today: date) -> TodoStats:
+        """Counts of the user's todos, read from the todo_stats counters rather than counted."""
+        stats = await self.db.fetch_one(
+            query=GET_TODO_STATS_QUERY, values={"owner": requesting_user.id, "today": today}
+        )
+        return TodoStats(**stats)
 
+    async def reconcile_todo_stats(self, *, owner_from: int, owner_to: int) -> List[int]:
+        """Recount the todos of a range of owners and repair their counters. Returns the owners that had drifted.
+
+        The counter rows are locked first, so todos written while recounting wait and add their delta afterwards.
+        """
+        values = {"owner_from": owner_from, "owner_to": owner_to}
+        async with self.db.transaction():
+            await self.db.fetch_all(query=LOCK_TODO_STATS_QUERY, values=values)
+            repaired = await self.db.fetch_all(query=RECONCILE_TODO_STATS_QUERY, values=values)
+        return [record["owner"] for record in repaired]
+
+    async def get_max_todo_stats_owner(self) -> int:
+        """Highest owner with todos or counters, where reconciliation stops."""
+        return (await self.db.fetch_one(query=GET_MAX_TODO_STATS_OWNER_QUERY))["max_owner"]
+
+    async def list_todos_due_between(
+        self,
+        *,
+        duedate_from: date,
+        duedate_to: date,
+        after: Optional[Tuple[date, int]] = None,
+        batch_size: int = 1000,
+    ) -> List[TodoInDB]:
+        """List todos of every user due in a date range, one keyset batch at a time."""
+        after_duedate, after_id = after or (duedate_from, 0)
+        todo_records = await self.db.fetch_all(
+            query=LIST_TODOS_DUE_BETWEEN_QUERY,
+            values={
+                "duedate_from": duedate_from,
+                "duedate_to": duedate_to,
+                "after_duedate": after_duedate,
+                "after_id": after_id,
+                "batch_size": batch_size,
+            },
+        )
+        return [TodoInDB(**todo) for todo in todo_records]
+
+    async def search_todos(
+        self,
+        *,
+        q: str,
+        requesting_user: UserInDB,
+        scope: TodoSearchScope = TodoSearchScope.own,
+        after: Optional[Tuple[float, int]] = None,
+        page_chunk_size: int = 20,
+    ) -> List[TodoSearchResult]:
+        """Full-text search over todo names and notes, best match first. after is the (rank, id) of the last hit."""
+        values = {"q": q, "page_chunk_size": page_chunk_size, "headline_options": TODO_SEARCH_HEADLINE_OPTIONS}
+        if scope == TodoSearchScope.own:
+            values["owner"] = requesting_user.id
+        after_filter = ""
+        if after is not None:
+            after_filter = (
+                "AND (CAST(ts_rank_cd(search_vector, query) AS double precision), id) < (:after_rank, :after_id)"
+            )
+            values["after_rank"], values["after_id"] = after
+        query = SEARCH_TODOS_QUERY.format(scope=SEARCH_TODOS_SCOPES[scope], after=after_filter)
+        todo_records = await self.db.fetch_all(query=query, values=values)
+        return [TodoSearchResult(**todo) for todo in todo_records]
+
+    async def export_user_todos_ndjson(
+        self,
+        *,
+        requesting_user: UserInDB,
+        include_comments: bool = False,
+        include_offers: bool = False,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[str]:
+        """Stream every todo of user as NDJSON from a server-side cursor, chunk_size lines at a time."""
+        values = {"owner": requesting_user.id, "include_comments": include_comments, "include_offers": include_offers}
+        lines = []
+        async for record in self.db.iterate(query=EXPORT_USER_TODOS_NDJSON_QUERY, values=values):
+            lines.append(record["line"])
+            if len(lines) >= chunk_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    async def export_user_todos_csv(self, *, requesting_user: UserInDB, chunk_size: int = 500) -> AsyncIterator[str]:
+        """Stream every todo of user as CSV from a server-side cursor, chunk_size rows at a time."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_USER_TODOS_CSV_COLUMNS)
+        rows = 0
+        async for record in self.db.iterate(query=EXPORT_USER_TODOS_CSV_QUERY, values={"owner": requesting_user.id}):
+            writer.writerow([record[column] for column in EXPORT_USER_TODOS_CSV_COLUMNS])
+            rows += 1
+            if rows % chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    async def import_todos(
+        self,
+        *,
+        reader: TodoImportReader,
+        requesting_user: UserInDB,
+        batch_size: int = TODO_IMPORT_BATCH_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> TodoImportResult:
+        """Import the valid rows of reader with binary COPY, all or nothing. Invalid rows are reported, not loaded.
+
+        Batches are validated in a worker thread and copied into the staging table as they come, so memory is
+        bounded by batch_size whatever the size of the file. progress is called with (validated, rejected).
+        """
+        started = time.monotonic()
+        rejects = []
+        async with self.db.connection() as connection:
+            async with connection.transaction():
+                raw_connection = connection.raw_connection
+                await raw_connection.execute(CREATE_TODO_IMPORT_STAGING_TABLE_QUERY)
+                while True:
+                    records, batch_rejects = await run_in_threadpool(reader.read_batch, batch_size)
+                    if not records and not batch_rejects:
+                        break
+                    if records:
+                        await raw_connection.copy_records_to_table(
+                            "todos_import", records=records, columns=TODO_IMPORT_COLUMNS
+                        )
+                    rejects.extend(batch_rejects[: max(0, TODO_IMPORT_MAX_REPORTED_REJECTS - len(rejects))])
+                    if progress is not None:
+                        progress(reader.validated, reader.rejected)
+                imported_record = await raw_connection.fetchrow(
+                    INSERT_TODOS_FROM_IMPORT_STAGING_QUERY, requesting_user.id, self.task_feed.max_items
+                )
+        imported = imported_record["imported"]
+        if imported_record["task_ids"]:
+            await self.record_task_events(todo_ids=imported_record["task_ids"])
+        duration_ms = round((time.monotonic() - started) * 1000, 2)
+        logger.info(f"--- Imported {imported} todos for user {requesting_user.id} in {duration_ms} ms ---")
+        return TodoImportResult(imported=imported, rejected=reader.rejected, rejects=rejects, duration_ms=duration_ms)
+
+    async def update_todos_by_id(
+        self,
+        *,
+        todo_id: int,
+        todo_update: TodoUpdate,
+        requesting_user: UserInDB,
+        expected_updated_at: Optional[datetime] = None,
+    ) -> TodoInDB:
+        """Update todo owned by user with a single statement, only if still at expected_updated_at when given."""
+        changes = todo_update.dict(exclude_unset=True)
+        if "priority" in changes and changes["priority"] is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid priority type, Cannot be None")
+        values = {**changes, "id": todo_id, "owner": requesting_user.id}
+        if_match = ""
+        if expected_updated_at is not None:
+            if_match = "AND updated_at = :expected_updated_at"
+            values["expected_updated_at"] = expected_updated_at
         todo_updated = await self.db.fetch_one(
-            query=UPDATE_TODO_BY_ID_QUERY,
-            values=todo_updated_params.dict(exclude={"owner", "created_at", "updated_at"}),
+            query=UPDATE_TODO_BY_ID_QUERY.format(assignments=set_clause(changes), if_match=if_match), values=values
         )
-        return TodoInDB(**todo_updated)
+        if not todo_updated:
+            await self.raise_update_error(todo_id=todo_id, requesting_user=requesting_user)
+        await self.todo_cache.invalidate(self.r_db, todo_id)
+        todo_updated = TodoInDB(**todo_updated)
+        await self.record_task_events(todo_ids=[todo_updated.id] if todo_updated.as_task else [])
+        return todo_updated
+
+    async def record_task_events(self, *, todo_ids: List[int]) -> None:
+        """Fan the events a write to tasks just logged out to the redis task feed, when it is enabled."""
+        if self.task_feed.enabled and todo_ids:
+            events = await self.todo_events_repo.get_latest_todo_events(todo_ids=todo_ids)
+            await self.task_feed.record(self.r_db, *events)
+
+    async def raise_update_error(self, *, todo_id: int, requesting_user: UserInDB) -> None:
+        """Find out why a conditional update matched no row. Only runs when an update failed."""
+        todo = await self.get_todo_by_id(id=todo_id, requesting_user=requesting_user, populate=False)
+        if not todo:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id")
+        if todo.owner != requesting_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Action forboidden. Users are only able to modify todos they own.",
+            )
+        raise precondition_failed()
 
     async def delete_todo_by_id(self, *, todo: TodoInDB) -> int:
         """Delete todo via todo id."""
-        return await self.db.execute(query=DELETE_TODO_BY_ID_QUERY, values={"id": todo.id})
+        deleted_id = await self.db.execute(query=DELETE_TODO_BY_ID_QUERY, values={"id": todo.id})
+        await self.todo_cache.invalidate(self.r_db, todo.id)
+        return deleted_id
+
+    async def bulk_create_todos(
+        self, *, new_todos: List[TodoCreate], requesting_user: UserInDB
+    ) -> List[TodoBulkResult]:
+        """Create todos with a single multi-row insert."""
+        values = {
+            "owner": requesting_user.id,
+            "names": [new_todo.name for new_todo in new_todos],
+            "notes": [new_todo.notes for new_todo in new_todos],
+            "priorities": [new_todo.priority for new_todo in new_todos],
+            "duedates": [new_todo.duedate for new_todo in new_todos],
+            "as_tasks": [new_todo.as_task for new_todo in new_todos],
+        }
+        async with self.db.transaction():
+            todo_records = await self.db.fetch_all(query=BULK_CREATE_TODOS_QUERY, values=values)
+        # ids are handed out in insert order, which is the order of the request.
+        todos = sorted((TodoInDB(**todo) for todo in todo_records), key=lambda todo: todo.id)
+        await self.record_task_events(todo_ids=[todo.id for todo in todos if todo.as_task])
+        return [
+            TodoBulkResult(index=index, id=todo.id, status_code=status.HTTP_201_CREATED, todo=todo)
+            for index, todo in enumerate(todos)
+        ]
+
+    async def get_todos_by_ids(self, *, ids: List[int]) -> Dict[int, TodoInDB]:
+        """Get todos for a set of ids with one query."""
+        todo_records = await self.db.fetch_all(query=GET_TODOS_BY_IDS_QUERY, values={"ids": list(set(ids))})
+        return {todo["id"]: TodoInDB(**todo) for todo in todo_records}
+
+    def check_bulk_item(
+        self, *, index: int, id: int, existing_todos: Dict[int, TodoInDB], seen_ids: set, requesting_user: UserInDB
+    ) -> Optional[TodoBulkResult]:
+        """Result for a bulk item that can't be applied, None if it can."""
+        if id in seen_ids:
+            return TodoBulkResult(
+                index=index, id=id, status_code=status.HTTP_409_CONFLICT, detail="Todo appears more than once."
+            )
+        seen_ids.add(id)
+        todo = existing_todos.get(id)
+        if todo is None:
+            return TodoBulkResult(
+                index=index, id=id, status_code=status.HTTP_404_NOT_FOUND, detail="No todo found with that id"
+            )
+        if todo.owner != requesting_user.id:
+            return TodoBulkResult(
+                index=index,
+                id=id,
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Action forboidden. Users are only able to modify todos they own.",
+            )
+        return None
+
+    async def bulk_update_todos(
+        self, *, todo_updates: List[TodoBulkUpdate], requesting_user: UserInDB
+    ) -> List[TodoBulkResult]:
+        """Update todos, checking ownership for the whole set and writing them with a single statement."""
+        results: Dict[int, TodoBulkResult] = {}
+        updates: Dict[int, TodoInDB] = {}
+        updated_todos: Dict[int, TodoInDB] = {}
+        seen_ids = set()
+        async with self.db.transaction():
+            existing_todos = await self.get_todos_by_ids(ids=[todo_update.id for todo_update in todo_updates])
+            for index, todo_update in enumerate(todo_updates):
+                rejected = self.check_bulk_item(
+                    index=index,
+                    id=todo_update.id,
+                    existing_todos=existing_todos,
+                    seen_ids=seen_ids,
+                    requesting_user=requesting_user,
+                )
+                if rejected is not None:
+                    results[index] = rejected
+                    continue
+                todo_updated_params = existing_todos[todo_update.id].copy(
+                    update=todo_update.dict(exclude_unset=True, exclude={"id"})
+                )
+                if todo_updated_params.priority is None:
+                    results[index] = TodoBulkResult(
+                        index=index,
+                        id=todo_update.id,
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Invalid priority type, Cannot be None",
+                    )
+                    continue
+                updates[index] = todo_updated_params
+            if updates:
+                todo_records = await self.db.fetch_all(
+                    query=BULK_UPDATE_TODOS_QUERY,
+                    values={
+                        "owner": requesting_user.id,
+                        "ids": [todo.id for todo in updates.values()],
+                        "names": [todo.name for todo in updates.values()],
+                        "notes": [todo.notes for todo in updates.values()],
+                        "priorities": [todo.priority for todo in updates.values()],
+                        "duedates": [todo.duedate for todo in updates.values()],
+                        "as_tasks": [todo.as_task for todo in updates.values()],
+                    },
+                )
+                updated_todos = {todo["id"]: TodoInDB(**todo) for todo in todo_records}
+                for index, todo in updates.items():
+                    results[index] = TodoBulkResult(
+                        index=index, id=todo.id, status_code=status.HTTP_200_OK, todo=updated_todos.get(todo.id)
+                    )
+        # once committed, so a concurrent read can't cache the old rows under the new version stamps, and feed
+        # readers don't hydrate new events with the old rows, or keep events of a rolled back update.
+        await self.todo_cache.invalidate(self.r_db, *updated_todos)
+        await self.record_task_events(todo_ids=[todo.id for todo in updated_todos.values() if todo.as_task])
+        return [results[index] for index in sorted(results)]
+
+    async def bulk_delete_todos(self, *, todo_ids: List[int], requesting_user: UserInDB) -> List[TodoBulkResult]:
+        """Delete todos owned by user with a single statement."""
+        results: Dict[int, TodoBulkResult] = {}
+        to_delete: Dict[int, int] = {}
+        deleted_ids: List[int] = []
+        seen_ids = set()
+        async with self.db.transaction():
+            existing_todos = await self.get_todos_by_ids(ids=todo_ids)
+            for index, id in enumerate(todo_ids):
+                rejected = self.check_bulk_item(
+                    index=index,
+                    id=id,
+                    existing_todos=existing_todos,
+                    seen_ids=seen_ids,
+                    requesting_user=requesting_user,
+                )
+                if rejected is not None:
+                    results[index] = rejected
+                    continue
+                to_delete[index] = id
+            if to_delete:
+                deleted_records = await self.db.fetch_all(
+                    query=BULK_DELETE_TODOS_QUERY, values={"ids": list(to_delete.values()), "owner": requesting_user.id}
+                )
+                deleted_ids = [record["id"] for record in deleted_records]
+                for index, id in to_delete.items():
+                    results[index] = TodoBulkResult(index=index, id=id, status_code=status.HTTP_200_OK)
+        await self.todo_cache.invalidate(self.r_db, *deleted_ids)
+        return [results[index] for index in sorted(results)]
 
     async def populate_todo(self, *, todo: TodoInDB, requesting_user: UserInDB = None) -> TodoPublic:
         """Populate todo with user."""
         return TodoPublic(
             **todo.dict(exclude={"owner"}),
-            owner=await self.users_repo.get_user_by_id(user_id=todo.owner),
+            owner=await self.users_repo.user_loader.load(todo.owner),
         )
+
+    async def populate_todos(self, *, todos: List[TodoInDB], requesting_user: UserInDB = None) -> List[TodoPublic]:
+        """Populate todos with their users, loading every owner in one batch."""
+        owners = await self.users_repo.user_loader.load_many([todo.owner for todo in todos])
+        return [TodoPublic(**todo.dict(exclude={"owner"}), owner=owner) for todo, owner in zip(todos, owners)]
@@ -4,13 +4,14 @@ import logging
 import random
 import string
 from datetime import timedelta
-from typing import Optional
+from typing import Dict, List, Mapping, Optional
 
 from app.db.repositories.base import BaseRepository
+from app.db.repositories.loaders import DataLoader, clear_request_loader_key, get_request_loader
 from app.db.repositories.profiles import ProfilesRepository
-from app.models.profile import ProfileCreate
+from app.models.profile import ProfileCreate, ProfilePublic
 from app.models.user import UserCreate, UserInDB, UserPublic, UserUpdate, UserUpdateInDB
-from app.services import auth_service, email_service
+from app.services import auth_service, email_service, identity_cache, todo_cache
 from databases import Database
 from fastapi import HTTPException, status
 from pydantic import EmailStr
@@ -61,6 +62,43 @@ GET_USER_BY_ID_QUERY = """
     WHERE id = :id;
 """
 
+# columns of users u joined to profiles p, profile columns are prefixed with `profile_`.
+POPULATED_USER_COLUMNS = """
+            u.id, u.username, u.email, u.email_verified, u.is_active, u.is_superuser, u.created_at, u.updated_at,
+            p.id AS profile_id, p.firstname AS profile_firstname, p.lastname AS profile_lastname,
+            p.middlename AS profile_middlename, p.phone_number AS profile_phone_number, p.bio AS profile_bio,
+            p.image AS profile_image, p.user_id AS profile_user_id, p.created_at AS profile_created_at,
+            p.updated_at AS profile_updated_at
+"""
+
+# user joined to its profile.
+SELECT_POPULATED_USER = f"""
+    SELECT  {POPULATED_USER_COLUMNS}
+    FROM    users AS u
+            LEFT JOIN profiles AS p
+            ON p.user_id = u.id
+"""
+
+GET_POPULATED_USER_BY_EMAIL_QUERY = f"""
+    {SELECT_POPULATED_USER}
+    WHERE   u.email = :email;
+"""
+
+GET_POPULATED_USER_BY_USERNAME_QUERY = f"""
+    {SELECT_POPULATED_USER}
+    WHERE   u.username = :username;
+"""
+
+GET_POPULATED_USER_BY_ID_QUERY = f"""
+    {SELECT_POPULATED_USER}
+    WHERE   u.id = :id;
+"""
+
+GET_POPULATED_USERS_BY_IDS_QUERY = f"""
+    {SELECT_POPULATED_USER}
+    WHERE   u.id = ANY(:ids);
+"""
+
 
 class UsersRepository(BaseRepository):
     """All db actions associated with the Users resources."""
@@ -70,56 +108,104 @@ class UsersRepository(BaseRepository):
         super().__init__(db, r_db)
         self.auth_service = auth_service
         self.email_service = email_service
+        self.identity_cache = identity_cache
         self.profiles_repo = ProfilesRepository(db, r_db)
+        self._user_loader = None
 
-    async def populate_user(self, *, user: UserInDB) -> UserInDB:
-        """Get profile of user and add to user profile."""
-        return UserPublic(**user.dict(), profile=await self.profiles_repo.get_profile_by_user_id(user_id=user.id))
+    @property
+    def user_loader(self) -> DataLoader:
+        """Batch loader of populated users, shared by the whole request when there is one."""
+        loader = get_request_loader("users", self.load_populated_users)
+        if loader is not None:
+            return loader
+        if self._user_loader is None:
+            self._user_loader = DataLoader(self.load_populated_users, cache=False)
+        return self._user_loader
+
+    @staticmethod
+    def populated_user_from_record(record: Mapping) -> UserPublic:
+        """Build a user with its profile from the POPULATED_USER_COLUMNS of a row."""
+        profile_prefix = "profile_"
+        profile = None
+        if record["profile_id"] is not None:
+            profile = ProfilePublic(
+                **{k[len(profile_prefix):]: v for k, v in record.items() if k.startswith(profile_prefix)}
+            )
+        return UserPublic(**{k: v for k, v in record.items() if not k.startswith(profile_prefix)}, profile=profile)
+
+    async def load_populated_users(self, user_ids: List[int]) -> Dict[int, UserPublic]:
+        """Get populated users for a batch of ids with a single query."""
+        user_records = await self.db.fetch_all(query=GET_POPULATED_USERS_BY_IDS_QUERY, values={"ids": list(user_ids)})
+        return {record["id"]: self.populated_user_from_record(record) for record in user_records}
+
+    async def get_populated_user(self, *, query: str, values: Dict) -> Optional[UserPublic]:
+        """Get user and profile with a single SELECT_POPULATED_USER query."""
+        user_record = await self.db.fetch_one(query=query, values=values)
+        if user_record:
+            return self.populated_user_from_record(user_record)
 
     async def get_user_by_email(self, *, email: EmailStr, populate: bool = True) -> UserInDB:
         """Get user by email."""
+        if populate:
+            return await self.get_populated_user(query=GET_POPULATED_USER_BY_EMAIL_QUERY, values={"email": email})
         user_record = await self.db.fetch_one(query=GET_USER_BY_EMAIL_QUERY, values={"email": email})
         if user_record:
-            user = UserInDB(**user_record)
-            if populate:
-                return await self.populate_user(user=user)
-            return user
+            return UserInDB(**user_record)
 
     async def get_user_by_username(self, *, username: str, populate: bool = True) -> UserInDB:
         """Get user by username."""
+        if populate:
+            return await self.get_populated_user(
+                query=GET_POPULATED_USER_BY_USERNAME_QUERY, values={"username": username}
+            )
         user_record = await self.db.fetch_one(query=GET_USER_BY_USERNAME_QUERY, values={"username": username})
         if user_record:
-            user = UserInDB(**user_record)
-            if populate:
-                return await self.populate_user(user=user)
+            return UserInDB(**user_record)
+
+    async def get_cached_user_by_username(self, *, username: str) -> Optional[UserPublic]:
+        """Get populated user by username, going through the identity cache."""
+        user = await self.identity_cache.get(self.r_db, username=username)
+        if user is not None:
             return user
+        user = await self.get_user_by_username(username=username)
+        if user:
+            await self.identity_cache.set(self.r_db, user=user)
+        return user
+
+    async def invalidate_cached_user(self, *, user: UserInDB) -> None:
+        """Drop user from the identity cache, the request's user loader and every cached todo it owns after a write."""
+        await self.identity_cache.invalidate(self.r_db, user.username)
+        await todo_cache.invalidate_owner(self.r_db, user.id)
+        clear_request_loader_key("users", user.id)
 
     async def register_new_user(self, *, new_user: UserCreate) -> UserInDB:
         """Register new user."""
-        if await self.get_user_by_email(email=new_user.email):
+        if await self.get_user_by_email(email=new_user.email, populate=False):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"{new_user.email} is already taken. Register with a new email",
             )
-        if await self.get_user_by_username(username=new_user.username):
+        if await self.get_user_by_username(username=new_user.username, populate=False):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"{new_user.username} is already taken. Register with a new email",
             )
-        user_pwd_update = self.auth_service.create_salt_and_hashed_password(plaintext_pwd=new_user.password)
+        user_pwd_update = await self.auth_service.create_salt_and_hashed_password_async(plaintext_pwd=new_user.password)
         new_user_params = new_user.copy(update=user_pwd_update.dict())
         created_user = await self.db.fetch_one(query=REGISTER_NEW_USER_QUERY, values=new_user_params.dict())
 
-        # create profile for new user
-        await self.profiles_repo.create_profile_for_user(profile_create=ProfileCreate(user_id=created_user["id"]))
-        return await self.populate_user(user=UserInDB(**created_user))
+        # create profile for new user, it is all the population a fresh user needs.
+        profile = await self.profiles_repo.create_profile_for_user(
+            profile_create=ProfileCreate(user_id=created_user["id"])
+        )
+        return UserPublic(**UserInDB(**created_user).dict(), profile=profile)
 
     async def authenticate_user(self, *, email: EmailStr, password: str) -> Optional[UserInDB]:
         """Authenticate user."""
         user = await self.get_user_by_email(email=email, populate=False)
         if not user:
             return None
-        if not self.auth_service.verify_password(pwd=password, salt=user.salt, hashed_pwd=user.password):
+        if not await self.auth_service.verify_password_async(pwd=password, salt=user.salt, hashed_pwd=user.password):
             return None
         return user
 
@@ -128,6 +214,7 @@ class UsersRepository(BaseRepository):
         update_params = await self.db.fetch_one(
             query=UPDATE_EMAIL_STATUS_QUERY, values={"email_verified": True, "id": requesting_user.id}
         )
+        await self.invalidate_cached_user(user=requesting_user)
         return UserInDB(**update_params)
 
     def generate_otp(self, *, size=6, chars=string.ascii_uppercase + string.digits + string.ascii_lowercase) -> str:
@@ -164,21 +251,20 @@ class UsersRepository(BaseRepository):
 
     async def get_user_by_id(self, *, user_id: int, populate: bool = True) -> UserPublic:
         """Get user details by id."""
+        if populate:
+            return await self.get_populated_user(query=GET_POPULATED_USER_BY_ID_QUERY, values={"id": user_id})
         user_record = await self.db.fetch_one(query=GET_USER_BY_ID_QUERY, values={"id": user_id})
         if user_record:
-            user = UserInDB(**user_record)
-            if populate:
-                return await self.populate_user(user=user)
-            return user
+            return UserInDB(**user_record)
 
     async def update_user_details(self, *, user_update: UserUpdate, requesting_user: UserInDB) -> UserInDB:
         """Update user details."""
-        if await self.get_user_by_email(email=user_update.email):
+        if await self.get_user_by_email(email=user_update.email, populate=False):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"{user_update.email} is already taken. Register with a new email",
             )
-        if await self.get_user_by_username(username=user_update.username):
+        if await self.get_user_by_username(username=user_update.username, populate=False):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"{user_update.username} is already taken. Register with a new email",
@@ -194,7 +280,9 @@ class UsersRepository(BaseRepository):
             user_details.username = user_update.username
 
         if user_update.password is not None:
-            user_pwd_update = self.auth_service.create_salt_and_hashed_password(plaintext_pwd=user_update.password)
+            user_pwd_update = await self.auth_service.create_salt_and_hashed_password_async(
+                plaintext_pwd=user_update.password
+            )
             user_details.password = user_pwd_update.password
             user_details.salt = user_pwd_update.salt
 
@@ -202,4 +290,5 @@ class UsersRepository(BaseRepository):
             query=UPDATE_USER_DETAILS_QUERY,
             values=user_details.dict(),
         )
+        await self.invalidate_cached_user(user=requesting_user)
         return UserInDB(**updated_user)
@@ -7,17 +7,32 @@ import aioredis
 from app.core.config import DATABASE_URL, REDIS_HOST, REDIS_PASSWORD, REDIS_PORT
 from databases import Database
 from fastapi import FastAPI
+from redis.client import Redis
 
 logger = logging.getLogger(__name__)
 
 
+async def create_database(*, min_size: int = 2, max_size: int = 10) -> Database:
+    """Create and connect a postgres connection pool."""
+    DB_URL = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
+    database = Database(DB_URL, min_size=min_size, max_size=max_size)
+    await database.connect()
+    return database
+
+
+async def create_redis() -> Redis:
+    """Create a redis connection pool."""
+    # tests get their own redis db so cached entries never leak into (or out of) the dev db.
+    REDIS_DB = 1 if os.environ.get("TESTING") else 0
+    return await aioredis.create_redis_pool(
+        (REDIS_HOST, REDIS_PORT), db=REDIS_DB, password=str(REDIS_PASSWORD), timeout=10
+    )
+
+
 async def connect_to_db(app: FastAPI) -> None:
     """Connect to postgres db."""
-    DB_URL = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
-    database = Database(DB_URL, min_size=2, max_size=10)
     try:
-        await database.connect()
-        app.state._db = database
+        app.state._db = await create_database()
     except Exception as e:
         logger.warning("--- DB CONNECTION ERROR ---")
         logger.warning(e)
@@ -37,9 +52,7 @@ async def close_db_connection(app: FastAPI) -> None:
 async def connect_to_redis(app: FastAPI) -> None:
     """Connect to redis."""
     try:
-        client = await aioredis.create_redis_pool(
-            (REDIS_HOST, REDIS_PORT), db=0, password=str(REDIS_PASSWORD), timeout=10
-        )
+        client = await create_redis()
         # client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=str(REDIS_PASSWORD), db=0, socket_timeout=10)
         app.state._redis = client
     except Exception as e:
@@ -1,20 +1,37 @@
 """Model for Feed."""
 
 import datetime
+from enum import Enum
 from typing import Literal, Optional
 
 from app.models.core import CoreModel
 from app.models.todo import TodoPublic
 
 
+class FeedOrderBy(str, Enum):
+    """Orderings of the task feed: newest events first, or most urgent tasks first."""
+
+    recent = "recent"
+    urgency = "urgency"
+
+
 class FeedItem(CoreModel):
     """Feeditem base class."""
 
     row_number: Optional[int]
+    event_id: Optional[int]
     event_timestamp: Optional[datetime.datetime]
+    urgency_score: Optional[int]
 
 
 class TodoFeedItem(TodoPublic, FeedItem):
     """Class item for todofeed."""
 
     event_type: Optional[Literal["is_update", "is_create"]]  # we could have used Enum though.
+
+
+class FeedChanges(CoreModel):
+    """How many feed items are newer than a cursor, and the cursor of the newest."""
+
+    count: int
+    newest_cursor: Optional[str]
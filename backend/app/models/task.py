@@ -9,7 +9,7 @@ from app.models.user import UserPublic
 
 
 class TaskStatus(str, Enum):
-    """Status of an assigned task."""
+    """Status of an assigned task. Stored as the task_status postgres enum."""
 
     accepted = "accepted"
     rejected = "rejected"
@@ -51,3 +51,14 @@ class TaskPublic(TaskInDB):
 
     user: Optional[UserPublic]
     todo: Optional[TodoPublic]
+
+
+class TaskOfferStats(CoreModel):
+    """Counts of the offers for a task, by status."""
+
+    total: int
+    pending: int
+    accepted: int
+    rejected: int
+    cancelled: int
+    completed: int
@@ -1,17 +1,20 @@
 """All functions to handle models of todos."""
 
-from datetime import date
+import json
+from datetime import date, datetime
 from enum import Enum
-from typing import Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
+from app.core.config import TODO_BULK_MAX_ITEMS
 from app.models.core import CoreModel, DateTimeModelMixin, IDModelMixin
 from app.models.user import UserPublic
+from pydantic import conint, conlist, validator
 
 #  from app.models.comment import CommentPublic
 
 
 class PriorityType(str, Enum):
-    """Types of priority types."""
+    """Types of priority types, from most to least severe. Stored as the todo_priority postgres enum."""
 
     critical = "critical"
     high = "high"
@@ -19,6 +22,35 @@ class PriorityType(str, Enum):
     normal = "normal"
 
 
+class TodoOrderBy(str, Enum):
+    """Keyset orderings of a user's todo listing."""
+
+    duedate = "duedate"
+    updated_at = "updated_at"
+    priority = "priority"
+
+
+class TodoEventType(str, Enum):
+    """Kinds of todo events. Stored as the todo_event_type postgres enum."""
+
+    is_create = "is_create"
+    is_update = "is_update"
+
+
+class TodoSearchScope(str, Enum):
+    """Which todos a search runs over."""
+
+    own = "own"
+    marketplace = "marketplace"
+
+
+class TodoFileFormat(str, Enum):
+    """File formats todos can be exported and imported in."""
+
+    ndjson = "ndjson"
+    csv = "csv"
+
+
 class TodoBase(CoreModel):
     """All common characteristics of todo."""
 
@@ -57,3 +89,77 @@ class TodoPublic(TodoInDB):
     """Todo to public."""
 
     owner: Union[int, UserPublic]
+
+
+class TodoSearchResult(TodoInDB):
+    """Todo matching a search, with its rank and highlighted snippets."""
+
+    owner: int
+    rank: float
+    name_highlight: str
+    notes_highlight: Optional[str]
+
+
+class TodoBulkUpdate(TodoUpdate):
+    """Update of one todo in a bulk update."""
+
+    id: conint(ge=1)
+
+
+class TodoBulkResult(CoreModel):
+    """Outcome of one item of a bulk request, index is its position in the request."""
+
+    index: int
+    id: Optional[int]
+    status_code: int
+    detail: Optional[str]
+    todo: Optional[TodoInDB]
+
+
+TodoBulkCreateList = conlist(TodoCreate, min_items=1, max_items=TODO_BULK_MAX_ITEMS)
+TodoBulkUpdateList = conlist(TodoBulkUpdate, min_items=1, max_items=TODO_BULK_MAX_ITEMS)
+TodoBulkDeleteList = conlist(conint(ge=1), min_items=1, max_items=TODO_BULK_MAX_ITEMS)
+
+
+class TodoImportReject(CoreModel):
+    """Row of an import that failed validation."""
+
+    line: int
+    errors: List[str]
+
+
+class TodoImportResult(CoreModel):
+    """Outcome of an import."""
+
+    imported: int
+    rejected: int
+    rejects: List[TodoImportReject]
+    duration_ms: float
+
+
+class TodoStats(CoreModel):
+    """Counts of a user's todos."""
+
+    total: int
+    critical: int
+    high: int
+    standard: int
+    normal: int
+    as_task: int
+    overdue: int
+
+
+class TodoEvent(IDModelMixin, CoreModel):
+    """Write to a todo, from the todo_events log. changes holds the values it set, all of them for a create."""
+
+    todo_id: int
+    owner: int
+    event_type: TodoEventType
+    as_task: bool
+    event_timestamp: datetime
+    changes: Dict[str, Any] = {}
+
+    @validator("changes", pre=True)
+    def parse_changes(cls, value: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """jsonb columns are read as text."""
+        return json.loads(value) if isinstance(value, str) else value
@@ -1,6 +1,12 @@
 """Initailise services."""
 from app.services.authentication import AuthService
+from app.services.cache import IdentityCache, TodoCache
 from app.services.email import EmailService
+from app.services.feed import FeedPageCache, TaskFeed
 
 auth_service = AuthService()
 email_service = EmailService()
+identity_cache = IdentityCache()
+todo_cache = TodoCache()
+task_feed = TaskFeed()
+feed_page_cache = FeedPageCache()
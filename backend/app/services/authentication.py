@@ -8,12 +8,10 @@ import jwt
 from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_AUDIENCE, SECRET_KEY
 from app.models.token import JWTCreds, JWTMeta, JWTPayload
 from app.models.user import UserBase, UserPasswordUpdate
+from app.services.hashing import password_hasher, pwd_context
 from fastapi import HTTPException, status
-from passlib.context import CryptContext
 from pydantic import ValidationError
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class AUthException(BaseException):
     """Custom auth excpetion."""
@@ -30,6 +28,12 @@ class AuthService:
         hashed_password = self.hash_password(pwd=plaintext_pwd, salt=salt)
         return UserPasswordUpdate(salt=salt, password=hashed_password)
 
+    async def create_salt_and_hashed_password_async(self, *, plaintext_pwd: str) -> UserPasswordUpdate:
+        """Create salt and hashed password without blocking the event loop."""
+        salt = self.generate_salt()
+        hashed_password = await self.hash_password_async(pwd=plaintext_pwd, salt=salt)
+        return UserPasswordUpdate(salt=salt, password=hashed_password)
+
     def generate_salt(self) -> str:
         """Generate salt."""
         return bcrypt.gensalt().decode()
@@ -42,6 +46,14 @@ class AuthService:
         """Verify password."""
         return pwd_context.verify(pwd + salt, hashed_pwd)
 
+    async def hash_password_async(self, *, pwd: str, salt: str) -> str:
+        """Hash password in the password hasher executor."""
+        return await password_hasher.hash(pwd + salt)
+
+    async def verify_password_async(self, *, pwd: str, salt: str, hashed_pwd: str) -> bool:
+        """Verify password in the password hasher executor."""
+        return await password_hasher.verify(pwd + salt, hashed_pwd)
+
     def create_access_token_for_user(
         self,
         *,
@@ -0,0 +1,249 @@
+"""Caches shared by repositories: an in-process LRU, the identity cache and the todo cache built on top of redis."""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.config import (
+    TODO_CACHE_TTL_SECONDS,
+    TODO_CACHE_VERSION_TTL_SECONDS,
+    USER_CACHE_LOCAL_MAX_SIZE,
+    USER_CACHE_LOCAL_TTL_SECONDS,
+    USER_CACHE_TTL_SECONDS,
+)
+from app.models.todo import TodoPublic
+from app.models.user import UserPublic
+from redis.client import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTTLCache:
+    """Small in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, *, max_size: int, ttl: float) -> None:
+        """Initialize. max_size (int): entries kept before evicting, ttl (float): seconds an entry lives."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get an entry if it exists and has not expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Add an entry, evicting the least recently used one when full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove an entry."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        """Number of entries (expired ones included until they are read)."""
+        return len(self._entries)
+
+
+class IdentityCache:
+    """Two tier cache of populated users keyed by username.
+
+    The local tier absorbs repeated lookups within a worker. Its short ttl bounds how long another worker may
+    serve a user after an update, since invalidation only reaches the local tier of the worker that made it.
+    The redis tier is shared by every worker and is invalidated explicitly on writes.
+    """
+
+    key_prefix = "identity:user:"
+
+    def __init__(
+        self,
+        *,
+        local_max_size: int = USER_CACHE_LOCAL_MAX_SIZE,
+        local_ttl: float = USER_CACHE_LOCAL_TTL_SECONDS,
+        redis_ttl: int = USER_CACHE_TTL_SECONDS,
+    ) -> None:
+        """Initialize both tiers and the hit/miss counters."""
+        self.local = LocalTTLCache(max_size=local_max_size, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def redis_key(self, username: str) -> str:
+        """Redis key for a username."""
+        return f"{self.key_prefix}{username}"
+
+    async def get(self, r_db: Redis, *, username: str) -> Optional[UserPublic]:
+        """Get a cached user, trying the local tier first and then redis."""
+        user = self.local.get(username)
+        if user is not None:
+            self.local_hits += 1
+            return user
+        try:
+            cached = await r_db.get(self.redis_key(username))
+        except Exception as e:
+            logger.warning("--- Identity cache read error ---")
+            logger.warning(e)
+            cached = None
+        if cached is None:
+            self.misses += 1
+            return None
+        self.redis_hits += 1
+        user = UserPublic.parse_raw(cached)
+        self.local.set(username, user)
+        return user
+
+    async def set(self, r_db: Redis, *, user: UserPublic) -> None:
+        """Store a populated user in both tiers."""
+        self.local.set(user.username, user)
+        try:
+            await r_db.setex(self.redis_key(user.username), self.redis_ttl, user.json(exclude={"access_token"}))
+        except Exception as e:
+            logger.warning("--- Identity cache write error ---")
+            logger.warning(e)
+
+    async def invalidate(self, r_db: Redis, *usernames: str) -> None:
+        """Drop users from both tiers."""
+        usernames = [username for username in usernames if username]
+        if not usernames:
+            return
+        for username in usernames:
+            self.local.delete(username)
+        try:
+            await r_db.delete(*[self.redis_key(username) for username in usernames])
+        except Exception as e:
+            logger.warning("--- Identity cache invalidation error ---")
+            logger.warning(e)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of the cache."""
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "local_size": len(self.local),
+        }
+
+
+class TodoCache:
+    """Redis cache of populated todos, validated against version stamps on every read.
+
+    Every write to a todo increments `todo:{id}:version` and every write to a user or profile increments
+    `user:{id}:version`. An entry records the stamps that were current before the rows it was built from were
+    read, so an entry built concurrently with a write carries an old stamp and is never served.
+    """
+
+    key_prefix = "todo:"
+    owner_key_prefix = "user:"
+
+    def __init__(self, *, ttl: int = TODO_CACHE_TTL_SECONDS, version_ttl: int = TODO_CACHE_VERSION_TTL_SECONDS) -> None:
+        """Initialize the ttls and the hit/miss counters."""
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def entry_key(self, todo_id: int) -> str:
+        """Redis key of a cached todo."""
+        return f"{self.key_prefix}{todo_id}"
+
+    def version_key(self, todo_id: int) -> str:
+        """Redis key of a todo's version stamp."""
+        return f"{self.key_prefix}{todo_id}:version"
+
+    def owner_version_key(self, user_id: int) -> str:
+        """Redis key of a user's version stamp."""
+        return f"{self.owner_key_prefix}{user_id}:version"
+
+    async def get(self, r_db: Redis, *, todo_id: int) -> Tuple[Optional[TodoPublic], Optional[bytes]]:
+        """Get a cached todo if it is current. On a miss, returns the todo version to stamp the new entry with.
+
+        The entry and the todo stamp are read together. The owner stamp, whose key depends on the entry, is read
+        after them, so a user write made meanwhile turns the read into a miss rather than a stale hit.
+        """
+        try:
+            tr = r_db.multi_exec()
+            tr.get(self.version_key(todo_id))
+            tr.hmget(self.entry_key(todo_id), "todo_version", "owner_id", "owner_version", "payload")
+            todo_version, (entry_todo_version, owner_id, entry_owner_version, payload) = await tr.execute()
+            todo_version = todo_version or b"0"
+            found = False
+            if payload is not None and entry_todo_version == todo_version:
+                owner_version = await r_db.get(self.owner_version_key(int(owner_id))) or b"0"
+                found = entry_owner_version == owner_version
+        except Exception as e:
+            logger.warning("--- Todo cache read error ---")
+            logger.warning(e)
+            return None, None
+        if found:
+            self.hits += 1
+            return TodoPublic.parse_raw(payload), None
+        self.misses += 1
+        return None, todo_version
+
+    async def get_owner_version(self, r_db: Redis, *, user_id: int) -> Optional[bytes]:
+        """Current version stamp of a user, read before the user is loaded."""
+        try:
+            return await r_db.get(self.owner_version_key(user_id)) or b"0"
+        except Exception as e:
+            logger.warning("--- Todo cache read error ---")
+            logger.warning(e)
+            return None
+
+    async def set(self, r_db: Redis, *, todo: TodoPublic, todo_version: bytes, owner_version: bytes) -> None:
+        """Store a populated todo stamped with the versions read before it was loaded."""
+        owner_id = todo.owner if isinstance(todo.owner, int) else todo.owner.id
+        entry_key = self.entry_key(todo.id)
+        tr = r_db.multi_exec()
+        entry = {"todo_version": todo_version, "owner_id": owner_id, "owner_version": owner_version}
+        tr.hmset_dict(entry_key, {**entry, "payload": todo.json()})
+        tr.expire(entry_key, self.ttl)
+        # keep the stamps alive for longer than the entry, a stamp that expired would restart from 0.
+        tr.expire(self.version_key(todo.id), self.version_ttl)
+        tr.expire(self.owner_version_key(owner_id), self.version_ttl)
+        try:
+            await tr.execute()
+        except Exception as e:
+            logger.warning("--- Todo cache write error ---")
+            logger.warning(e)
+
+    async def bump(self, r_db: Redis, *version_keys: str) -> None:
+        """Increment version stamps, making every entry stamped with them stale."""
+        if not version_keys:
+            return
+        tr = r_db.multi_exec()
+        for version_key in version_keys:
+            tr.incr(version_key)
+            tr.expire(version_key, self.version_ttl)
+        try:
+            await tr.execute()
+        except Exception as e:
+            logger.warning("--- Todo cache invalidation error ---")
+            logger.warning(e)
+
+    async def invalidate(self, r_db: Redis, *todo_ids: int) -> None:
+        """Invalidate todos after they were written or deleted."""
+        await self.bump(r_db, *[self.version_key(todo_id) for todo_id in todo_ids])
+
+    async def invalidate_owner(self, r_db: Redis, *user_ids: int) -> None:
+        """Invalidate every todo embedding these users after a user or profile write."""
+        await self.bump(r_db, *[self.owner_version_key(user_id) for user_id in user_ids])
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of the cache."""
+        return {"hits": self.hits, "misses": self.misses}
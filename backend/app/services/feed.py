@@ -0,0 +1,381 @@
+"""Task feed kept in a redis sorted set, written to as todos offered as tasks change, and its first page cache."""
+
+import asyncio
+import datetime
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import (
+    FEED_BACKEND,
+    FEED_PAGE_CACHE_MAX_ITEMS,
+    FEED_PAGE_CACHE_STALE_SECONDS,
+    FEED_PAGE_CACHE_TTL_SECONDS,
+    FEED_REDIS_MAX_ITEMS,
+)
+from app.models.feed import TodoFeedItem
+from app.models.todo import TodoEvent
+from redis.client import Redis
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# KEYS: lock. ARGV: token. only the holder of the lock may release it.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def score_for(timestamp: datetime.datetime) -> int:
+    """Microseconds since the epoch. Exact in a sorted set score, which is a double."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def timestamp_for(score: float) -> datetime.datetime:
+    """Timestamp a score was made from."""
+    return EPOCH + datetime.timedelta(microseconds=int(score))
+
+
+class TaskFeedEvent(NamedTuple):
+    """Event read from the feed, with its member to remove it by."""
+
+    member: bytes
+    id: int
+    todo_id: int
+    event_type: str
+    owner: int
+    event_timestamp: datetime.datetime
+
+
+class TaskFeed:
+    """Feed of the todo events of todos offered as tasks, newest first.
+
+    Each event is a member `event_id:todo_id:event_type:owner` scored by its timestamp, so a page is one
+    ZREVRANGEBYSCORE and the requesting user's own todos are skipped without reading them. Event ids are zero padded
+    so events with the same timestamp sort by id, like the postgres feed. Only the newest `max_items` events are
+    kept. Pages the set can't answer return None and are served from postgres, which the set is rebuilt from.
+    Events of todos deleted or no longer offered as tasks are left for readers to drop.
+    """
+
+    key = "feed:tasks"
+    built_key = "feed:tasks:built"
+
+    def __init__(self, *, enabled: bool = FEED_BACKEND == "redis", max_items: int = FEED_REDIS_MAX_ITEMS) -> None:
+        """Initialize. Nothing is written to redis unless enabled."""
+        self.enabled = enabled
+        self.max_items = max_items
+
+    def member(self, event: TodoEvent) -> str:
+        """Sorted set member of an event."""
+        return f"{event.id:012d}:{event.todo_id}:{event.event_type.value}:{event.owner}"
+
+    async def record(self, r_db: Redis, *events: TodoEvent) -> None:
+        """Write the events a write to todos just logged."""
+        if self.enabled and events:
+            await self.write(r_db, *events)
+
+    async def write(self, r_db: Redis, *events: TodoEvent) -> bool:
+        """Write events of tasks whether or not the feed is enabled, as a rebuild does. False if it failed."""
+        task_events = [event for event in events if event.as_task]
+        if not task_events:
+            return True
+        tr = r_db.multi_exec()
+        for event in task_events:
+            tr.zadd(self.key, score_for(event.event_timestamp), self.member(event))
+        tr.zremrangebyrank(self.key, 0, -self.max_items - 1)
+        return await self.execute(r_db, tr)
+
+    async def remove(self, r_db: Redis, *members: bytes) -> None:
+        """Remove events whose todos were deleted or are no longer offered as tasks."""
+        if not self.enabled or not members:
+            return
+        tr = r_db.multi_exec()
+        tr.zrem(self.key, *members)
+        await self.execute(r_db, tr)
+
+    async def execute(self, r_db: Redis, tr: Any) -> bool:
+        """Run a write. If it fails the set is missing events, so pages go to postgres until it is rebuilt."""
+        try:
+            await tr.execute()
+            return True
+        except Exception as e:
+            logger.warning("--- Task feed write error ---")
+            logger.warning(e)
+        try:
+            await self.mark_built(r_db, built=False)
+        except Exception:
+            pass
+        return False
+
+    async def page(
+        self,
+        r_db: Redis,
+        *,
+        exclude_owner: Optional[int],
+        before: datetime.datetime,
+        after_id: Optional[int] = None,
+        page_chunk_size: int,
+    ) -> Optional[List[TaskFeedEvent]]:
+        """Events before a timestamp, skipping exclude_owner's todos unless it is None.
+
+        With after_id, events at the timestamp itself with a lower id are included, to continue after a cursor.
+        None if the set hasn't been built, or the page reaches past the events it keeps.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return await self.read_page(
+                r_db, exclude_owner=exclude_owner, before=before, after_id=after_id, page_chunk_size=page_chunk_size
+            )
+        except Exception as e:
+            logger.warning("--- Task feed read error ---")
+            logger.warning(e)
+            return None
+
+    async def read_page(
+        self,
+        r_db: Redis,
+        *,
+        exclude_owner: Optional[int],
+        before: datetime.datetime,
+        after_id: Optional[int],
+        page_chunk_size: int,
+    ) -> Optional[List[TaskFeedEvent]]:
+        """Read a page, over-fetching so a page of the requesting user's own todos doesn't need many round trips."""
+        if not await self.is_built(r_db):
+            return None
+        events = []
+        max_score = score_for(before)
+        offset, chunk = 0, page_chunk_size * 2
+        while len(events) < page_chunk_size:
+            members = await r_db.zrevrangebyscore(
+                self.key,
+                max=max_score,
+                exclude=r_db.ZSET_EXCLUDE_MAX if after_id is None else None,
+                withscores=True,
+                offset=offset,
+                count=chunk,
+            )
+            for member, score in members:
+                event_id, todo_id, event_type, owner = member.decode().split(":")
+                if score == max_score and after_id is not None and int(event_id) >= after_id:
+                    continue
+                if int(owner) != exclude_owner:
+                    events.append(
+                        TaskFeedEvent(member, int(event_id), int(todo_id), event_type, int(owner), timestamp_for(score))
+                    )
+            offset += len(members)
+            if len(members) < chunk:
+                # the set ran out. if it was trimmed, older events are only in postgres.
+                if len(events) < page_chunk_size and await r_db.zcard(self.key) >= self.max_items:
+                    return None
+                break
+        return events[:page_chunk_size]
+
+    async def newer(
+        self,
+        r_db: Redis,
+        *,
+        exclude_owner: int,
+        since: Optional[Tuple[datetime.datetime, int]],
+        limit: int,
+    ) -> Optional[List[TaskFeedEvent]]:
+        """Up to limit events after the (event_timestamp, event_id) of since, newest first, skipping exclude_owner's.
+
+        None if the set hasn't been built, or may have been trimmed of some of them.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return await self.read_newer(r_db, exclude_owner=exclude_owner, since=since, limit=limit)
+        except Exception as e:
+            logger.warning("--- Task feed read error ---")
+            logger.warning(e)
+            return None
+
+    async def read_newer(
+        self,
+        r_db: Redis,
+        *,
+        exclude_owner: int,
+        since: Optional[Tuple[datetime.datetime, int]],
+        limit: int,
+    ) -> Optional[List[TaskFeedEvent]]:
+        """Read the newest events down to since, from the members only."""
+        if not await self.is_built(r_db):
+            return None
+        events = []
+        min_score = float("-inf") if since is None else score_for(since[0])
+        offset, chunk = 0, limit * 2
+        while len(events) < limit:
+            members = await r_db.zrevrangebyscore(self.key, min=min_score, withscores=True, offset=offset, count=chunk)
+            for member, score in members:
+                event_id, todo_id, event_type, owner = member.decode().split(":")
+                if since is not None and score == min_score and int(event_id) <= since[1]:
+                    continue
+                if int(owner) != exclude_owner:
+                    events.append(
+                        TaskFeedEvent(member, int(event_id), int(todo_id), event_type, int(owner), timestamp_for(score))
+                    )
+            offset += len(members)
+            if len(members) < chunk:
+                if len(events) < limit and await r_db.zcard(self.key) >= self.max_items:
+                    return None
+                break
+        return events[:limit]
+
+    async def is_built(self, r_db: Redis) -> bool:
+        """Whether pages can be served from the set."""
+        return bool(await r_db.exists(self.built_key))
+
+    async def mark_built(self, r_db: Redis, built: bool = True) -> None:
+        """Let pages be served from the set once it holds every event, or send them to postgres while it doesn't."""
+        if built:
+            await r_db.set(self.built_key, 1)
+        else:
+            await r_db.delete(self.built_key)
+
+    async def clear(self, r_db: Redis) -> None:
+        """Drop the set. Pages are served from postgres until it is rebuilt."""
+        await r_db.delete(self.key, self.built_key)
+
+
+class FeedPageCache:
+    """Newest items of the task feed of every user, cached in redis for `ttl` seconds.
+
+    The items aren't filtered by owner, so one entry serves every user's first page and each request drops the
+    requesting user's todos in memory. Once the entry is older than `ttl`, one request refreshes it under a redis
+    lock while the others keep serving it, until it expires after `stale_ttl`. Requests of a worker that find no
+    entry share one refresh. So the feed query runs about once per `ttl` however many users poll.
+    """
+
+    key = "feed:tasks:page"
+    lock_key = "feed:tasks:page:lock"
+
+    def __init__(
+        self,
+        *,
+        ttl: float = FEED_PAGE_CACHE_TTL_SECONDS,
+        stale_ttl: int = FEED_PAGE_CACHE_STALE_SECONDS,
+        max_items: int = FEED_PAGE_CACHE_MAX_ITEMS,
+        lock_ttl: float = 10,
+        poll_interval: float = 0.05,
+    ) -> None:
+        """Initialize. Nothing is cached when ttl is 0."""
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_items = max_items
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._refresh: Optional[asyncio.Future] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(
+        self, r_db: Redis, *, build: Callable[[int], Awaitable[List[TodoFeedItem]]]
+    ) -> Optional[List[TodoFeedItem]]:
+        """The cached items, refreshed with build(max_items) once older than ttl. None if there are none to serve."""
+        if not self.ttl:
+            return None
+        built_at, items = await self.read(r_db)
+        if items is not None and time.time() - built_at < self.ttl:
+            self.hits += 1
+            return items
+        if self._refresh is None:
+            self._refresh = asyncio.ensure_future(self.refresh(r_db, build=build, stale=items))
+            self._refresh.add_done_callback(self.refreshed)
+        elif items is not None:
+            # another request of this worker is refreshing the entry.
+            self.stale_hits += 1
+            return items
+        return await asyncio.shield(self._refresh)
+
+    def refreshed(self, refresh: asyncio.Future) -> None:
+        """Let the next stale read start a refresh."""
+        self._refresh = None
+
+    async def refresh(
+        self,
+        r_db: Redis,
+        *,
+        build: Callable[[int], Awaitable[List[TodoFeedItem]]],
+        stale: Optional[List[TodoFeedItem]],
+    ) -> Optional[List[TodoFeedItem]]:
+        """Rebuild the entry, unless another worker is: then serve the stale items or wait for that worker's."""
+        token = str(uuid.uuid4())
+        try:
+            acquired = await r_db.set(
+                self.lock_key, token, pexpire=int(self.lock_ttl * 1000), exist=r_db.SET_IF_NOT_EXIST
+            )
+        except Exception as e:
+            logger.warning("--- Feed page cache lock error ---")
+            logger.warning(e)
+            return None
+        if not acquired:
+            if stale is not None:
+                self.stale_hits += 1
+                return stale
+            return await self.wait(r_db)
+        try:
+            items = await build(self.max_items)
+            self.misses += 1
+            await self.write(r_db, items)
+            return items
+        finally:
+            try:
+                await r_db.eval(RELEASE_LOCK_SCRIPT, keys=[self.lock_key], args=[token])
+            except Exception as e:
+                logger.warning("--- Feed page cache lock error ---")
+                logger.warning(e)
+
+    async def wait(self, r_db: Redis) -> Optional[List[TodoFeedItem]]:
+        """Wait for the worker holding the lock to write the entry. None if it doesn't within lock_ttl."""
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            _, items = await self.read(r_db)
+            if items is not None:
+                self.hits += 1
+                return items
+        return None
+
+    async def read(self, r_db: Redis) -> Tuple[float, Optional[List[TodoFeedItem]]]:
+        """When the entry was built, and its items. None if there is no entry."""
+        try:
+            built_at, payload = await r_db.hmget(self.key, "built_at", "payload")
+        except Exception as e:
+            logger.warning("--- Feed page cache read error ---")
+            logger.warning(e)
+            return 0, None
+        if payload is None:
+            return 0, None
+        return float(built_at), [TodoFeedItem.parse_obj(item) for item in json.loads(payload)]
+
+    async def write(self, r_db: Redis, items: List[TodoFeedItem]) -> None:
+        """Store freshly built items."""
+        payload = "[{}]".format(",".join(item.json() for item in items))
+        tr = r_db.multi_exec()
+        tr.hmset_dict(self.key, {"built_at": time.time(), "payload": payload})
+        tr.expire(self.key, self.stale_ttl)
+        try:
+            await tr.execute()
+        except Exception as e:
+            logger.warning("--- Feed page cache write error ---")
+            logger.warning(e)
+
+    async def clear(self, r_db: Redis) -> None:
+        """Drop the entry, the next read rebuilds it."""
+        await r_db.delete(self.key)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of the cache."""
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
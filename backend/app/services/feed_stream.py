@@ -0,0 +1,241 @@
+"""Push new and updated tasks to streaming clients of the feed as they are written."""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Union
+
+import asyncpg
+from app.core.config import (
+    FEED_STREAM_BUFFER_SIZE,
+    FEED_STREAM_HEARTBEAT_SECONDS,
+    FEED_STREAM_MAX_SUBSCRIBERS,
+    FEED_STREAM_RELAY_LOCK_TTL_SECONDS,
+)
+from app.db.repositories.feed import FeedRepository
+from app.services.reminders import EXTEND_LOCK_SCRIPT, RELEASE_LOCK_SCRIPT
+from databases import Database
+from redis.client import Redis
+
+logger = logging.getLogger(__name__)
+
+# postgres channel the todo_events trigger notifies the ids of new task events on.
+TODO_EVENTS_CHANNEL = "todo_events"
+
+
+class FeedSubscriber:
+    """A streaming connection: the items queued for it, and whether it fell behind and was dropped."""
+
+    __slots__ = ("user_id", "queue", "lagged")
+
+    def __init__(self, *, user_id: int, buffer_size: int) -> None:
+        """Initialize. At most buffer_size items wait to be sent."""
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.lagged = False
+
+
+class FeedStream:
+    """Fan task feed items out to the streaming connections of this worker.
+
+    The worker holding a redis lock keeps a LISTEN connection to postgres, turns the notified event ids into feed
+    items with one query per batch, and publishes them on a redis channel. Every worker subscribes to that channel
+    and queues each item, serialized once, on its connections, skipping the connection user's own todos.
+
+    Fan-out never waits on a client. A connection whose buffer is full is dropped and told it lagged, so it can
+    reload the feed. An idle connection is only a small queue waiting for an item or a heartbeat, so a worker can
+    hold `max_subscribers` of them.
+    """
+
+    channel = "feed:tasks:stream"
+    lock_key = "feed:tasks:stream:relay:lock"
+
+    def __init__(
+        self,
+        *,
+        buffer_size: int = FEED_STREAM_BUFFER_SIZE,
+        max_subscribers: int = FEED_STREAM_MAX_SUBSCRIBERS,
+        heartbeat: float = FEED_STREAM_HEARTBEAT_SECONDS,
+        lock_ttl: int = FEED_STREAM_RELAY_LOCK_TTL_SECONDS,
+    ) -> None:
+        """Initialize. Nothing is relayed or fanned out until `start`."""
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.lock_ttl = lock_ttl
+        self.subscribers: Set[FeedSubscriber] = set()
+        self.dropped = 0
+        self._tasks: List[asyncio.Task] = []
+        self._stopped: Optional[asyncio.Event] = None
+        self._subscribed: Optional[asyncio.Event] = None
+        self._relaying: Optional[asyncio.Event] = None
+        self._r_db: Optional[Redis] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether items are being fanned out."""
+        return self._stopped is not None and not self._stopped.is_set()
+
+    def subscribe(self, *, user_id: int) -> Optional[FeedSubscriber]:
+        """Add a connection. None if the worker already holds max_subscribers of them."""
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        subscriber = FeedSubscriber(user_id=user_id, buffer_size=self.buffer_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: FeedSubscriber) -> None:
+        """Remove a connection."""
+        self.subscribers.discard(subscriber)
+
+    def fan_out(self, message: Union[bytes, str]) -> None:
+        """Queue the items of a published message on every connection but their owners'."""
+        items = []
+        for item in json.loads(message):
+            owner = item["owner"] if isinstance(item["owner"], int) else item["owner"]["id"]
+            items.append((owner, json.dumps(item)))
+        for subscriber in tuple(self.subscribers):
+            for owner, payload in items:
+                if owner == subscriber.user_id:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(payload)
+                except asyncio.QueueFull:
+                    subscriber.lagged = True
+                    self.dropped += 1
+                    self.unsubscribe(subscriber)
+                    break
+
+    async def listen(
+        self, subscriber: FeedSubscriber, *, is_disconnected: Callable[[], Awaitable[bool]]
+    ) -> AsyncIterator[Optional[str]]:
+        """Items queued for a connection, and None each heartbeat without one.
+
+        Ends when the connection lagged, disconnected or the stream stopped.
+        """
+        try:
+            while self.running:
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    payload = None
+                if subscriber.lagged:
+                    return
+                yield payload
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def run_subscriber(self, r_db: Redis) -> None:
+        """Fan out the items published on the redis channel until stopped."""
+        while not self._stopped.is_set():
+            try:
+                [channel] = await r_db.subscribe(self.channel)
+                self._subscribed.set()
+                while True:
+                    message = await channel.get()
+                    if message is None:
+                        break
+                    self.fan_out(message)
+            except Exception as e:
+                logger.warning("--- Feed stream subscriber error ---")
+                logger.warning(e)
+            self._subscribed.clear()
+            await self.wait(1)
+
+    async def run_relay(self, db: Database, r_db: Redis) -> None:
+        """Relay notifications whenever this worker holds the relay lock, until stopped."""
+        while not self._stopped.is_set():
+            token = str(uuid.uuid4())
+            try:
+                if await r_db.set(
+                    self.lock_key, token, pexpire=self.lock_ttl * 1000, exist=r_db.SET_IF_NOT_EXIST
+                ):
+                    try:
+                        await self.relay(db, r_db, token=token)
+                    finally:
+                        await r_db.eval(RELEASE_LOCK_SCRIPT, keys=[self.lock_key], args=[token])
+            except Exception as e:
+                logger.warning("--- Feed stream relay error ---")
+                logger.warning(e)
+            await self.wait(self.lock_ttl / 3)
+
+    async def relay(self, db: Database, r_db: Redis, *, token: str) -> None:
+        """LISTEN for task events and publish their feed items, batching events notified meanwhile."""
+        pending: asyncio.Queue = asyncio.Queue()
+
+        def notified(connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+            for event_id in payload.split(","):
+                pending.put_nowait(int(event_id))
+
+        feed_repo = FeedRepository(db, r_db)
+        connection = await asyncpg.connect(str(db.url))
+        try:
+            await connection.add_listener(TODO_EVENTS_CHANNEL, notified)
+            logger.info("--- Feed stream relaying task events ---")
+            self._relaying.set()
+            while not self._stopped.is_set() and not connection.is_closed():
+                try:
+                    event_ids = [await asyncio.wait_for(pending.get(), timeout=1)]
+                except asyncio.TimeoutError:
+                    event_ids = []
+                while not pending.empty():
+                    event_ids.append(pending.get_nowait())
+                if not await r_db.eval(EXTEND_LOCK_SCRIPT, keys=[self.lock_key], args=[token, self.lock_ttl * 1000]):
+                    logger.warning("--- Feed stream relay lost its lock ---")
+                    return
+                if not event_ids:
+                    continue
+                items = await feed_repo.get_todo_feed_items_by_event_ids(event_ids=event_ids)
+                if items:
+                    await r_db.publish(self.channel, "[{}]".format(",".join(item.json() for item in items)))
+        finally:
+            self._relaying.clear()
+            await connection.close()
+
+    async def wait(self, timeout: float) -> None:
+        """Sleep for timeout seconds, or until stopped."""
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def ready(self, *, relaying: bool = False) -> None:
+        """Wait until this worker is subscribed to the redis channel, and with relaying until it relays too."""
+        await self._subscribed.wait()
+        if relaying:
+            await self._relaying.wait()
+
+    def start(self, db: Database, r_db: Redis) -> None:
+        """Run the relay and the subscriber in the background of the current event loop."""
+        if not self._tasks:
+            self._stopped = asyncio.Event()
+            self._subscribed = asyncio.Event()
+            self._relaying = asyncio.Event()
+            self._r_db = r_db
+            self._tasks = [
+                asyncio.ensure_future(self.run_relay(db, r_db)),
+                asyncio.ensure_future(self.run_subscriber(r_db)),
+            ]
+
+    async def stop(self) -> None:
+        """Stop relaying and fanning out. Open connections end at their next heartbeat."""
+        if not self._tasks:
+            return
+        self._stopped.set()
+        try:
+            await self._r_db.unsubscribe(self.channel)
+        except Exception as e:
+            logger.warning("--- Feed stream subscriber error ---")
+            logger.warning(e)
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        self._stopped = None
+        self._subscribed = None
+        self._relaying = None
+        self._r_db = None
+
+
+feed_stream = FeedStream()
@@ -0,0 +1,110 @@
+"""Run bcrypt hashing and verification off the event loop."""
+
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.config import (
+    PASSWORD_HASHER_EXECUTOR,
+    PASSWORD_HASHER_MAX_CONCURRENCY,
+    PASSWORD_HASHER_MAX_QUEUE,
+    PASSWORD_HASHER_MAX_WORKERS,
+)
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_secret(secret: str) -> str:
+    """Hash a salted password. Module level so process pool workers can unpickle it."""
+    return pwd_context.hash(secret)
+
+
+def verify_secret(secret: str, hashed_secret: str) -> bool:
+    """Verify a salted password against its hash."""
+    return pwd_context.verify(secret, hashed_secret)
+
+
+class PasswordHasher:
+    """Bounded executor for password hashing.
+
+    At most `max_concurrency` hashes run at once and at most `max_queue` more wait for a slot. Anything beyond
+    that is rejected with a 503 so a login burst sheds load instead of piling up behind bcrypt.
+    """
+
+    def __init__(
+        self,
+        *,
+        executor_type: str = PASSWORD_HASHER_EXECUTOR,
+        max_workers: int = PASSWORD_HASHER_MAX_WORKERS,
+        max_concurrency: int = PASSWORD_HASHER_MAX_CONCURRENCY,
+        max_queue: int = PASSWORD_HASHER_MAX_QUEUE,
+    ) -> None:
+        """Initialize. The executor is only created on first use."""
+        if executor_type not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown password hasher executor: {executor_type}")
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get_executor(self) -> Executor:
+        """Create the executor on first use."""
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pwd-hasher")
+        return self._executor
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        """Semaphore bound to the running loop, recreated if the loop changed."""
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """Run func(*args) in the executor, waiting for a free slot."""
+        if self.executor_type == "inline":
+            return func(*args)
+        if self.pending >= self.max_concurrency + self.max_queue:
+            logger.warning("--- Password hasher queue full, rejecting request ---")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests. Try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            async with self.get_semaphore():
+                loop = asyncio.get_event_loop()
+                return await loop.run_in_executor(self.get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, secret: str) -> str:
+        """Hash a salted password."""
+        return await self.run(hash_secret, secret)
+
+    async def verify(self, secret: str, hashed_secret: str) -> bool:
+        """Verify a salted password."""
+        return await self.run(verify_secret, secret, hashed_secret)
+
+    def shutdown(self) -> None:
+        """Shut the executor down, waiting for its workers to exit so none outlive the app."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,104 @@
+"""Create upcoming comment partitions and move partitions past the retention window to the archive schema."""
+
+import datetime
+import logging
+import re
+from typing import Dict, List, Optional
+
+from app.core.config import COMMENTS_PARTITION_MONTHS_AHEAD, COMMENTS_RETENTION_MONTHS
+from databases import Database
+
+logger = logging.getLogger(__name__)
+
+CREATE_COMMENTS_PARTITION_QUERY = """
+    SELECT create_comments_partition(:month) AS name;
+"""
+
+LIST_COMMENTS_PARTITIONS_QUERY = """
+    SELECT child.relname AS name
+    FROM pg_inherits
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = CAST('public.comments' AS regclass)
+    ORDER BY child.relname;
+"""
+
+# partition names are checked against PARTITION_NAME before they are put in these statements.
+DETACH_COMMENTS_PARTITION_QUERY = "ALTER TABLE public.comments DETACH PARTITION public.{name};"
+MOVE_COMMENTS_PARTITION_QUERY = "ALTER TABLE public.{name} SET SCHEMA archive;"
+ATTACH_ARCHIVE_COMMENTS_PARTITION_QUERY = """
+    ALTER TABLE archive.comments ATTACH PARTITION archive.{name}
+    FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00');
+"""
+
+PARTITION_NAME = re.compile(r"^comments_p(\d{4})_(\d{2})$")
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """First day of the month `months` after the month of a date."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+class CommentPartitionManager:
+    """Keep the live comments table to `retention_months` of month partitions, plus `months_ahead` empty ones.
+
+    Partitions past the retention window are detached and attached to archive.comments, which only the archive
+    endpoint reads. The hot paths then only touch the indexes of recent months.
+    """
+
+    def __init__(
+        self, *, months_ahead: int = COMMENTS_PARTITION_MONTHS_AHEAD, retention_months: int = COMMENTS_RETENTION_MONTHS
+    ) -> None:
+        """Initialize."""
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+
+    async def create_partition(self, db: Database, *, month: datetime.date) -> str:
+        """Create the partition of a month if it doesn't exist. Returns its name."""
+        return (await db.fetch_one(query=CREATE_COMMENTS_PARTITION_QUERY, values={"month": month}))["name"]
+
+    async def ensure_partitions(self, db: Database, *, today: datetime.date) -> List[str]:
+        """Make sure the current month and the next `months_ahead` have partitions, so inserts never fail."""
+        return [
+            await self.create_partition(db, month=add_months(today, months))
+            for months in range(self.months_ahead + 1)
+        ]
+
+    async def list_partitions(self, db: Database) -> Dict[str, datetime.date]:
+        """Live partitions of comments, by name, with the month they hold."""
+        records = await db.fetch_all(query=LIST_COMMENTS_PARTITIONS_QUERY)
+        partitions = {}
+        for record in records:
+            match = PARTITION_NAME.match(record["name"])
+            if match:
+                partitions[record["name"]] = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+        return partitions
+
+    async def archive_partitions(self, db: Database, *, today: datetime.date) -> List[str]:
+        """Move every partition older than the retention window to the archive. Returns the archived names."""
+        cutoff = add_months(today, -self.retention_months)
+        archived = []
+        for name, month in (await self.list_partitions(db)).items():
+            if month >= cutoff:
+                continue
+            async with db.transaction():
+                await db.execute(query=DETACH_COMMENTS_PARTITION_QUERY.format(name=name))
+                await db.execute(query=MOVE_COMMENTS_PARTITION_QUERY.format(name=name))
+                await db.execute(
+                    query=ATTACH_ARCHIVE_COMMENTS_PARTITION_QUERY.format(
+                        name=name, start=month.isoformat(), end=add_months(month, 1).isoformat()
+                    )
+                )
+            logger.info(f"--- Archived comments partition {name} ---")
+            archived.append(name)
+        return archived
+
+    async def run(self, db: Database, *, today: Optional[datetime.date] = None) -> Dict[str, List[str]]:
+        """Create upcoming partitions, then archive old ones."""
+        today = today or datetime.date.today()
+        created = await self.ensure_partitions(db, today=today)
+        archived = await self.archive_partitions(db, today=today)
+        return {"partitions": created, "archived": archived}
+
+
+comment_partitions = CommentPartitionManager()
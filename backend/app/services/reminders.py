@@ -0,0 +1,212 @@
+"""Scan upcoming and overdue todos and queue reminder notifications for them."""
+
+import asyncio
+import datetime
+import json
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.core.config import (
+    REMINDER_LOCK_TTL_SECONDS,
+    REMINDER_OVERDUE_DAYS,
+    REMINDER_SCAN_BATCH_SIZE,
+    REMINDER_SCAN_INTERVAL_SECONDS,
+    REMINDER_UPCOMING_DAYS,
+)
+from app.db.repositories.todos import TodosRepository
+from app.models.todo import TodoInDB
+from databases import Database
+from redis.client import Redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: lock. ARGV: token, ttl in ms. only the holder of the lock may extend it.
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lock. ARGV: token. only the holder of the lock may release it.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: queue, then one dedupe key per reminder. ARGV: dedupe ttl in seconds, then one payload per reminder.
+# a reminder is pushed only the first time its dedupe key is set, so rescans never queue it twice.
+ENQUEUE_REMINDERS_SCRIPT = """
+local enqueued = 0
+for i = 2, #KEYS do
+    if redis.call('SET', KEYS[i], 1, 'NX', 'EX', ARGV[1]) then
+        redis.call('RPUSH', KEYS[1], ARGV[i])
+        enqueued = enqueued + 1
+    end
+end
+return enqueued
+"""
+
+
+class ReminderScheduler:
+    """Periodically queue reminders for todos due soon or overdue.
+
+    Each scan walks todos due between `overdue_days` ago and `upcoming_days` ahead in (duedate, id) keyset
+    batches, so memory stays bounded by `batch_size` however many todos there are. A redis lock makes sure only
+    one process scans at a time. Reminders are pushed to the `queue_key` list for a notification worker to consume.
+    """
+
+    lock_key = "reminders:scan:lock"
+    queue_key = "reminders:queue"
+    metrics_key = "reminders:metrics"
+    dedupe_key_prefix = "reminders:sent:"
+
+    def __init__(
+        self,
+        *,
+        interval: int = REMINDER_SCAN_INTERVAL_SECONDS,
+        batch_size: int = REMINDER_SCAN_BATCH_SIZE,
+        upcoming_days: int = REMINDER_UPCOMING_DAYS,
+        overdue_days: int = REMINDER_OVERDUE_DAYS,
+        lock_ttl: int = REMINDER_LOCK_TTL_SECONDS,
+    ) -> None:
+        """Initialize. The scan loop is only started by `start`."""
+        self.interval = interval
+        self.batch_size = batch_size
+        self.upcoming_days = upcoming_days
+        self.overdue_days = overdue_days
+        self.lock_ttl = lock_ttl
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def reminder_kind(self, todo: TodoInDB, today: datetime.date) -> str:
+        """Kind of reminder a todo is due."""
+        return "overdue" if todo.duedate < today else "upcoming"
+
+    def dedupe_key(self, todo: TodoInDB, kind: str) -> str:
+        """Key marking a reminder as queued. The duedate is part of it so rescheduled todos are reminded again."""
+        return f"{self.dedupe_key_prefix}{todo.id}:{todo.duedate.isoformat()}:{kind}"
+
+    async def enqueue_reminders(self, r_db: Redis, *, todos: List[TodoInDB], today: datetime.date) -> int:
+        """Queue reminders for a batch of todos in one round trip. Returns how many were new."""
+        kinds = [self.reminder_kind(todo, today) for todo in todos]
+        payloads = [
+            json.dumps(
+                {
+                    "todo_id": todo.id,
+                    "owner": todo.owner,
+                    "name": todo.name,
+                    "duedate": todo.duedate.isoformat(),
+                    "kind": kind,
+                    "queued_at": datetime.datetime.utcnow().isoformat(),
+                }
+            )
+            for todo, kind in zip(todos, kinds)
+        ]
+        # a dedupe key has to outlive the window in which its todo is picked up by scans.
+        dedupe_ttl = (self.upcoming_days + self.overdue_days + 1) * 24 * 60 * 60
+        return await r_db.eval(
+            ENQUEUE_REMINDERS_SCRIPT,
+            keys=[self.queue_key, *[self.dedupe_key(todo, kind) for todo, kind in zip(todos, kinds)]],
+            args=[dedupe_ttl, *payloads],
+        )
+
+    async def acquire_lock(self, r_db: Redis) -> Optional[str]:
+        """Take the scan lock. Returns the token to release it with, None if another process holds it."""
+        token = uuid.uuid4().hex
+        acquired = await r_db.set(self.lock_key, token, pexpire=self.lock_ttl * 1000, exist=r_db.SET_IF_NOT_EXIST)
+        return token if acquired else None
+
+    async def extend_lock(self, r_db: Redis, token: str) -> bool:
+        """Keep holding the lock while a long scan runs. False if it was lost."""
+        return bool(await r_db.eval(EXTEND_LOCK_SCRIPT, keys=[self.lock_key], args=[token, self.lock_ttl * 1000]))
+
+    async def release_lock(self, r_db: Redis, token: str) -> None:
+        """Release the lock if it is still ours."""
+        await r_db.eval(RELEASE_LOCK_SCRIPT, keys=[self.lock_key], args=[token])
+
+    async def scan(self, db: Database, r_db: Redis, *, today: Optional[datetime.date] = None) -> Optional[Dict]:
+        """Run one scan if no other process is scanning. Returns the metrics of the scan, None when skipped."""
+        token = await self.acquire_lock(r_db)
+        if token is None:
+            logger.info("--- Reminder scan skipped, another worker holds the lock ---")
+            return None
+        try:
+            return await self.scan_locked(db, r_db, token=token, today=today or datetime.date.today())
+        finally:
+            await self.release_lock(r_db, token)
+
+    async def scan_locked(self, db: Database, r_db: Redis, *, token: str, today: datetime.date) -> Dict:
+        """Walk the due window batch by batch, queueing reminders and recording metrics."""
+        todos_repo = TodosRepository(db, r_db)
+        started = time.monotonic()
+        metrics = {"scanned": 0, "enqueued": 0, "overdue": 0, "batches": 0, "completed": 1}
+        after = None
+        while True:
+            todos = await todos_repo.list_todos_due_between(
+                duedate_from=today - datetime.timedelta(days=self.overdue_days),
+                duedate_to=today + datetime.timedelta(days=self.upcoming_days),
+                after=after,
+                batch_size=self.batch_size,
+            )
+            if not todos:
+                break
+            metrics["batches"] += 1
+            metrics["scanned"] += len(todos)
+            metrics["overdue"] += sum(todo.duedate < today for todo in todos)
+            metrics["enqueued"] += await self.enqueue_reminders(r_db, todos=todos, today=today)
+            after = (todos[-1].duedate, todos[-1].id)
+            if len(todos) < self.batch_size:
+                break
+            if not await self.extend_lock(r_db, token):
+                logger.warning("--- Reminder scan lost its lock, stopping early ---")
+                metrics["completed"] = 0
+                break
+        metrics["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+        metrics["backlog"] = await r_db.llen(self.queue_key)
+        metrics["finished_at"] = datetime.datetime.utcnow().isoformat()
+        await r_db.hmset_dict(self.metrics_key, metrics)
+        logger.info(f"--- Reminder scan: {metrics} ---")
+        return metrics
+
+    async def metrics(self, r_db: Redis) -> Dict[str, str]:
+        """Metrics of the last scan."""
+        metrics = await r_db.hgetall(self.metrics_key, encoding="utf-8")
+        return metrics or {}
+
+    async def run(self, db: Database, r_db: Redis) -> None:
+        """Scan every `interval` seconds until stopped."""
+        if self._stopped is None:
+            self._stopped = asyncio.Event()
+        while not self._stopped.is_set():
+            try:
+                await self.scan(db, r_db)
+            except Exception as e:
+                logger.warning("--- Reminder scan error ---")
+                logger.warning(e)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, db: Database, r_db: Redis) -> None:
+        """Run the scan loop in the background of the current event loop."""
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.ensure_future(self.run(db, r_db))
+
+    async def stop(self) -> None:
+        """Stop the scan loop, letting a running scan finish."""
+        if self._task is None:
+            return
+        self._stopped.set()
+        await self._task
+        self._task = None
+        self._stopped = None
+
+
+reminder_scheduler = ReminderScheduler()
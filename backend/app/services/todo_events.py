@@ -0,0 +1,87 @@
+"""Compact the todo_events log, keeping full history only for the retention window."""
+
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, Optional
+
+from app.core.config import (
+    TODO_EVENTS_COMPACT_BATCH_SIZE,
+    TODO_EVENTS_COMPACT_INTERVAL_SECONDS,
+    TODO_EVENTS_RETENTION_DAYS,
+)
+from app.db.repositories.todo_events import TodoEventsRepository
+from databases import Database
+from redis.client import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class TodoEventsCompactor:
+    """Periodically delete updates older than `retention_days` that a later update of the same todo supersedes.
+
+    Creations and the last update of every todo are kept. Events are walked in ranges of `batch_size` ids, each
+    deleted in its own short statement.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: int = TODO_EVENTS_COMPACT_INTERVAL_SECONDS,
+        batch_size: int = TODO_EVENTS_COMPACT_BATCH_SIZE,
+        retention_days: int = TODO_EVENTS_RETENTION_DAYS,
+    ) -> None:
+        """Initialize. The compaction loop is only started by `start`."""
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def compact(self, db: Database, r_db: Redis, *, now: Optional[datetime.datetime] = None) -> Dict:
+        """Walk every event once. Returns how many batches ran and events were deleted."""
+        todo_events_repo = TodoEventsRepository(db, r_db)
+        started = time.monotonic()
+        before = (now or datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(days=self.retention_days)
+        max_id = await todo_events_repo.get_max_todo_event_id()
+        metrics = {"batches": 0, "deleted": 0}
+        for id_from in range(1, max_id + 1, self.batch_size):
+            metrics["deleted"] += await todo_events_repo.compact_todo_events(
+                id_from=id_from, id_to=id_from + self.batch_size - 1, before=before
+            )
+            metrics["batches"] += 1
+        metrics["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+        logger.info(f"--- Todo events compaction: {metrics} ---")
+        return metrics
+
+    async def run(self, db: Database, r_db: Redis) -> None:
+        """Compact every `interval` seconds until stopped."""
+        while not self._stopped.is_set():
+            try:
+                await self.compact(db, r_db)
+            except Exception as e:
+                logger.warning("--- Todo events compaction error ---")
+                logger.warning(e)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, db: Database, r_db: Redis) -> None:
+        """Run the compaction loop in the background of the current event loop."""
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.ensure_future(self.run(db, r_db))
+
+    async def stop(self) -> None:
+        """Stop the compaction loop, letting a running pass finish."""
+        if self._task is None:
+            return
+        self._stopped.set()
+        await self._task
+        self._task = None
+        self._stopped = None
+
+
+todo_events_compactor = TodoEventsCompactor()
@@ -0,0 +1,99 @@
+"""Read todos from CSV or NDJSON files and validate them against TodoCreate, a batch at a time."""
+
+import csv
+import io
+import json
+from typing import IO, Any, Iterator, List, Tuple
+
+from app.models.todo import PriorityType, TodoCreate, TodoFileFormat, TodoImportReject
+from pydantic import ValidationError
+
+
+class UploadReader(io.RawIOBase):
+    """Readable raw stream over a binary file that only has read(), like SpooledTemporaryFile before python 3.11.
+
+    io.TextIOWrapper needs readable() and the other io methods, which those files lack.
+    """
+
+    def __init__(self, file: IO[bytes]) -> None:
+        """Initialize. Closing the reader leaves file open."""
+        self.file = file
+
+    def readable(self) -> bool:
+        """Always readable."""
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        """Fill buffer from file, 0 at the end of it."""
+        data = self.file.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def open_upload(file: IO[bytes]) -> IO[str]:
+    """Text stream of an uploaded utf-8 file, opened with newline='' as TodoImportReader needs."""
+    return io.TextIOWrapper(io.BufferedReader(UploadReader(file)), encoding="utf-8", newline="")
+
+
+# columns of the staging table rows are copied into, in order.
+TODO_IMPORT_COLUMNS = ("position", "name", "notes", "priority", "duedate", "as_task")
+
+
+class TodoImportReader:
+    """Validate rows of a text file lazily, so a file of any size is held in memory one batch at a time.
+
+    The reader is synchronous: it is meant to be driven from a worker thread, which also takes the cost of
+    parsing and validation off the event loop.
+    """
+
+    def __init__(self, file: IO[str], *, file_format: TodoFileFormat) -> None:
+        """Initialize. file must be opened in text mode with newline=''."""
+        self.file_format = file_format
+        self.rows = self.iter_csv(file) if file_format == TodoFileFormat.csv else self.iter_ndjson(file)
+        self.validated = 0
+        self.rejected = 0
+
+    def iter_csv(self, file: IO[str]) -> Iterator[Tuple[int, Any]]:
+        """(line, row) of a csv file with a header. Empty cells are left out so model defaults apply."""
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+
+    def iter_ndjson(self, file: IO[str]) -> Iterator[Tuple[int, Any]]:
+        """(line, row) of a file with one json object per line. Blank lines are skipped."""
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+
+    def validate(self, line: int, row: Any) -> Tuple[Any, List[str]]:
+        """Copy record of a row, or the reasons it was rejected."""
+        if isinstance(row, ValueError):
+            return None, [f"invalid json: {row}"]
+        if not isinstance(row, dict):
+            return None, ["row is not an object"]
+        try:
+            todo = TodoCreate.parse_obj(row)
+        except ValidationError as e:
+            return None, [f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()]
+        return (line, todo.name, todo.notes, PriorityType(todo.priority).value, todo.duedate, todo.as_task), []
+
+    def read_batch(self, size: int) -> Tuple[List[Tuple], List[TodoImportReject]]:
+        """Up to `size` valid copy records and up to `size` rejects, whichever fills first. Empty once read."""
+        records, rejects = [], []
+        for line, row in self.rows:
+            record, errors = self.validate(line, row)
+            if errors:
+                self.rejected += 1
+                rejects.append(TodoImportReject(line=line, errors=errors))
+                if len(rejects) >= size:
+                    break
+                continue
+            self.validated += 1
+            records.append(record)
+            if len(records) >= size:
+                break
+        return records, rejects
@@ -0,0 +1,82 @@
+"""Check the todo_stats counters against the todos they count, and repair any drift."""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from app.core.config import TODO_STATS_RECONCILE_BATCH_SIZE, TODO_STATS_RECONCILE_INTERVAL_SECONDS
+from app.db.repositories.todos import TodosRepository
+from databases import Database
+from redis.client import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class TodoStatsReconciler:
+    """Periodically recount todos per owner and overwrite the counters that disagree.
+
+    Triggers keep the counters exact, so drift means a bug or a manual fix in the database. Owners are walked in
+    ranges of `batch_size` ids, each recounted in its own short transaction.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: int = TODO_STATS_RECONCILE_INTERVAL_SECONDS,
+        batch_size: int = TODO_STATS_RECONCILE_BATCH_SIZE,
+    ) -> None:
+        """Initialize. The reconcile loop is only started by `start`."""
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def reconcile(self, db: Database, r_db: Redis) -> Dict:
+        """Walk every owner once. Returns how many owners were checked and repaired."""
+        todos_repo = TodosRepository(db, r_db)
+        started = time.monotonic()
+        max_owner = await todos_repo.get_max_todo_stats_owner()
+        metrics = {"batches": 0, "repaired": 0}
+        for owner_from in range(1, max_owner + 1, self.batch_size):
+            repaired = await todos_repo.reconcile_todo_stats(
+                owner_from=owner_from, owner_to=owner_from + self.batch_size - 1
+            )
+            if repaired:
+                logger.warning(f"--- Repaired drifted todo stats of owners {repaired} ---")
+            metrics["batches"] += 1
+            metrics["repaired"] += len(repaired)
+        metrics["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+        logger.info(f"--- Todo stats reconciliation: {metrics} ---")
+        return metrics
+
+    async def run(self, db: Database, r_db: Redis) -> None:
+        """Reconcile every `interval` seconds until stopped."""
+        while not self._stopped.is_set():
+            try:
+                await self.reconcile(db, r_db)
+            except Exception as e:
+                logger.warning("--- Todo stats reconciliation error ---")
+                logger.warning(e)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, db: Database, r_db: Redis) -> None:
+        """Run the reconcile loop in the background of the current event loop."""
+        if self._task is None:
+            self._stopped = asyncio.Event()
+            self._task = asyncio.ensure_future(self.run(db, r_db))
+
+    async def stop(self) -> None:
+        """Stop the reconcile loop, letting a running pass finish."""
+        if self._task is None:
+            return
+        self._stopped.set()
+        await self._task
+        self._task = None
+        self._stopped = None
+
+
+todo_stats_reconciler = TodoStatsReconciler()
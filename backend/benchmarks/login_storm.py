@@ -0,0 +1,86 @@
+"""Latency of an unrelated endpoint while the server is hit by a login storm.
+
+Start the stack, then run the benchmark once per hasher setting and compare the percentiles:
+
+    PASSWORD_HASHER_EXECUTOR=inline  docker-compose up -d server   # before: bcrypt on the event loop
+    python benchmarks/login_storm.py --base-url http://localhost:8000
+
+    PASSWORD_HASHER_EXECUTOR=process docker-compose up -d server   # after: bcrypt in the process pool
+    python benchmarks/login_storm.py --base-url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from typing import List
+
+import httpx
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest rank percentile."""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+async def register_user(client: httpx.AsyncClient) -> dict:
+    """Register a throwaway user to log in with."""
+    suffix = uuid.uuid4().hex[:10]
+    new_user = {"email": f"storm_{suffix}@example.com", "username": f"storm_{suffix}", "password": "stormpassword"}
+    res = await client.post("/api/users/", json={"new_user": new_user})
+    res.raise_for_status()
+    return new_user
+
+
+async def login_forever(client: httpx.AsyncClient, user: dict, stop: asyncio.Event, statuses: List[int]) -> None:
+    """Keep logging in until told to stop."""
+    while not stop.is_set():
+        res = await client.post(
+            "/api/users/login/token/", data={"username": user["email"], "password": user["password"]}
+        )
+        statuses.append(res.status_code)
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float], interval: float) -> None:
+    """Time requests to an endpoint that never touches bcrypt."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        res = await client.get("/")
+        res.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def main(base_url: str, logins: int, duration: float, interval: float) -> None:
+    """Run the storm and print the probe latency distribution."""
+    limits = httpx.Limits(max_connections=logins + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        user = await register_user(client)
+        stop = asyncio.Event()
+        latencies: List[float] = []
+        statuses: List[int] = []
+        tasks = [asyncio.ensure_future(login_forever(client, user, stop, statuses)) for _ in range(logins)]
+        tasks.append(asyncio.ensure_future(probe(client, stop, latencies, interval)))
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    print(f"concurrent logins: {logins}, duration: {duration}s")
+    print(f"logins: {len(statuses)} ({statuses.count(200)} ok, {statuses.count(503)} shed with 503)")
+    print(f"probe requests: {len(latencies)}")
+    print(f"probe p50: {statistics.median(latencies):.1f} ms")
+    print(f"probe p99: {percentile(latencies, 99):.1f} ms")
+    print(f"probe max: {max(latencies):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=50, help="concurrent login loops")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run the storm")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between probe requests")
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.logins, args.duration, args.interval))
@@ -1,4 +1,5 @@
 """Confest module."""
+import asyncio
 import datetime
 import os
 import random
@@ -11,6 +12,7 @@ from alembic.config import Config
 from app.core.config import JWT_TOKEN_PREFIX, SECRET_KEY
 from app.db.repositories.comments import CommentsRepository
 from app.db.repositories.evaluations import EvaluationsRepository
+from app.db.repositories.feed import FeedRepository
 from app.db.repositories.tasks import TasksRepository
 from app.db.repositories.todos import TodosRepository
 from app.db.repositories.users import UsersRepository
@@ -19,7 +21,8 @@ from app.models.evaluation import EvaluationCreate
 from app.models.task import TaskCreate
 from app.models.todo import TodoCreate, TodoInDB, TodoUpdate
 from app.models.user import UserCreate, UserInDB
-from app.services import auth_service
+from app.services import auth_service, identity_cache, task_feed
+from app.services.feed_stream import feed_stream
 from asgi_lifespan import LifespanManager
 from databases import Database
 from fastapi import FastAPI
@@ -48,15 +51,15 @@ def app(apply_migrations: None) -> FastAPI:
     return get_application()
 
 
-# getting db
+# getting db. the connections are made by the startup handlers, which the client fixture runs.
 @pytest.fixture
-def db(app: FastAPI) -> Database:
+def db(app: FastAPI, client: AsyncClient) -> Database:
     """Postgres db object."""
     return app.state._db
 
 
 @pytest.fixture
-def r_db(app: FastAPI) -> Database:
+def r_db(app: FastAPI, client: AsyncClient) -> Database:
     """Redis database object."""
     return app.state._redis
 
@@ -66,6 +69,9 @@ def r_db(app: FastAPI) -> Database:
 async def client(app: FastAPI) -> AsyncClient:
     """Make request for test."""
     async with LifespanManager(app):
+        # caches outlive a single test, start every test from empty ones.
+        await app.state._redis.flushdb()
+        identity_cache.local.clear()
         async with AsyncClient(
             app=app,
             base_url="http://testserver",
@@ -394,6 +400,26 @@ async def test_list_of_todos_with_evaluated_task(
     ]
 
 
+@pytest.fixture
+async def redis_task_feed(client: AsyncClient, db: Database, r_db: Redis) -> None:
+    """Serve the task feed from redis, rebuilt from the todos already in the db."""
+    enabled, task_feed.enabled = task_feed.enabled, True
+    await FeedRepository(db, r_db).rebuild_task_feed()
+    yield
+    task_feed.enabled = enabled
+    await task_feed.clear(r_db)
+
+
+@pytest.fixture
+async def running_feed_stream(client: AsyncClient, db: Database, r_db: Redis) -> None:
+    """Relay task events to feed stream subscribers, as a worker with the stream enabled does."""
+    feed_stream.start(db, r_db)
+    await asyncio.wait_for(feed_stream.ready(relaying=True), timeout=10)
+    yield
+    await feed_stream.stop()
+    feed_stream.subscribers.clear()
+
+
 @pytest.fixture
 async def test_list_of_new_and_updated_todos(
     db: Database, r_db: Redis, test_user_list: List[UserInDB]
@@ -416,8 +442,9 @@ async def test_list_of_new_and_updated_todos(
     for i, todo in enumerate(new_todos):
         if i % 4 == 0:
             updated_todo = await todos_repo.update_todos_by_id(
-                todo=todo,
+                todo_id=todo.id,
                 todo_update=TodoUpdate(notes=f"Updated {todo.notes}", priority="high"),
+                requesting_user=test_user_list[i % len(test_user_list)],
             )
             new_todos[i] = updated_todo
     return new_todos
@@ -445,8 +472,9 @@ async def test_list_of_new_and_updated_todos_0(
     for i, todo in enumerate(new_todos):
         if i % 4 == 10:
             updated_todo = await todos_repo.update_todos_by_id(
-                todo=todo,
+                todo_id=todo.id,
                 todo_update=TodoUpdate(notes=f"Updated {todo.notes}", priority="high"),
+                requesting_user=test_user_list[i % len(test_user_list)],
             )
             new_todos[i] = updated_todo
     return new_todos
@@ -1,12 +1,15 @@
 """Test for comments."""
 
+import datetime
 from typing import Callable, Dict, List, Optional, Union
 
 import pytest
+from app.api.dependencies.conditional import etag_for
 from app.db.repositories.comments import CommentsRepository
 from app.models.comment import CommentCreate, CommentInDB, CommentPublic
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
+from app.services.partitions import CommentPartitionManager, add_months
 from databases.core import Database
 from fastapi import FastAPI, status
 from fastapi.encoders import jsonable_encoder
@@ -332,6 +335,22 @@ class TestUpdateComment:
         )
         assert res.status_code == status_code
 
+    async def test_if_match_rejects_stale_updates(
+        self, app: FastAPI, authorized_client: AsyncClient, test_comment: CommentInDB
+    ) -> None:
+        """Test an update sent with an outdated ETag fails with 412."""
+        comment_url = app.url_path_for("comments:update-comment-by-id", comment_id=test_comment.id)
+        etag = etag_for(test_comment.updated_at)
+        res = await authorized_client.put(
+            comment_url, json={"comment_update": {"body": "first writer"}}, headers={"If-Match": etag}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["etag"] == etag_for(CommentInDB(**res.json()).updated_at)
+        res = await authorized_client.put(
+            comment_url, json={"comment_update": {"body": "second writer"}}, headers={"If-Match": etag}
+        )
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+
 
 class TestDeleteComment:
     """Test Comment Delete."""
@@ -479,3 +498,52 @@ class TestGetComment:
         assert len(res.json()) > 0
         comments = [CommentInDB(**comment) for comment in res.json()]
         assert test_comment in comments
+
+
+class TestArchivedComments:
+    """Testing comment partitions and the archive."""
+
+    async def test_old_partitions_are_archived_and_still_readable(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        db: Database,
+        test_user: UserInDB,
+        test_todo: TodoInDB,
+        test_comment: CommentInDB,
+    ) -> None:
+        """Test partitions past the retention window move to the archive and are only listed by its endpoint."""
+        today = datetime.date.today()
+        old_month = add_months(today, -30)
+        manager = CommentPartitionManager(retention_months=24)
+        partition = await manager.create_partition(db, month=old_month)
+        old_comment = await db.fetch_one(
+            query="""
+                INSERT INTO comments (body, todo_id, comment_owner, created_at, updated_at)
+                VALUES ('old comment', :todo_id, :comment_owner, :created_at, :created_at)
+                RETURNING id;
+            """,
+            values={
+                "todo_id": test_todo.id,
+                "comment_owner": test_user.id,
+                "created_at": datetime.datetime(old_month.year, old_month.month, 15, tzinfo=datetime.timezone.utc),
+            },
+        )
+        old_comment_id = old_comment["id"]
+        assert partition in await manager.archive_partitions(db, today=today)
+        assert partition not in await manager.list_partitions(db)
+
+        res = await authorized_client.get(app.url_path_for("comments:list-archived-comments"))
+        assert res.status_code == status.HTTP_200_OK
+        assert old_comment_id in [comment["id"] for comment in res.json()]
+        assert test_comment.id not in [comment["id"] for comment in res.json()]
+        res = await authorized_client.get(app.url_path_for("users:get-user-comments"))
+        assert old_comment_id not in [comment["id"] for comment in res.json()]
+
+    async def test_upcoming_partitions_are_created(self, client: AsyncClient, db: Database) -> None:
+        """Test the current month and the months ahead always have a partition."""
+        today = datetime.date.today()
+        manager = CommentPartitionManager(months_ahead=2)
+        names = await manager.ensure_partitions(db, today=today)
+        assert names == [f"comments_p{add_months(today, months).strftime('%Y_%m')}" for months in range(3)]
+        assert set(names).issubset(await manager.list_partitions(db))
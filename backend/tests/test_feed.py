@@ -1,13 +1,38 @@
 """Testing Feed Enpoint."""
 
+import asyncio
 import datetime
-from typing import Counter, List
+import json
+from typing import Any, Callable, Counter, Dict, Iterator, List, Optional
 
 import pytest
+from app.api.dependencies.pagination import decode_cursor
+from app.db.repositories.feed import (
+    FEED_AFTER_CURSOR,
+    FEED_EXCLUDE_OWNER,
+    FEED_SINCE_CURSOR,
+    FETCH_RANKED_TODO_JOBS_FOR_FEED_QUERY,
+    FETCH_TODO_FEED_CHANGES_QUERY,
+    FETCH_TODO_JOBS_FOR_FEED_QUERY,
+    PRIORITY_URGENCY_LEAD_DAYS,
+    RANKED_FEED_AFTER_CURSOR,
+    RANKED_FEED_FILTERS,
+    FeedRepository,
+    feed_filters,
+    urgency_score,
+)
+from app.db.repositories.todo_events import TodoEventsRepository
+from app.db.repositories.todos import TodosRepository
 from app.models.feed import TodoFeedItem
-from app.models.todo import TodoInDB
+from app.models.todo import PriorityType, TodoCreate, TodoInDB, TodoUpdate
+from app.models.user import UserInDB
+from app.services import feed_page_cache, task_feed
+from app.services.feed import FeedPageCache
+from app.services.feed_stream import FeedStream, FeedSubscriber, feed_stream
+from databases import Database
 from fastapi import FastAPI, status
 from httpx import AsyncClient
+from redis.client import Redis
 
 pytestmark = pytest.mark.asyncio
 
@@ -143,3 +168,614 @@ class TestTodoFeed:
         # should have duplicate IDs for 13 update events an `is_create` event and an `is_update` event
         id_counts = Counter(ids_page_1 + ids_page_2)
         assert len([id for id, cnt in id_counts.items() if cnt > 1]) == 13
+
+    async def test_todo_feed_has_an_event_per_update(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user_list: List[UserInDB],
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Every update of a task is in the feed, not just the last one."""
+        todo = test_list_of_new_and_updated_todos[1]
+        todos_repo = TodosRepository(db, r_db)
+        for notes in ("first", "second"):
+            await todos_repo.update_todos_by_id(
+                todo_id=todo.id, todo_update=TodoUpdate(notes=notes), requesting_user=test_user_list[1]
+            )
+        res = await authorized_client.get(
+            app.url_path_for("feed:get-todo-feed-for-user"), params={"page_chunk_size": 3}
+        )
+        assert [(item["id"], item["event_type"]) for item in res.json()[:2]] == [(todo.id, "is_update")] * 2
+
+
+def plan_nodes(plan: Dict) -> Iterator[Dict]:
+    """Every node of an EXPLAIN (FORMAT JSON) plan."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+class TestTodoFeedCursor:
+    """Testing cursor pagination of the todo feed."""
+
+    async def walk_feed(
+        self, *, app: FastAPI, client: AsyncClient, page_chunk_size: int, max_pages: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """Follow X-Next-Cursor from the first page to the last, or to max_pages."""
+        pages, params = [], {"page_chunk_size": page_chunk_size}
+        while max_pages is None or len(pages) < max_pages:
+            res = await client.get(app.url_path_for("feed:get-todo-feed-for-user"), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            pages.append(res.json())
+            if "x-next-cursor" not in res.headers:
+                return pages
+            params = {"page_chunk_size": page_chunk_size, "cursor": res.headers["x-next-cursor"]}
+        return pages
+
+    async def test_cursor_pages_cover_the_feed_once_in_order(
+        self,
+        *,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Every event is on exactly one page, newest first."""
+        pages = await self.walk_feed(app=app, client=authorized_client, page_chunk_size=7)
+        items = [item for page in pages for item in page]
+        keys = [(datetime.datetime.fromisoformat(item["event_timestamp"]), item["event_id"]) for item in items]
+        assert len(set(keys)) == len(keys)
+        assert keys == sorted(keys, reverse=True)
+        todo_ids = [todo.id for todo in test_list_of_new_and_updated_todos]
+        fixture_events = [(item["id"], item["event_type"]) for item in items if item["id"] in todo_ids]
+        assert len(fixture_events) == len(todo_ids) + len(todo_ids[::4])
+        assert set(fixture_events) == {
+            *((todo.id, "is_create") for todo in test_list_of_new_and_updated_todos),
+            *((todo.id, "is_update") for todo in test_list_of_new_and_updated_todos[::4]),
+        }
+
+    async def test_cursor_pages_through_events_with_the_same_timestamp(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user2: UserInDB,
+    ) -> None:
+        """Todos created in one transaction share created_at, pages split them without duplicates or gaps."""
+        results = await TodosRepository(db, r_db).bulk_create_todos(
+            new_todos=[
+                TodoCreate(name=f"bulk task {i}", priority="normal", duedate=datetime.date.today(), as_task=True)
+                for i in range(5)
+            ],
+            requesting_user=test_user2,
+        )
+        bulk_ids = sorted((result.id for result in results), reverse=True)
+        pages = await self.walk_feed(app=app, client=authorized_client, page_chunk_size=2, max_pages=3)
+        feed_ids = [item["id"] for page in pages for item in page]
+        assert feed_ids[:5] == bulk_ids
+
+    async def test_invalid_cursor_is_rejected(self, *, app: FastAPI, authorized_client: AsyncClient) -> None:
+        """A cursor that wasn't made by the api is a bad request."""
+        res = await authorized_client.get(app.url_path_for("feed:get-todo-feed-for-user"), params={"cursor": "nope"})
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_feed_page_is_one_backward_index_scan(
+        self, *, db: Database, test_user: UserInDB, test_list_of_new_and_updated_todos: List[TodoInDB]
+    ) -> None:
+        """A cursor page is read in order from the todo_events partial index, with no sort.
+
+        The test tables are small enough for a seq scan to win, so seq and bitmap scans are turned off to check the
+        index can serve the query at all.
+        """
+        async with db.transaction():
+            await db.execute(query="SET LOCAL enable_seqscan = off;")
+            await db.execute(query="SET LOCAL enable_bitmapscan = off;")
+            query = FETCH_TODO_JOBS_FOR_FEED_QUERY.format(after=FEED_AFTER_CURSOR, owner=FEED_EXCLUDE_OWNER, filters="")
+            plan = await db.fetch_one(
+                query="EXPLAIN (FORMAT JSON) " + query,
+                values={
+                    "page_chunk_size": 20,
+                    "starting_date": datetime.datetime.now(datetime.timezone.utc),
+                    "id": 0,
+                    "owner": test_user.id,
+                },
+            )
+        nodes = list(plan_nodes(json.loads(plan["QUERY PLAN"])[0]["Plan"]))
+        index_scans = {
+            node["Index Name"]: node["Scan Direction"] for node in nodes if node["Node Type"] == "Index Scan"
+        }
+        assert index_scans["ix_todo_events_as_task_event_timestamp_id"] == "Backward"
+        assert not [node for node in nodes if node["Node Type"] == "Sort"]
+
+
+class TestFilteredTodoFeed:
+    """Testing the todo feed filtered by priority and duedate, and ranked by urgency."""
+
+    async def create_tasks(self, *, db: Database, r_db: Redis, user: UserInDB, tasks: List[tuple]) -> List[int]:
+        """Create tasks from (priority, days until due) pairs, returning their ids."""
+        today = datetime.date.today()
+        results = await TodosRepository(db, r_db).bulk_create_todos(
+            new_todos=[
+                TodoCreate(
+                    name=f"{priority} task",
+                    priority=priority,
+                    duedate=today + datetime.timedelta(days=days),
+                    as_task=True,
+                )
+                for priority, days in tasks
+            ],
+            requesting_user=user,
+        )
+        return [result.id for result in results]
+
+    async def get_feed(self, *, app: FastAPI, client: AsyncClient, **params: Any) -> List[List[Dict]]:
+        """Every page of the feed, following X-Next-Cursor."""
+        pages = []
+        while True:
+            res = await client.get(app.url_path_for("feed:get-todo-feed-for-user"), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            pages.append(res.json())
+            if "x-next-cursor" not in res.headers:
+                return pages
+            params = {**params, "cursor": res.headers["x-next-cursor"]}
+
+    async def test_feed_is_filtered_by_priority_and_duedate(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user2: UserInDB,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Only events of tasks matching every filter, as they were written and as they are now, are in the feed."""
+        ids = await self.create_tasks(
+            db=db, r_db=r_db, user=test_user2, tasks=[("high", 3), ("high", 30), ("normal", 3)]
+        )
+        pages = await self.get_feed(app=app, client=authorized_client, priority="high", page_chunk_size=50)
+        items = [item for page in pages for item in page]
+        assert {item["priority"] for item in items} == {"high"}
+        fixture_ids = {todo.id for todo in test_list_of_new_and_updated_todos}
+        # fixture todos were created critical and updated to high, so only their update is in the feed.
+        assert {(item["id"], item["event_type"]) for item in items if item["id"] in fixture_ids} == {
+            (todo.id, "is_update") for todo in test_list_of_new_and_updated_todos[::4]
+        }
+        assert {ids[0], ids[1]} <= {item["id"] for item in items}
+
+        today = datetime.date.today()
+        pages = await self.get_feed(
+            app=app,
+            client=authorized_client,
+            duedate_from=today + datetime.timedelta(days=1),
+            duedate_to=today + datetime.timedelta(days=7),
+            page_chunk_size=50,
+        )
+        items = [item for page in pages for item in page]
+        assert {ids[0], ids[2]} <= {item["id"] for item in items}
+        assert ids[1] not in [item["id"] for item in items]
+        for item in items:
+            assert today < datetime.date.fromisoformat(item["duedate"]) <= today + datetime.timedelta(days=7)
+
+    async def test_feed_is_ranked_by_urgency(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user2: UserInDB,
+    ) -> None:
+        """Sooner duedates and higher priorities come first, paged by (urgency_score, id) cursors."""
+        ids = await self.create_tasks(
+            db=db,
+            r_db=r_db,
+            user=test_user2,
+            tasks=[("critical", 220), ("normal", 203), ("high", 208), ("standard", 205), ("high", 208)],
+        )
+        today = datetime.date.today()
+        pages = await self.get_feed(
+            app=app,
+            client=authorized_client,
+            order_by="urgency",
+            duedate_from=today + datetime.timedelta(days=200),
+            duedate_to=today + datetime.timedelta(days=230),
+            page_chunk_size=2,
+        )
+        items = [item for page in pages for item in page if item["id"] in ids]
+        # urgency is the duedate less 14, 7, 3 and 0 days of lead for critical, high, standard and normal.
+        assert [item["id"] for item in items] == [ids[2], ids[4], ids[3], ids[1], ids[0]]
+        assert [item["urgency_score"] for item in items] == [
+            urgency_score(
+                datetime.date.fromisoformat(item["duedate"]), PRIORITY_URGENCY_LEAD_DAYS[PriorityType(item["priority"])]
+            )
+            for item in items
+        ]
+
+    async def test_urgency_score_follows_writes(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user2: UserInDB,
+    ) -> None:
+        """Changing the priority or duedate of a task moves it in the ranked feed."""
+        ids = await self.create_tasks(db=db, r_db=r_db, user=test_user2, tasks=[("normal", 300), ("normal", 301)])
+        await TodosRepository(db, r_db).update_todos_by_id(
+            todo_id=ids[1], todo_update=TodoUpdate(priority="critical"), requesting_user=test_user2
+        )
+        today = datetime.date.today()
+        pages = await self.get_feed(
+            app=app,
+            client=authorized_client,
+            order_by="urgency",
+            duedate_from=today + datetime.timedelta(days=300),
+            duedate_to=today + datetime.timedelta(days=301),
+        )
+        ranked = [(item["id"], item["urgency_score"]) for page in pages for item in page if item["id"] in ids]
+        assert ranked == [
+            (ids[1], urgency_score(today + datetime.timedelta(days=301), 14)),
+            (ids[0], urgency_score(today + datetime.timedelta(days=300), 0)),
+        ]
+
+    async def test_ranked_feed_filtered_by_priority_is_one_index_scan(
+        self, *, db: Database, test_user: UserInDB
+    ) -> None:
+        """A ranked page filtered by priority and duedate is a bounded range of the priority urgency index."""
+        filters, values = feed_filters(
+            RANKED_FEED_FILTERS,
+            priority="high",
+            duedate_from=datetime.date.today(),
+            duedate_to=datetime.date.today() + datetime.timedelta(days=7),
+        )
+        async with db.transaction():
+            await db.execute(query="SET LOCAL enable_seqscan = off;")
+            await db.execute(query="SET LOCAL enable_bitmapscan = off;")
+            plan = await db.fetch_one(
+                query="EXPLAIN (FORMAT JSON) "
+                + FETCH_RANKED_TODO_JOBS_FOR_FEED_QUERY.format(after=RANKED_FEED_AFTER_CURSOR, filters=filters),
+                values={
+                    **values,
+                    "urgency_from": 0,
+                    "urgency_to": 100000,
+                    "urgency_score": 0,
+                    "id": 0,
+                    "owner": test_user.id,
+                    "page_chunk_size": 20,
+                },
+            )
+        nodes = list(plan_nodes(json.loads(plan["QUERY PLAN"])[0]["Plan"]))
+        index_scans = [node["Index Name"] for node in nodes if node["Node Type"] == "Index Scan"]
+        assert index_scans == ["ix_todos_as_task_priority_urgency_score_id"]
+        assert not [node for node in nodes if node["Node Type"] == "Sort"]
+
+
+class TestTodoFeedPageCache:
+    """Testing the first page of the todo feed served from the shared cache."""
+
+    async def test_first_page_is_cut_from_the_shared_cache(
+        self,
+        *,
+        app: FastAPI,
+        create_authorized_client: Callable,
+        test_user_list: List[UserInDB],
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Each user's first page is the uncached page: the cached items without their own todos."""
+        for user in test_user_list[:2]:
+            client = create_authorized_client(user=user)
+            res = await client.get(app.url_path_for("feed:get-todo-feed-for-user"))
+            assert res.status_code == status.HTTP_200_OK
+            uncached = await client.get(
+                app.url_path_for("feed:get-todo-feed-for-user"),
+                params={"starting_date": datetime.datetime.now() + datetime.timedelta(minutes=10)},
+            )
+            assert res.json() == uncached.json()
+            assert len(res.json()) == 20
+            assert user.id not in [item["owner"]["id"] for item in res.json()]
+            assert [item["row_number"] for item in res.json()] == list(range(1, 21))
+
+    async def test_first_page_is_cached_until_the_ttl_runs_out(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user2: UserInDB,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """New tasks show up on the first page once the cached items are refreshed."""
+        res = await authorized_client.get(app.url_path_for("feed:get-todo-feed-for-user"))
+        new_todo = await TodosRepository(db, r_db).create_todo(
+            new_todo=TodoCreate(name="new task", priority="high", duedate=datetime.date.today(), as_task=True),
+            requesting_user=test_user2,
+        )
+        cached = await authorized_client.get(app.url_path_for("feed:get-todo-feed-for-user"))
+        assert cached.json() == res.json()
+        # the entry went stale.
+        await r_db.hset(feed_page_cache.key, "built_at", 0)
+        refreshed = await authorized_client.get(app.url_path_for("feed:get-todo-feed-for-user"))
+        assert refreshed.json()[0]["id"] == new_todo.id
+
+    async def test_concurrent_misses_share_one_build(
+        self, *, db: Database, r_db: Redis, test_list_of_new_and_updated_todos: List[TodoInDB]
+    ) -> None:
+        """Requests of a worker finding no cached items wait for a single build."""
+        builds = []
+
+        async def build(page_chunk_size: int) -> List[TodoFeedItem]:
+            builds.append(page_chunk_size)
+            await asyncio.sleep(0.1)
+            return await FeedRepository(db, r_db).fetch_latest_todo_jobs(page_chunk_size)
+
+        pages = await asyncio.gather(*[feed_page_cache.get(r_db, build=build) for _ in range(10)])
+        assert builds == [feed_page_cache.max_items]
+        assert 0 < len(pages[0]) <= feed_page_cache.max_items
+        assert all(page == pages[0] for page in pages)
+
+    async def test_stale_items_are_served_while_another_worker_refreshes(
+        self, *, db: Database, r_db: Redis, test_list_of_new_and_updated_todos: List[TodoInDB]
+    ) -> None:
+        """Without the refresh lock, a worker serves the stale items rather than querying the feed too."""
+        repo = FeedRepository(db, r_db)
+        items = await feed_page_cache.get(r_db, build=repo.fetch_latest_todo_jobs)
+        await r_db.hset(feed_page_cache.key, "built_at", 0)
+        await r_db.set(feed_page_cache.lock_key, "another worker")
+
+        async def build(page_chunk_size: int) -> List[TodoFeedItem]:
+            raise AssertionError("only the lock holder builds the cached items")
+
+        assert await FeedPageCache().get(r_db, build=build) == items
+
+
+class TestRedisTodoFeed:
+    """Testing the todo feed served from redis."""
+
+    async def get_feed_pages(self, *, app: FastAPI, client: AsyncClient, pages: int = 2) -> List[List[tuple]]:
+        """Walk the first pages of the feed, as (id, event_type, event_timestamp)."""
+        starting_date = datetime.datetime.now() + datetime.timedelta(minutes=10)
+        feed_pages = []
+        for _ in range(pages):
+            res = await client.get(
+                app.url_path_for("feed:get-todo-feed-for-user"),
+                params={"starting_date": starting_date, "page_chunk_size": 20},
+            )
+            assert res.status_code == status.HTTP_200_OK
+            page = [(item["id"], item["event_type"], item["event_timestamp"]) for item in res.json()]
+            feed_pages.append(page)
+            starting_date = res.json()[-1]["event_timestamp"]
+        return feed_pages
+
+    async def test_redis_feed_matches_postgres_feed(
+        self,
+        *,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        redis_task_feed: None,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Events written as todos change are paged like the postgres feed."""
+        redis_pages = await self.get_feed_pages(app=app, client=authorized_client)
+        task_feed.enabled = False
+        postgres_pages = await self.get_feed_pages(app=app, client=authorized_client)
+        assert redis_pages == postgres_pages
+        assert len(redis_pages[0]) == 20
+        assert [event_type for _, event_type, _ in redis_pages[0][:13]] == ["is_update"] * 13
+
+    async def test_redis_feed_skips_own_and_deleted_todos(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+        redis_task_feed: None,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Todos of the requesting user are skipped, deleted todos are removed from the feed."""
+        todos_repo = TodosRepository(db, r_db)
+        own_todo = await todos_repo.create_todo(
+            new_todo=TodoCreate(
+                name="own task", notes="notes", priority="high", duedate=datetime.date.today(), as_task=True
+            ),
+            requesting_user=test_user,
+        )
+        deleted_todo = test_list_of_new_and_updated_todos[-1]
+        await todos_repo.delete_todo_by_id(todo=deleted_todo)
+        [page] = await self.get_feed_pages(app=app, client=authorized_client, pages=1)
+        ids = [todo_id for todo_id, _, _ in page]
+        assert len(page) == 20
+        assert own_todo.id not in ids
+        assert deleted_todo.id not in ids
+
+    async def test_feed_falls_back_to_postgres_until_rebuilt(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+        redis_task_feed: None,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Without the set, pages are read from postgres. A rebuild brings the same events back."""
+        before = datetime.datetime.now() + datetime.timedelta(minutes=10)
+        events = await task_feed.page(r_db, exclude_owner=test_user.id, before=before, page_chunk_size=20)
+        assert len(events) == 20
+
+        await task_feed.clear(r_db)
+        assert await task_feed.page(r_db, exclude_owner=test_user.id, before=before, page_chunk_size=20) is None
+        [page] = await self.get_feed_pages(app=app, client=authorized_client, pages=1)
+        assert [todo_id for todo_id, _, _ in page] == [event.todo_id for event in events]
+
+        assert await FeedRepository(db, r_db).rebuild_task_feed() >= len(test_list_of_new_and_updated_todos)
+        assert await task_feed.page(r_db, exclude_owner=test_user.id, before=before, page_chunk_size=20) == events
+
+
+class TestTodoFeedChanges:
+    """Testing the probe for feed items newer than a cursor."""
+
+    async def probe(self, *, app: FastAPI, client: AsyncClient, since: Optional[str]) -> Dict:
+        """Count of the feed items newer than since, and the newest cursor."""
+        res = await client.get(app.url_path_for("feed:get-todo-feed-changes-for-user"), params={"since": since})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["x-feed-changes"] == str(res.json()["count"])
+        return res.json()
+
+    async def test_changes_count_new_tasks_of_other_users(
+        self,
+        *,
+        app: FastAPI,
+        db: Database,
+        r_db: Redis,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+        test_user2: UserInDB,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Nothing changed since the first page until other users write tasks."""
+        res = await authorized_client.get(app.url_path_for("feed:get-todo-feed-for-user"))
+        since = res.headers["x-newest-cursor"]
+        assert decode_cursor(since, datetime.datetime, int, str)[1] == res.json()[0]["event_id"]
+        assert await self.probe(app=app, client=authorized_client, since=since) == {"count": 0, "newest_cursor": since}
+
+        todos_repo = TodosRepository(db, r_db)
+        new_todo = TodoCreate(name="new task", priority="high", duedate=datetime.date.today(), as_task=True)
+        await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user2)
+        newest = await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user2)
+        await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user)
+        changes = await self.probe(app=app, client=authorized_client, since=since)
+        assert changes["count"] == 2
+        newest_event = decode_cursor(changes["newest_cursor"], datetime.datetime, int, str)
+        [event] = await TodoEventsRepository(db, r_db).get_latest_todo_events(todo_ids=[newest.id])
+        assert newest_event == (event.event_timestamp, event.id, "is_create")
+        assert (await self.probe(app=app, client=authorized_client, since=changes["newest_cursor"]))["count"] == 0
+
+    async def test_changes_can_be_probed_with_head(
+        self, *, app: FastAPI, authorized_client: AsyncClient, test_list_of_new_and_updated_todos: List[TodoInDB]
+    ) -> None:
+        """HEAD answers with the count and newest cursor headers only."""
+        res = await authorized_client.head(app.url_path_for("feed:get-todo-feed-changes-for-user"))
+        assert res.status_code == status.HTTP_200_OK
+        assert int(res.headers["x-feed-changes"]) > 0
+        assert "x-newest-cursor" in res.headers
+
+    async def test_changes_count_is_capped_and_matches_the_redis_feed(
+        self,
+        *,
+        db: Database,
+        r_db: Redis,
+        test_user: UserInDB,
+        redis_task_feed: None,
+        test_list_of_new_and_updated_todos: List[TodoInDB],
+    ) -> None:
+        """Counting stops at the limit, and the redis feed counts like postgres."""
+        feed_repo = FeedRepository(db, r_db)
+        before = datetime.datetime.now() + datetime.timedelta(minutes=10)
+        events = await task_feed.page(r_db, exclude_owner=test_user.id, before=before, page_chunk_size=10)
+        since = (events[-1].event_timestamp, events[-1].id, events[-1].event_type)
+        newest = (events[0].event_timestamp, events[0].id, events[0].event_type)
+        redis_changes = [
+            await feed_repo.fetch_todo_jobs_feed_changes(requesting_user=test_user, since=since, limit=limit)
+            for limit in (5, 50)
+        ]
+        task_feed.enabled = False
+        postgres_changes = [
+            await feed_repo.fetch_todo_jobs_feed_changes(requesting_user=test_user, since=since, limit=limit)
+            for limit in (5, 50)
+        ]
+        assert redis_changes == postgres_changes == [(5, newest), (9, newest)]
+
+    async def test_changes_are_an_index_only_scan(self, *, db: Database, test_user: UserInDB) -> None:
+        """Probing reads the feed index alone, no todos and no heap of todo_events."""
+        async with db.transaction():
+            await db.execute(query="SET LOCAL enable_seqscan = off;")
+            await db.execute(query="SET LOCAL enable_bitmapscan = off;")
+            plan = await db.fetch_one(
+                query="EXPLAIN (FORMAT JSON) " + FETCH_TODO_FEED_CHANGES_QUERY.format(since=FEED_SINCE_CURSOR),
+                values={
+                    "limit": 100,
+                    "owner": test_user.id,
+                    "since_timestamp": datetime.datetime.now(datetime.timezone.utc),
+                    "since_id": 0,
+                },
+            )
+        nodes = list(plan_nodes(json.loads(plan["QUERY PLAN"])[0]["Plan"]))
+        assert [node["Node Type"] for node in nodes] == ["Limit", "Index Only Scan"]
+        assert nodes[1]["Index Name"] == "ix_todo_events_as_task_event_timestamp_id"
+
+
+class TestTodoFeedStream:
+    """Testing task events pushed to feed stream subscribers."""
+
+    async def next_item(self, subscriber: FeedSubscriber) -> Dict:
+        """Next item queued for a subscriber."""
+        return json.loads(await asyncio.wait_for(subscriber.queue.get(), timeout=5))
+
+    async def test_stream_requires_authentication(self, *, app: FastAPI, client: AsyncClient) -> None:
+        """Only authenticated users can stream the feed."""
+        res = await client.get(app.url_path_for("feed:stream-todo-feed-for-user"))
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_stream_is_unavailable_when_not_running(
+        self, *, app: FastAPI, authorized_client: AsyncClient
+    ) -> None:
+        """Workers that don't run the stream turn subscribers away."""
+        res = await authorized_client.get(app.url_path_for("feed:stream-todo-feed-for-user"))
+        assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    async def test_new_and_updated_tasks_are_pushed_to_other_users(
+        self,
+        *,
+        db: Database,
+        r_db: Redis,
+        test_user: UserInDB,
+        test_user2: UserInDB,
+        running_feed_stream: None,
+    ) -> None:
+        """Subscribers get tasks of other users as they are written, but not their own tasks or todos that aren't."""
+        subscriber = feed_stream.subscribe(user_id=test_user.id)
+        subscriber2 = feed_stream.subscribe(user_id=test_user2.id)
+        todos_repo = TodosRepository(db, r_db)
+        new_todo = TodoCreate(name="streamed", priority="high", duedate=datetime.date.today(), as_task=True)
+        task = await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user2)
+        await todos_repo.create_todo(new_todo=new_todo.copy(update={"as_task": False}), requesting_user=test_user2)
+        await todos_repo.update_todos_by_id(
+            todo_id=task.id, todo_update=TodoUpdate(notes="updated"), requesting_user=test_user2
+        )
+        own_task = await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user)
+
+        created, updated = await self.next_item(subscriber), await self.next_item(subscriber)
+        assert (created["id"], created["event_type"]) == (task.id, "is_create")
+        assert (updated["id"], updated["event_type"], updated["notes"]) == (task.id, "is_update", "updated")
+        assert updated["owner"]["id"] == test_user2.id
+        assert (await self.next_item(subscriber2))["id"] == own_task.id
+        assert subscriber.queue.empty() and subscriber2.queue.empty()
+
+    async def test_lagging_subscribers_are_dropped(self) -> None:
+        """A subscriber whose buffer is full is dropped without holding up the others."""
+        stream = FeedStream(buffer_size=2)
+        slow, fast = stream.subscribe(user_id=1), stream.subscribe(user_id=2)
+        for todo_id in range(3):
+            stream.fan_out(json.dumps([{"id": todo_id, "owner": {"id": 3}}]))
+            await fast.queue.get()
+        assert slow.lagged and not fast.lagged
+        assert stream.subscribers == {fast}
+        assert stream.dropped == 1
+
+    async def test_subscribers_are_capped(self) -> None:
+        """A worker turns subscribers away once it holds max_subscribers."""
+        stream = FeedStream(max_subscribers=2)
+        assert stream.subscribe(user_id=1) is not None
+        assert stream.subscribe(user_id=2) is not None
+        assert stream.subscribe(user_id=3) is None
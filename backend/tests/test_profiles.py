@@ -123,6 +123,27 @@ class TestProfileManagement:
         profile = ProfilePublic(**res.json())
         assert getattr(profile, attr) == value
 
+    async def test_if_match_rejects_stale_updates(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        """Test a profile update sent with an outdated ETag fails with 412."""
+        res = await authorized_client.get(
+            app.url_path_for("profiles:get-profile-by-username", username=test_user.username)
+        )
+        etag = res.headers["etag"]
+        res = await authorized_client.put(
+            app.url_path_for("profiles:update-own-profile"),
+            json={"profile_update": {"bio": "first writer"}},
+            headers={"If-Match": etag},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.put(
+            app.url_path_for("profiles:update-own-profile"),
+            json={"profile_update": {"bio": "second writer"}},
+            headers={"If-Match": etag},
+        )
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+
     @pytest.mark.parametrize(
         "attr, value, status_code",
         (
@@ -1,15 +1,17 @@
 """Test for assigning todo."""
 
 import random
-from typing import Callable, List
+from typing import Callable, Dict, List
 
 import pytest
 from app.db.repositories.tasks import TasksRepository
-from app.models.task import TaskInDB, TaskPublic
+from app.models.task import TaskInDB, TaskOfferStats, TaskPublic
 from app.models.todo import TodoInDB
 from app.models.user import UserInDB
+from databases import Database
 from fastapi import FastAPI, status
 from httpx import AsyncClient
+from redis.client import Redis
 
 pytestmark = pytest.mark.asyncio
 
@@ -443,3 +445,102 @@ class TestRescindTasks:
             app.url_path_for("assigns:rescind-task-from-user", todo_id=test_todo_with_accepted_task_offer.id)
         )
         assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestListOffers:
+    """Test listing and counting the offers for a task."""
+
+    async def get_offers(
+        self, *, app: FastAPI, client: AsyncClient, todo: TodoInDB, page_chunk_size: int, **params: str
+    ) -> List[Dict]:
+        """Follow X-Next-Cursor through every page of offers."""
+        offers, params = [], {"page_chunk_size": page_chunk_size, **params}
+        while True:
+            res = await client.get(app.url_path_for("assigns:list-offers-for-task", todo_id=todo.id), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            assert len(res.json()) <= page_chunk_size
+            offers.extend(res.json())
+            if "X-Next-Cursor" not in res.headers:
+                return offers
+            params["cursor"] = res.headers["X-Next-Cursor"]
+
+    async def test_offers_are_listed_with_their_users_in_one_query(
+        self,
+        db: Database,
+        r_db: Redis,
+        test_user_list: List[UserInDB],
+        test_todo_with_tasks: TodoInDB,
+    ) -> None:
+        """Offers come with their users and profiles from the listing query, not from loading users."""
+        tasks_repo = TasksRepository(db, r_db)
+        loader = tasks_repo.users_repo.user_loader
+        offers = await tasks_repo.list_offers_for_task(todo=test_todo_with_tasks)
+        assert loader.batches == 0
+        assert [offer.user_id for offer in offers] == [user.id for user in test_user_list]
+        for offer in offers:
+            assert isinstance(offer, TaskPublic)
+            assert offer.user.id == offer.user_id
+            assert offer.user.profile.user_id == offer.user_id
+
+    async def test_offers_are_paged_and_filtered_by_status(
+        self,
+        app: FastAPI,
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_user3: UserInDB,
+        test_user_list: List[UserInDB],
+        test_todo_with_accepted_task_offer: TodoInDB,
+    ) -> None:
+        """Pages of offers follow each other in creation order, and only hold the status asked for."""
+        authorized_client = create_authorized_client(user=test_user2)
+        offers = await self.get_offers(
+            app=app, client=authorized_client, todo=test_todo_with_accepted_task_offer, page_chunk_size=1
+        )
+        assert [offer["user_id"] for offer in offers] == [user.id for user in test_user_list]
+        assert all(offer["user"]["username"] for offer in offers)
+
+        rejected = await self.get_offers(
+            app=app,
+            client=authorized_client,
+            todo=test_todo_with_accepted_task_offer,
+            page_chunk_size=2,
+            status="rejected",
+        )
+        assert [offer["user_id"] for offer in rejected] == [
+            user.id for user in test_user_list if user.id != test_user3.id
+        ]
+        assert {offer["status"] for offer in rejected} == {"rejected"}
+
+    async def test_todo_owner_gets_offer_counts_by_status(
+        self,
+        app: FastAPI,
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_user_list: List[UserInDB],
+        test_todo_with_accepted_task_offer: TodoInDB,
+    ) -> None:
+        """Counts of the offers by status."""
+        authorized_client = create_authorized_client(user=test_user2)
+        res = await authorized_client.get(
+            app.url_path_for("assigns:list-offers-for-task", todo_id=test_todo_with_accepted_task_offer.id),
+            params={"counts_only": True},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert TaskOfferStats(**res.json()) == TaskOfferStats(
+            total=len(test_user_list),
+            pending=0,
+            accepted=1,
+            rejected=len(test_user_list) - 1,
+            cancelled=0,
+            completed=0,
+        )
+
+    async def test_non_owners_forbidden_from_fetching_offer_counts(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo_with_tasks: TodoInDB
+    ) -> None:
+        """Only the todo owner may count its offers."""
+        res = await authorized_client.get(
+            app.url_path_for("assigns:list-offers-for-task", todo_id=test_todo_with_tasks.id),
+            params={"counts_only": True},
+        )
+        assert res.status_code == status.HTTP_403_FORBIDDEN
@@ -1,19 +1,40 @@
 """Testing Todo Enpoint."""
 
+import csv
 import datetime
-from typing import Dict, List, Optional, Union
+import io
+import json
+import random
+import string
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import pytest
-from app.models.todo import TodoCreate, TodoInDB, TodoPublic
+from app.db.repositories.tasks import TasksRepository
+from app.db.repositories.todos import TodosRepository
+from app.models.comment import CommentInDB
+from app.models.task import TaskCreate
+from app.models.todo import TodoCreate, TodoFileFormat, TodoInDB, TodoPublic
 from app.models.user import UserInDB
+from app.services import todo_cache
+from app.services.reminders import ReminderScheduler
+from app.services.todo_import import TodoImportReader, open_upload
+from app.services.todo_events import TodoEventsCompactor
+from app.services.todo_stats import TodoStatsReconciler
 from databases.core import Database
 from fastapi import FastAPI, status
 from fastapi.encoders import jsonable_encoder
-from httpx import AsyncClient
+from httpx import AsyncClient, Response
+from redis.client import Redis
 
 # decorate all test with @pytest.mark.asyncio
 pytestmark = pytest.mark.asyncio
 
+# largest id of the integer todos.id column, which the shared test database never hands out.
+MISSING_TODO_ID = 2_147_483_647
+
+EXPAND_OWNER = {"expand": "owner"}
+
 
 class TestTodosRoute:
     """Testing Routes."""
@@ -115,7 +136,7 @@ class TestGetTodo:
     @pytest.mark.parametrize(
         "id, status_code",
         (
-            (500, 404),
+            (MISSING_TODO_ID, 404),
             (-1, 422),
             (None, 422),
         ),
@@ -159,6 +180,188 @@ class TestGetTodo:
         assert all(todo not in todos for todo in test_todos_list)
 
 
+class TestListTodosPagination:
+    """Testing keyset pagination and filters of the todo listing."""
+
+    @pytest.mark.parametrize("order_by", ("duedate", "updated_at", "priority"))
+    async def test_pages_cover_all_todos_once(
+        self,
+        app: FastAPI,
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_todos_list: List[TodoInDB],
+        order_by: str,
+    ) -> None:
+        """Test following the cursors returns every todo exactly once."""
+        authorized_client = create_authorized_client(user=test_user2)
+        params = {"order_by": order_by, "page_chunk_size": 2}
+        seen_ids = []
+        for _ in range(100):
+            res = await authorized_client.get(app.url_path_for("todos:list-all-user-todos"), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            assert len(res.json()) <= 2
+            seen_ids += [todo["id"] for todo in res.json()]
+            if "x-next-cursor" not in res.headers:
+                break
+            params["cursor"] = res.headers["x-next-cursor"]
+        assert len(seen_ids) == len(set(seen_ids))
+        assert {todo.id for todo in test_todos_list}.issubset(set(seen_ids))
+
+    async def test_filters_limit_todos_returned(
+        self,
+        app: FastAPI,
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        """Test priority, as_task and duedate filters are applied."""
+        authorized_client = create_authorized_client(user=test_user2)
+        res = await authorized_client.get(
+            app.url_path_for("todos:list-all-user-todos"), params={"priority": "normal", "as_task": True}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert all(todo["priority"] == "normal" and todo["as_task"] is True for todo in res.json())
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        res = await authorized_client.get(
+            app.url_path_for("todos:list-all-user-todos"), params={"duedate_from": str(tomorrow)}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert all(todo.id not in [item["id"] for item in res.json()] for todo in test_todos_list)
+
+    async def test_priority_ordering_is_by_severity(
+        self, app: FastAPI, authorized_client: AsyncClient, db: Database, r_db: Redis, test_user: UserInDB
+    ) -> None:
+        """Test ordering by priority lists the most severe todos first, then by duedate."""
+        todos_repo = TodosRepository(db, r_db)
+        for priority in ("normal", "critical", "standard", "high"):
+            await todos_repo.create_todo(
+                new_todo=TodoCreate(name=f"{priority} todo", priority=priority, duedate=datetime.date.today()),
+                requesting_user=test_user,
+            )
+        res = await authorized_client.get(
+            app.url_path_for("todos:list-all-user-todos"), params={"order_by": "priority", "page_chunk_size": 500}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        severity = ["critical", "high", "standard", "normal"]
+        keys = [(severity.index(todo["priority"]), todo["duedate"], todo["id"]) for todo in res.json()]
+        assert keys == sorted(keys)
+
+    async def test_invalid_cursor_returns_error(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        """Test garbage cursors are rejected."""
+        res = await authorized_client.get(app.url_path_for("todos:list-all-user-todos"), params={"cursor": "nope"})
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestTodoFieldsets:
+    """Testing fields= and expand= on todo reads."""
+
+    async def test_owner_is_only_embedded_when_expanded(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todo: TodoInDB
+    ) -> None:
+        """Test the owner stays an id unless expand=owner is given."""
+        todo_url = app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id)
+        res = await authorized_client.get(todo_url)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["owner"] == test_user.id
+        res = await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["owner"]["username"] == test_user.username
+        res = await authorized_client.get(app.url_path_for("todos:list-all-user-todos"), params=EXPAND_OWNER)
+        assert res.status_code == status.HTTP_200_OK
+        assert all(todo["owner"]["id"] == test_user.id for todo in res.json())
+
+    async def test_fields_limit_returned_fields(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test only the selected fields and the id are returned."""
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id), params={"fields": "name,duedate"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json() == {"id": test_todo.id, "name": test_todo.name, "duedate": str(test_todo.duedate)}
+        res = await authorized_client.get(
+            app.url_path_for("todos:list-all-user-todos"), params={"fields": "name", "page_chunk_size": 1}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert all(set(todo) == {"id", "name"} for todo in res.json())
+        assert "x-next-cursor" in res.headers
+
+    @pytest.mark.parametrize("params", ({"fields": "name,secret"}, {"expand": "comments"}))
+    async def test_unknown_fields_return_error(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB, params: Dict[str, str]
+    ) -> None:
+        """Test unknown fields and relations are rejected."""
+        res = await authorized_client.get(
+            app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id), params=params
+        )
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestSearchTodos:
+    """Testing full-text search of todos."""
+
+    async def test_search_finds_matching_todos_with_highlights(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        db: Database,
+        r_db: Redis,
+        test_user: UserInDB,
+        test_user2: UserInDB,
+    ) -> None:
+        """Test search is scoped to the user's todos and highlights matches."""
+        # a word no other test writes, so the shared database holds no other match.
+        term = "zq" + "".join(random.choices(string.ascii_lowercase, k=12))
+        todos_repo = TodosRepository(db, r_db)
+        new_todo = TodoCreate(name="searched todo", notes=f"notes on {term}", duedate=datetime.date.today())
+        todo = await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user)
+        await todos_repo.create_todo(new_todo=new_todo, requesting_user=test_user2)
+        res = await authorized_client.get(app.url_path_for("todos:search-todos"), params={"q": term})
+        assert res.status_code == status.HTTP_200_OK
+        assert [result["id"] for result in res.json()] == [todo.id]
+        assert f"<mark>{term}</mark>" in res.json()[0]["notes_highlight"]
+        assert res.json()[0]["rank"] > 0
+
+    async def test_search_pages_are_ranked_and_disjoint(
+        self,
+        app: FastAPI,
+        create_authorized_client: Callable,
+        test_user2: UserInDB,
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        """Test following the cursors returns every hit once, best match first."""
+        authorized_client = create_authorized_client(user=test_user2)
+        params = {"q": "todo", "page_chunk_size": 2}
+        results = []
+        for _ in range(10):
+            res = await authorized_client.get(app.url_path_for("todos:search-todos"), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            results += res.json()
+            if "x-next-cursor" not in res.headers:
+                break
+            params["cursor"] = res.headers["x-next-cursor"]
+        ids = [result["id"] for result in results]
+        assert len(ids) == len(set(ids))
+        assert {todo.id for todo in test_todos_list}.issubset(set(ids))
+        ranks = [result["rank"] for result in results]
+        assert ranks == sorted(ranks, reverse=True)
+
+    async def test_marketplace_scope_only_returns_tasks(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_todos_list: List[TodoInDB],
+        test_todos_list_as_task: List[TodoInDB],
+    ) -> None:
+        """Test the marketplace scope searches todos offered as tasks."""
+        res = await authorized_client.get(
+            app.url_path_for("todos:search-todos"), params={"q": "todo", "scope": "marketplace"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert all(result["as_task"] is True for result in res.json())
+        assert {todo.id for todo in test_todos_list_as_task}.issubset({result["id"] for result in res.json()})
+
+
 class TestUpdateTodo:
     """Testing update todo endpoint."""
 
@@ -235,7 +438,7 @@ class TestUpdateTodo:
         (
             (-1, {"name": "test"}, 422),
             (0, {"name": "test2"}, 422),
-            (5000, {"name": "test3"}, 404),
+            (MISSING_TODO_ID, {"name": "test3"}, 404),
             (1, None, 422),
             (1, {"priority": "invalid priority type"}, 422),
             (1, {"priority": None}, 400),
@@ -254,6 +457,30 @@ class TestUpdateTodo:
         res = await authorized_client.put(app.url_path_for("todos:update-todo-by-id", todo_id=id), json=todo_update)
         assert res.status_code == status_code
 
+    async def test_if_match_rejects_stale_updates(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test an update sent with an outdated ETag fails with 412 and leaves the todo alone."""
+        todo_url = app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id)
+        res = await authorized_client.get(app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id))
+        etag = res.headers["etag"]
+        res = await authorized_client.put(
+            todo_url, json={"todo_update": {"notes": "first writer"}}, headers={"If-Match": etag}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["etag"] != etag
+        res = await authorized_client.put(
+            todo_url, json={"todo_update": {"notes": "second writer"}}, headers={"If-Match": etag}
+        )
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+        res = await authorized_client.get(app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id))
+        assert res.json()["notes"] == "first writer"
+        for if_match, status_code in (('W/"1"', 412), ("*", 200)):
+            res = await authorized_client.put(
+                todo_url, json={"todo_update": {"notes": "any writer"}}, headers={"If-Match": if_match}
+            )
+            assert res.status_code == status_code
+
 
 class TestDeleteTodo:
     """Testing delete todo endpoint."""
@@ -281,7 +508,7 @@ class TestDeleteTodo:
     @pytest.mark.parametrize(
         "id, status_code",
         (
-            (500, 404),
+            (MISSING_TODO_ID, 404),
             (0, 422),
             (-1, 422),
             (None, 422),
@@ -300,25 +527,443 @@ class TestDeleteTodo:
         assert res.status_code == status_code
 
 
-# class TestGetTodoTasks:
-#     """Testing get todotask endpoint."""
-
-#     async def test_can_get_all_task(
-#         self,
-#         app: FastAPI,
-#         authorized_client: AsyncClient,
-#         test_user: UserInDB,
-#         test_todo: TodoInDB,
-#         test_todos_list_as_task: List[TodoInDB],
-#     ) -> None:
-#         """User can get all todo's with that are offered as task."""
-#         res = await authorized_client.get(app.url_path_for("todo_task:list-all-tasks"))
-#         assert res.status_code == status.HTTP_200_OK
-#         assert isinstance(res.json(), list)
-#         assert len(res.json()) > 0
-#         todos = [TodoInDB(**todo) for todo in res.json()]
-#         assert test_todo not in todos
-#         for todo in todos:
-#             assert todo.owner != test_user.id
-#             assert todo.as_task is True
-#         assert all(todo in todos for todo in test_todos_list_as_task)
+class TestTodoCache:
+    """Testing populated todos are cached and never served stale."""
+
+    async def test_repeated_reads_hit_the_cache(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test the second read of a todo is served from the cache."""
+        todo_url = app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id)
+        res = await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        assert res.status_code == status.HTTP_200_OK
+        hits = todo_cache.hits
+        cached_res = await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        assert cached_res.status_code == status.HTTP_200_OK
+        assert todo_cache.hits == hits + 1
+        assert cached_res.json() == res.json()
+
+    async def test_todo_update_invalidates_cache(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test reads after an update return the updated todo."""
+        todo_url = app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id)
+        await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        res = await authorized_client.put(
+            app.url_path_for("todos:update-todo-by-id", todo_id=test_todo.id),
+            json={"todo_update": {"notes": "cached notes updated"}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        assert res.json()["notes"] == "cached notes updated"
+        await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=test_todo.id))
+        res = await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_profile_update_invalidates_embedded_owner(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test reads after the owner's profile changes embed the new profile."""
+        todo_url = app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id)
+        await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        res = await authorized_client.put(
+            app.url_path_for("profiles:update-own-profile"), json={"profile_update": {"bio": "cached bio updated"}}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(todo_url, params=EXPAND_OWNER)
+        assert res.json()["owner"]["profile"]["bio"] == "cached bio updated"
+
+
+class TestExportTodos:
+    """Testing streamed todo exports."""
+
+    async def test_ndjson_export_interleaves_comments(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB, test_comment: CommentInDB
+    ) -> None:
+        """Test each todo line is followed by the lines of its comments."""
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"), params={"comments": True})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in res.text.splitlines()]
+        keys = [(line["type"], line["data"].get("id")) for line in lines]
+        todo_index = keys.index(("todo", test_todo.id))
+        comment_index = keys.index(("comment", test_comment.id))
+        assert todo_index < comment_index
+        assert all(line["type"] == "comment" for line in lines[todo_index + 1:comment_index + 1])
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"))
+        assert all(json.loads(line)["type"] == "todo" for line in res.text.splitlines())
+
+    async def test_csv_export(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB, test_todo: TodoInDB
+    ) -> None:
+        """Test the csv export has a header and a row per todo of the user."""
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"), params={"format": "csv"})
+        assert res.status_code == status.HTTP_200_OK
+        rows = list(csv.DictReader(io.StringIO(res.text)))
+        assert str(test_todo.id) in [row["id"] for row in rows]
+        assert rows[0].keys() == {"id", "name", "notes", "priority", "duedate", "as_task", "created_at", "updated_at"}
+
+
+class TestImportTodos:
+    """Testing csv and ndjson todo imports."""
+
+    async def upload(
+        self, *, app: FastAPI, authorized_client: AsyncClient, file: Tuple, params: Optional[Dict[str, str]] = None
+    ) -> Response:
+        """Post a file to the import, without the json Content-Type the test client sends by default."""
+        headers = {key: value for key, value in authorized_client.headers.items() if key.lower() != "content-type"}
+        async with AsyncClient(app=app, base_url="http://testserver", headers=headers) as upload_client:
+            return await upload_client.post(app.url_path_for("todos:import-todos"), params=params, files={"file": file})
+
+    async def test_csv_import_reports_rejected_rows(
+        self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB
+    ) -> None:
+        """Test valid rows are imported in file order and invalid rows are reported by line."""
+        today = datetime.date.today()
+        content = (
+            "name,notes,priority,duedate,as_task\n"
+            f"imported todo 1,first,high,{today},false\n"
+            f"imported todo 2,,urgent,{today},false\n"
+            f"imported todo 3,,normal,{today},true\n"
+        )
+        res = await self.upload(app=app, authorized_client=authorized_client, file=("todos.csv", content, "text/csv"))
+        assert res.status_code == status.HTTP_201_CREATED
+        result = res.json()
+        assert result["imported"] == 2
+        assert result["rejected"] == 1
+        assert result["rejects"][0]["line"] == 3
+        assert result["rejects"][0]["errors"][0].startswith("priority")
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"), params={"format": "csv"})
+        names = [row["name"] for row in csv.DictReader(io.StringIO(res.text)) if row["name"].startswith("imported")]
+        assert names == ["imported todo 1", "imported todo 3"]
+
+    async def test_ndjson_import(self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB) -> None:
+        """Test ndjson files are imported, and broken json lines are rejected rather than failing the import."""
+        todo = {"name": "ndjson import", "notes": "notes", "priority": "normal", "duedate": str(datetime.date.today())}
+        content = f"{json.dumps(todo)}\n{{not json\n\n{json.dumps(todo)}\n"
+        res = await self.upload(
+            app=app,
+            authorized_client=authorized_client,
+            file=("todos.txt", content, "application/x-ndjson"),
+            params={"format": "ndjson"},
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        assert res.json()["imported"] == 2
+        assert [reject["line"] for reject in res.json()["rejects"]] == [2]
+
+    @pytest.mark.parametrize("max_size", [0, 1024 * 1024])
+    async def test_uploaded_files_are_read_as_text(self, max_size: int) -> None:
+        """Test uploads are decoded whether spooled in memory or rolled over to disk, on every supported python."""
+        today = datetime.date.today()
+        with tempfile.SpooledTemporaryFile(max_size=max_size) as upload:
+            upload.write(f'name,notes,priority,duedate\n"two\r\nlines",café,normal,{today}\n'.encode())
+            upload.seek(0)
+            reader = TodoImportReader(open_upload(upload), file_format=TodoFileFormat.csv)
+            records, rejects = reader.read_batch(10)
+        assert rejects == []
+        assert records == [(3, "two\r\nlines", "café", "normal", today, False)]
+
+    async def test_unknown_format_is_rejected(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        """Test files whose format can't be told from their name need an explicit format."""
+        res = await self.upload(
+            app=app, authorized_client=authorized_client, file=("todos.txt", "name\n", "text/plain")
+        )
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_files_that_arent_utf8_are_rejected(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        """Test a file that can't be decoded is a bad request, and nothing of it is imported."""
+        content = f"name,notes,duedate\nlatin1 import,caf\xe9,{datetime.date.today()}\n".encode("latin-1")
+        res = await self.upload(app=app, authorized_client=authorized_client, file=("todos.csv", content, "text/csv"))
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+        res = await authorized_client.get(app.url_path_for("todos:export-user-todos"), params={"format": "csv"})
+        assert "latin1 import" not in res.text
+
+
+class TestTodoStats:
+    """Testing the todo counters and the stats endpoint."""
+
+    async def test_stats_follow_writes(
+        self, app: FastAPI, create_authorized_client: Callable, test_user4: UserInDB
+    ) -> None:
+        """Test the counters move with creates, bulk creates, updates and deletes."""
+        authorized_client = create_authorized_client(user=test_user4)
+        stats_url = app.url_path_for("todos:get-todo-stats")
+        before = (await authorized_client.get(stats_url)).json()
+        yesterday = str(datetime.date.today() - datetime.timedelta(days=1))
+        new_todos = [
+            {"name": "stats todo", "priority": "critical", "duedate": yesterday, "as_task": True},
+            {"name": "stats todo", "priority": "normal", "duedate": str(datetime.date.today())},
+        ]
+        res = await authorized_client.post(app.url_path_for("todos:bulk-create-todos"), json={"new_todos": new_todos})
+        created_ids = [item["id"] for item in res.json()]
+        res = await authorized_client.get(stats_url)
+        assert res.status_code == status.HTTP_200_OK
+        stats = res.json()
+        assert stats["total"] == before["total"] + 2
+        assert stats["critical"] == before["critical"] + 1
+        assert stats["normal"] == before["normal"] + 1
+        assert stats["as_task"] == before["as_task"] + 1
+        assert stats["overdue"] == before["overdue"] + 1
+
+        await authorized_client.put(
+            app.url_path_for("todos:update-todo-by-id", todo_id=created_ids[1]),
+            json={"todo_update": {"priority": "high"}},
+        )
+        await authorized_client.delete(app.url_path_for("todos:delete-todo-by-id", todo_id=created_ids[0]))
+        stats = (await authorized_client.get(stats_url)).json()
+        assert stats["total"] == before["total"] + 1
+        assert stats["critical"] == before["critical"]
+        assert stats["high"] == before["high"] + 1
+        assert stats["normal"] == before["normal"]
+        assert stats["as_task"] == before["as_task"]
+
+    async def test_reconciliation_repairs_drift(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        db: Database,
+        r_db: Redis,
+        test_user: UserInDB,
+        test_todo: TodoInDB,
+    ) -> None:
+        """Test counters that drifted from the todos are recounted."""
+        stats_url = app.url_path_for("todos:get-todo-stats")
+        expected = (await authorized_client.get(stats_url)).json()
+        await db.execute(
+            query="UPDATE todo_stats SET total = total + 7 WHERE owner = :owner", values={"owner": test_user.id}
+        )
+        assert (await authorized_client.get(stats_url)).json()["total"] == expected["total"] + 7
+        metrics = await TodoStatsReconciler(batch_size=10).reconcile(db, r_db)
+        assert metrics["repaired"] >= 1
+        assert (await authorized_client.get(stats_url)).json() == expected
+        todos_repo = TodosRepository(db, r_db)
+        assert await todos_repo.reconcile_todo_stats(owner_from=test_user.id, owner_to=test_user.id) == []
+
+
+class TestTodoEvents:
+    """Testing the todo events log and the activity history endpoint."""
+
+    async def update_todo(self, app: FastAPI, client: AsyncClient, todo_id: int, **changes) -> None:
+        """Update a todo through the api."""
+        res = await client.put(
+            app.url_path_for("todos:update-todo-by-id", todo_id=todo_id),
+            json=jsonable_encoder({"todo_update": changes}),
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_every_write_is_logged(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test each update is an event holding what it changed, and updates changing nothing aren't logged."""
+        await self.update_todo(app, authorized_client, test_todo.id, name="first rename")
+        await self.update_todo(app, authorized_client, test_todo.id, name="first rename")
+        await self.update_todo(app, authorized_client, test_todo.id, priority="normal", as_task=True)
+        res = await authorized_client.get(app.url_path_for("todos:list-todo-events", todo_id=test_todo.id))
+        assert res.status_code == status.HTTP_200_OK
+        events = res.json()
+        assert [event["event_type"] for event in events] == ["is_update", "is_update", "is_create"]
+        assert [event["changes"] for event in events[:2]] == [
+            {"priority": "normal", "as_task": True},
+            {"name": "first rename"},
+        ]
+        assert events[2]["changes"]["name"] == test_todo.name
+        assert events[0]["as_task"] is True and events[1]["as_task"] is False
+
+    async def test_history_pages_with_cursor(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todo: TodoInDB
+    ) -> None:
+        """Test the history is walked a page at a time through X-Next-Cursor."""
+        for i in range(3):
+            await self.update_todo(app, authorized_client, test_todo.id, notes=f"notes {i}")
+        url = app.url_path_for("todos:list-todo-events", todo_id=test_todo.id)
+        event_ids, params = [], {"page_chunk_size": 2}
+        while True:
+            res = await authorized_client.get(url, params=params)
+            event_ids += [event["id"] for event in res.json()]
+            if "x-next-cursor" not in res.headers:
+                break
+            params = {"page_chunk_size": 2, "cursor": res.headers["x-next-cursor"]}
+        assert len(event_ids) == 4
+        assert event_ids == sorted(event_ids, reverse=True)
+
+    async def test_only_owner_reads_history(
+        self, app: FastAPI, create_authorized_client: Callable, test_user2: UserInDB, test_todo: TodoInDB
+    ) -> None:
+        """Test other users can't read the history of a todo."""
+        client = create_authorized_client(user=test_user2)
+        res = await client.get(app.url_path_for("todos:list-todo-events", todo_id=test_todo.id))
+        assert res.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_compaction_keeps_creation_and_last_update(
+        self, app: FastAPI, authorized_client: AsyncClient, db: Database, r_db: Redis, test_todo: TodoInDB
+    ) -> None:
+        """Test updates past the retention window are compacted to the last one."""
+        for i in range(3):
+            await self.update_todo(app, authorized_client, test_todo.id, notes=f"notes {i}")
+        url = app.url_path_for("todos:list-todo-events", todo_id=test_todo.id)
+        events = (await authorized_client.get(url)).json()
+        compactor = TodoEventsCompactor(batch_size=100, retention_days=0)
+        metrics = await compactor.compact(db, r_db, now=datetime.datetime.now(datetime.timezone.utc))
+        assert metrics["deleted"] >= 2
+        assert (await authorized_client.get(url)).json() == [events[0], events[-1]]
+
+
+class TestBulkTodos:
+    """Testing bulk create, update and delete endpoints."""
+
+    async def test_bulk_create_todos(self, app: FastAPI, authorized_client: AsyncClient, test_user: UserInDB) -> None:
+        """Test todos are created in request order and owned by the user."""
+        new_todos = [
+            {"name": f"bulk todo {i}", "notes": "bulk", "priority": "high", "duedate": str(datetime.date.today())}
+            for i in range(5)
+        ]
+        res = await authorized_client.post(app.url_path_for("todos:bulk-create-todos"), json={"new_todos": new_todos})
+        assert res.status_code == status.HTTP_201_CREATED
+        assert [item["index"] for item in res.json()] == list(range(5))
+        assert all(item["status_code"] == status.HTTP_201_CREATED for item in res.json())
+        todos = [TodoInDB(**item["todo"]) for item in res.json()]
+        assert [todo.name for todo in todos] == [new_todo["name"] for new_todo in new_todos]
+        assert all(todo.owner == test_user.id for todo in todos)
+
+    async def test_bulk_create_rejects_empty_list(self, app: FastAPI, authorized_client: AsyncClient) -> None:
+        """Test an empty batch is invalid."""
+        res = await authorized_client.post(app.url_path_for("todos:bulk-create-todos"), json={"new_todos": []})
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_bulk_update_reports_each_item(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_todo: TodoInDB,
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        """Test owned todos are updated while others get their own status code."""
+        todo_updates = [
+            {"id": test_todo.id, "notes": "bulk updated"},
+            {"id": test_todos_list[0].id, "notes": "not mine"},
+            {"id": 99999, "notes": "missing"},
+            {"id": test_todo.id, "notes": "twice"},
+        ]
+        res = await authorized_client.patch(
+            app.url_path_for("todos:bulk-update-todos"), json={"todo_updates": todo_updates}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert [item["status_code"] for item in res.json()] == [200, 403, 404, 409]
+        assert res.json()[0]["todo"]["notes"] == "bulk updated"
+        assert res.json()[0]["todo"]["name"] == test_todo.name
+        res = await authorized_client.get(app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id))
+        assert res.json()["notes"] == "bulk updated"
+
+    async def test_bulk_delete_reports_each_item(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_todo: TodoInDB,
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        """Test only owned todos are deleted."""
+        res = await authorized_client.request(
+            "DELETE",
+            app.url_path_for("todos:bulk-delete-todos"),
+            json={"todo_ids": [test_todo.id, test_todos_list[0].id, 99999]},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert [item["status_code"] for item in res.json()] == [200, 403, 404]
+        res = await authorized_client.get(app.url_path_for("todos:get-todo-by-id", todo_id=test_todo.id))
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestReminderScheduler:
+    """Testing due date reminder scans."""
+
+    async def test_scan_queues_each_reminder_once(
+        self,
+        client: AsyncClient,
+        db: Database,
+        r_db: Redis,
+        test_todo: TodoInDB,
+        test_todos_list: List[TodoInDB],
+    ) -> None:
+        """Test todos due today are queued in batches and rescans don't queue them again."""
+        scheduler = ReminderScheduler(batch_size=2, upcoming_days=1, overdue_days=1)
+        metrics = await scheduler.scan(db, r_db)
+        assert metrics["scanned"] >= 6
+        assert metrics["enqueued"] == metrics["scanned"]
+        assert metrics["batches"] >= 3
+        assert metrics["backlog"] == await r_db.llen(scheduler.queue_key)
+        metrics = await scheduler.scan(db, r_db)
+        assert metrics["enqueued"] == 0
+        assert (await scheduler.metrics(r_db))["enqueued"] == "0"
+
+    async def test_scan_is_skipped_while_locked(self, client: AsyncClient, db: Database, r_db: Redis) -> None:
+        """Test only one worker scans at a time."""
+        scheduler = ReminderScheduler()
+        token = await scheduler.acquire_lock(r_db)
+        assert token is not None
+        assert await scheduler.scan(db, r_db) is None
+        await scheduler.release_lock(r_db, token)
+        assert await scheduler.scan(db, r_db) is not None
+
+
+class TestGetTodoTasks:
+    """Testing get todotask endpoint."""
+
+    async def get_all_tasks(self, *, app: FastAPI, client: AsyncClient, params: Dict[str, str]) -> List[Dict]:
+        """Follow X-Next-Cursor through every page of the marketplace, which other tests fill too."""
+        tasks, params = [], {**params, "page_chunk_size": 500}
+        while True:
+            res = await client.get(app.url_path_for("todo_task:list-all-tasks"), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            tasks.extend(res.json())
+            if "x-next-cursor" not in res.headers:
+                return tasks
+            params["cursor"] = res.headers["x-next-cursor"]
+
+    async def test_can_get_all_task(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+        test_todo_astask: TodoInDB,
+        test_todos_list_as_task: List[TodoInDB],
+    ) -> None:
+        """User can get all todo's of other users that are offered as task, with their owners embedded."""
+        params = {"duedate_from": str(datetime.date.today())}
+        tasks = await self.get_all_tasks(app=app, client=authorized_client, params=params)
+        todos = [TodoPublic(**todo) for todo in tasks]
+        assert test_todo_astask.id not in [todo.id for todo in todos]
+        for todo in todos:
+            assert todo.owner.id != test_user.id
+            assert todo.as_task is True
+        assert all(todo.id in [t.id for t in todos] for todo in test_todos_list_as_task)
+
+    async def test_taken_tasks_are_not_listed(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        db: Database,
+        r_db: Redis,
+        test_user3: UserInDB,
+        test_todos_list_as_task: List[TodoInDB],
+    ) -> None:
+        """Test tasks with an accepted offer leave the marketplace."""
+        tasks_repo = TasksRepository(db, r_db)
+        taken_todo = test_todos_list_as_task[0]
+        task = await tasks_repo.create_task_for_todo(new_task=TaskCreate(todo_id=taken_todo.id, user_id=test_user3.id))
+        await tasks_repo.accept_offer_for_task(task=task)
+        params = {"duedate_from": str(datetime.date.today())}
+        ids = [todo["id"] for todo in await self.get_all_tasks(app=app, client=authorized_client, params=params)]
+        assert taken_todo.id not in ids
+        assert test_todos_list_as_task[1].id in ids
+
+    async def test_tasks_are_paginated_by_duedate(
+        self, app: FastAPI, authorized_client: AsyncClient, test_todos_list_as_task: List[TodoInDB]
+    ) -> None:
+        """Test following the cursor walks the marketplace in (duedate, id) order without repeats."""
+        url = app.url_path_for("todo_task:list-all-tasks")
+        res = await authorized_client.get(url, params={"page_chunk_size": 1})
+        assert len(res.json()) == 1
+        cursor = res.headers["x-next-cursor"]
+        next_res = await authorized_client.get(url, params={"page_chunk_size": 1, "cursor": cursor})
+        first, second = res.json()[0], next_res.json()[0]
+        assert (first["duedate"], first["id"]) < (second["duedate"], second["id"])
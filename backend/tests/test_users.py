@@ -7,7 +7,8 @@ from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_AUDI
 # from app.models.token import JWTMeta, JWTCreds, JWTPayload
 from app.db.repositories.users import UsersRepository
 from app.models.user import UserInDB, UserPublic
-from app.services import auth_service
+from app.services import auth_service, identity_cache
+from app.services.hashing import PasswordHasher
 from databases import Database
 from fastapi import FastAPI, HTTPException, status
 from fastapi.encoders import jsonable_encoder
@@ -385,3 +386,107 @@ class TestUserUpdate:
         assert user.email == "kent@superman.com"
         assert user.username == "petermain"
         assert user.email_verified is False
+
+
+class TestUserIdentityCache:
+    """Test users resolved from tokens are cached and invalidated on writes."""
+
+    async def test_repeated_requests_are_served_from_cache(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+    ) -> None:
+        """Test second request for the same user is a cache hit."""
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == status.HTTP_200_OK
+        hits_before = identity_cache.local_hits + identity_cache.redis_hits
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == status.HTTP_200_OK
+        assert identity_cache.local_hits + identity_cache.redis_hits == hits_before + 1
+        assert UserPublic(**res.json()).id == test_user.id
+
+    async def test_profile_update_invalidates_cached_user(
+        self,
+        app: FastAPI,
+        authorized_client: AsyncClient,
+        test_user: UserInDB,
+    ) -> None:
+        """Test cached user reflects profile updates."""
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.put(
+            app.url_path_for("profiles:update-own-profile"),
+            json={"profile_update": {"bio": "cached bio update"}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == status.HTTP_200_OK
+        assert UserPublic(**res.json()).profile.bio == "cached bio update"
+
+
+class TestPasswordHasher:
+    """Test bcrypt runs in the bounded hashing executor."""
+
+    async def test_hasher_hashes_and_verifies_in_executor(self) -> None:
+        """Test hashes made by the executor verify."""
+        hasher = PasswordHasher(executor_type="thread", max_workers=1, max_concurrency=1, max_queue=1)
+        hashed = await hasher.hash("mypasswordsalt")
+        assert await hasher.verify("mypasswordsalt", hashed)
+        assert not await hasher.verify("wrongpasswordsalt", hashed)
+        hasher.shutdown()
+
+    async def test_hasher_rejects_requests_when_queue_is_full(self) -> None:
+        """Test requests beyond the queue depth are shed with a 503."""
+        hasher = PasswordHasher(executor_type="thread", max_workers=1, max_concurrency=1, max_queue=0)
+        hasher.pending = 1
+        with pytest.raises(HTTPException) as e:
+            await hasher.hash("mypasswordsalt")
+        assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class TestUserLoader:
+    """Test populated users are loaded in batches."""
+
+    async def test_concurrent_loads_are_batched_and_deduped(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        db: Database,
+        r_db: Redis,
+        test_user: UserInDB,
+        test_user2: UserInDB,
+    ) -> None:
+        """Test concurrent loads resolve with one query."""
+        users_repo = UsersRepository(db, r_db)
+        loader = users_repo.user_loader
+        users = await loader.load_many([test_user.id, test_user2.id, test_user.id, 50000])
+        assert loader.batches == 1
+        assert [user.id for user in users[:3]] == [test_user.id, test_user2.id, test_user.id]
+        assert users[3] is None
+        assert isinstance(users[0], UserPublic)
+        assert users[0].profile is not None
+        assert users[0].profile.user_id == test_user.id
+
+    @pytest.mark.parametrize("lookup", ("email", "username", "id"))
+    async def test_populated_lookups_embed_profile(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        db: Database,
+        r_db: Redis,
+        test_user: UserInDB,
+        lookup: str,
+    ) -> None:
+        """Test populated lookups return the user with its profile."""
+        users_repo = UsersRepository(db, r_db)
+        if lookup == "email":
+            user = await users_repo.get_user_by_email(email=test_user.email)
+        elif lookup == "username":
+            user = await users_repo.get_user_by_username(username=test_user.username)
+        else:
+            user = await users_repo.get_user_by_id(user_id=test_user.id)
+        assert isinstance(user, UserPublic)
+        assert user.id == test_user.id
+        assert user.profile is not None
+        assert user.profile.user_id == test_user.id